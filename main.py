@@ -23,6 +23,8 @@ from datetime import datetime
 from urllib.parse import urlparse
 
 from universal_scraper.scraper import UniversalScraper
+from universal_scraper.core.code_cache import CodeCache
+from universal_scraper.core.caching import BundleError, HTTPBackend
 
 
 def setup_logging(level):
@@ -56,11 +58,11 @@ def generate_output_filename(url, format_type="json"):
     return f"{domain}_{timestamp}.{extension}"
 
 
-def scrape_multiple_urls(urls_file, scraper, output_dir, format_type="json"):
-    """Scrape multiple URLs from a file"""
+def read_urls_file(urls_file):
+    """Read URLs from a file, one per line; returns None on error"""
     if not os.path.exists(urls_file):
         print(f"Error: URLs file not found: {urls_file}")
-        return False
+        return None
 
     with open(urls_file, "r") as f:
         urls = [
@@ -71,6 +73,17 @@ def scrape_multiple_urls(urls_file, scraper, output_dir, format_type="json"):
 
     if not urls:
         print(f"Error: No valid URLs found in {urls_file}")
+        return None
+
+    return urls
+
+
+def scrape_multiple_urls(
+    urls_file, scraper, output_dir, format_type="json", max_workers=1
+):
+    """Scrape multiple URLs from a file"""
+    urls = read_urls_file(urls_file)
+    if not urls:
         return False
 
     print(f"Found {len(urls)} URLs to scrape")
@@ -79,7 +92,10 @@ def scrape_multiple_urls(urls_file, scraper, output_dir, format_type="json"):
     os.makedirs(output_dir, exist_ok=True)
 
     results = scraper.scrape_multiple_urls(
-        urls, save_to_files=True, format=format_type
+        urls,
+        save_to_files=True,
+        format=format_type,
+        max_workers=max_workers,
     )
 
     successful = sum(1 for r in results if not r.get("error"))
@@ -103,6 +119,102 @@ def scrape_multiple_urls(urls_file, scraper, output_dir, format_type="json"):
     return True
 
 
+def warm_cache(urls_file, scraper, sample_per_template=1, max_workers=4):
+    """Pre-generate extraction code for the URLs in a file"""
+    urls = read_urls_file(urls_file)
+    if not urls:
+        return False
+
+    print(f"Warming cache for {len(urls)} URLs")
+    report = scraper.warm_cache(
+        urls,
+        sample_per_template=sample_per_template,
+        max_workers=max_workers,
+    )
+
+    print("\nCache warm-up completed:")
+    print(f"Templates: {report['templates']}")
+    print(f"Samples: {report['samples']}")
+    print(f"Generated: {report['generated']}")
+    print(f"Already cached: {report['cached']}")
+    print(f"Failed: {report['failed'] + report['invalid']}")
+    print(
+        f"Coverage: {report['covered_urls']}/"
+        f"{report['urls'] - report['invalid_urls']} URLs "
+        f"({report['coverage']:.0%})"
+    )
+
+    if report["uncovered_templates"]:
+        print("\nUncovered templates:")
+        for template in report["uncovered_templates"]:
+            print(f"  - {template}")
+        return False
+
+    return True
+
+
+def open_code_cache(temp_dir):
+    """Open the code cache used by scrapers running with temp_dir"""
+    return CodeCache(
+        db_path=os.path.join(temp_dir, "extraction_cache.db"),
+        cache_dir=os.path.join(temp_dir, "cache"),
+    )
+
+
+def export_cache(bundle_path, temp_dir, domain=None):
+    """Export the code cache to a bundle file"""
+    cache = open_code_cache(temp_dir)
+    count = cache.export_bundle(bundle_path, domain)
+    cache.close()
+    print(f"Exported {count} cache entries to {bundle_path}")
+    return True
+
+
+def import_cache(bundle_path, temp_dir, strategy="newest"):
+    """Merge a bundle file into the code cache"""
+    if not os.path.exists(bundle_path):
+        print(f"Error: Cache bundle not found: {bundle_path}")
+        return False
+
+    cache = open_code_cache(temp_dir)
+    try:
+        result = cache.import_bundle(bundle_path, strategy)
+    except BundleError as e:
+        print(f"Error: {e}")
+        return False
+    finally:
+        cache.close()
+
+    print(
+        f"Imported {bundle_path}: {result['inserted']} inserted, "
+        f"{result['updated']} updated, {result['skipped']} skipped"
+    )
+    return True
+
+
+def invalidate_cache(
+    temp_dir,
+    model_name=None,
+    prompt_version=None,
+    cleaner_version=None,
+    domain=None,
+):
+    """Remove cache entries produced by the given versions"""
+    cache = open_code_cache(temp_dir)
+    try:
+        count = cache.invalidate_versions(
+            model_name, prompt_version, cleaner_version, domain
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+    finally:
+        cache.close()
+
+    print(f"Invalidated {count} cache entries")
+    return True
+
+
 async def run_mcp_server():
     """Run the MCP server"""
     try:
@@ -133,6 +245,9 @@ Examples:
   universal-scraper https://example.com/content
   --api-key YOUR_ANTHROPIC_KEY --model claude-3-haiku-20240307
   universal-scraper --urls urls.txt --output-dir scraped_data --format csv
+  universal-scraper --warm-cache urls.txt --sample-per-template 2
+  universal-scraper --export-cache warm_cache.bundle
+  universal-scraper --import-cache warm_cache.bundle --merge-strategy most_used
 
 Multi-Provider Support:
   • Gemini (default): Set GEMINI_API_KEY or use --api-key with Gemini key
@@ -152,6 +267,172 @@ Multi-Provider Support:
         "--mcp-server", action="store_true",
         help="Run as MCP (Model Context Protocol) server"
     )
+    mode_group.add_argument(
+        "--warm-cache",
+        metavar="URLS_FILE",
+        help="Pre-generate extraction code for the URLs in a file",
+    )
+    mode_group.add_argument(
+        "--export-cache",
+        metavar="BUNDLE",
+        help="Export the extraction code cache to a compressed bundle",
+    )
+    mode_group.add_argument(
+        "--import-cache",
+        metavar="BUNDLE",
+        help="Merge a compressed cache bundle into the extraction code cache",
+    )
+    mode_group.add_argument(
+        "--invalidate-cache",
+        action="store_true",
+        help=(
+            "Remove cache entries of the model/prompt/cleaner versions given "
+            "with --cache-model, --cache-prompt-version, "
+            "--cache-cleaner-version"
+        ),
+    )
+
+    # Cache warm-up options
+    parser.add_argument(
+        "--sample-per-template",
+        type=int,
+        default=1,
+        help="Pages fetched per URL template when warming (default: 1)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help=(
+            "Pages processed concurrently with --urls or --warm-cache "
+            "(default: 1 with --urls, 4 with --warm-cache)"
+        ),
+    )
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=4,
+        help="Maximum AI model requests in flight at once (default: 4)",
+    )
+    parser.add_argument(
+        "--llm-timeout",
+        type=float,
+        default=120.0,
+        help="Seconds before an AI model request is abandoned "
+        "(default: 120)",
+    )
+    parser.add_argument(
+        "--llm-rpm",
+        type=float,
+        help="AI model requests per minute to stay within; requests "
+        "wait for budget instead of failing",
+    )
+    parser.add_argument(
+        "--llm-tpm",
+        type=float,
+        help="AI model tokens per minute to stay within (prompt size "
+        "estimated before sending)",
+    )
+    parser.add_argument(
+        "--fallback-models",
+        nargs="+",
+        help="Models raced against --model when it is slow or fails, "
+        "in order of preference",
+    )
+    parser.add_argument(
+        "--hedge-delay",
+        type=float,
+        default=30.0,
+        help="Seconds to wait on a model before also asking the next "
+        "fallback model, until observed latencies take over (default: 30)",
+    )
+    parser.add_argument(
+        "--model-tiers",
+        nargs="+",
+        help="Models to generate extraction code with, cheapest first; "
+        "a stronger model is only used when the code fails validation",
+    )
+    parser.add_argument(
+        "--no-prompt-caching",
+        action="store_true",
+        help="Do not mark the fixed generation instructions as cacheable "
+        "for providers that support explicit prompt caching",
+    )
+    parser.add_argument(
+        "--no-streaming",
+        action="store_true",
+        help="Wait for complete model responses instead of streaming them "
+        "and stopping once the code block is complete",
+    )
+    parser.add_argument(
+        "--max-prompt-tokens",
+        type=int,
+        default=60000,
+        help="Prompt size limit; larger pages are reduced to their "
+        "repeated items to fit (default: 60000)",
+    )
+    parser.add_argument(
+        "--repair-attempts",
+        type=int,
+        default=2,
+        help="Times failing generated code is sent back to the model with "
+        "its error before giving up (default: 2)",
+    )
+
+    # Extraction execution options
+    parser.add_argument(
+        "--execution-engine",
+        choices=["inline", "sandbox"],
+        default="inline",
+        help="Run generated extraction code in this process (inline) or in "
+        "sandboxed worker processes with time and memory limits "
+        "(default: inline)",
+    )
+    parser.add_argument(
+        "--sandbox-workers",
+        type=int,
+        default=2,
+        help="Sandbox worker processes (default: 2)",
+    )
+    parser.add_argument(
+        "--sandbox-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds a sandboxed extraction may run before its worker is "
+        "killed (default: 30)",
+    )
+    parser.add_argument(
+        "--sandbox-memory-mb",
+        type=int,
+        default=512,
+        help="Memory a sandbox worker may use beyond its starting size "
+        "(default: 512)",
+    )
+
+    # Cache bundle options
+    parser.add_argument(
+        "--merge-strategy",
+        choices=["newest", "most_used"],
+        default="newest",
+        help=(
+            "Entry to keep when an imported key already exists "
+            "(default: newest)"
+        ),
+    )
+    parser.add_argument(
+        "--cache-domain",
+        help="Only export or invalidate cache entries for this domain",
+    )
+    parser.add_argument(
+        "--cache-model", help="Model whose cache entries to invalidate"
+    )
+    parser.add_argument(
+        "--cache-prompt-version",
+        help="Prompt version whose cache entries to invalidate",
+    )
+    parser.add_argument(
+        "--cache-cleaner-version",
+        help="Cleaner version whose cache entries to invalidate",
+    )
 
     # Output options
     parser.add_argument(
@@ -213,6 +494,20 @@ Multi-Provider Support:
         default="temp",
         help="Temporary directory (default: temp)",
     )
+    parser.add_argument(
+        "--cache-url",
+        help=(
+            "URL of a shared code cache service "
+            "(universal-scraper-cache-server)"
+        ),
+    )
+    parser.add_argument(
+        "--cache-token",
+        help=(
+            "Shared secret of the cache service and its nodes "
+            "(default: $UNIVERSAL_SCRAPER_CACHE_TOKEN)"
+        ),
+    )
     parser.add_argument("--save-html", help="Save cleaned HTML to this file")
 
     args = parser.parse_args()
@@ -234,10 +529,41 @@ Multi-Provider Support:
         asyncio.run(run_mcp_server())
         return
 
+    # Cache bundle modes work on the local cache and need no API key
+    if args.export_cache:
+        success = export_cache(
+            args.export_cache, args.temp_dir, args.cache_domain
+        )
+        sys.exit(0 if success else 1)
+
+    if args.import_cache:
+        success = import_cache(
+            args.import_cache, args.temp_dir, args.merge_strategy
+        )
+        sys.exit(0 if success else 1)
+
+    if args.invalidate_cache:
+        success = invalidate_cache(
+            args.temp_dir,
+            args.cache_model,
+            args.cache_prompt_version,
+            args.cache_cleaner_version,
+            args.cache_domain,
+        )
+        sys.exit(0 if success else 1)
+
     try:
         # Determine API key (legacy support)
         api_key = args.api_key or args.gemini_key
 
+        llm_rate_limits = None
+        if args.llm_rpm or args.llm_tpm:
+            llm_rate_limits = {"*": {"rpm": args.llm_rpm, "tpm": args.llm_tpm}}
+
+        cache_backend = None
+        if args.cache_url:
+            cache_backend = HTTPBackend(args.cache_url, token=args.cache_token)
+
         # Initialize scraper with multi-provider support
         scraper = UniversalScraper(
             api_key=api_key,
@@ -245,6 +571,21 @@ Multi-Provider Support:
             output_dir=args.output_dir,
             log_level=log_level,
             model_name=args.model,
+            cache_backend=cache_backend,
+            llm_max_concurrency=args.llm_concurrency,
+            llm_timeout=args.llm_timeout,
+            llm_rate_limits=llm_rate_limits,
+            llm_fallback_models=args.fallback_models,
+            llm_hedge_delay=args.hedge_delay,
+            llm_tiers=args.model_tiers,
+            llm_prompt_caching=not args.no_prompt_caching,
+            llm_streaming=not args.no_streaming,
+            llm_max_prompt_tokens=args.max_prompt_tokens,
+            max_repair_attempts=args.repair_attempts,
+            execution_engine=args.execution_engine,
+            execution_workers=args.sandbox_workers,
+            execution_timeout=args.sandbox_timeout,
+            execution_memory_mb=args.sandbox_memory_mb,
         )
 
         # Set custom fields if provided
@@ -310,6 +651,15 @@ Multi-Provider Support:
                 )
                 sys.exit(1)
 
+        elif args.warm_cache:
+            success = warm_cache(
+                args.warm_cache,
+                scraper,
+                args.sample_per_template,
+                args.workers or 4,
+            )
+            sys.exit(0 if success else 1)
+
         elif args.urls:
             # Multiple URLs scraping
             print("Batch scraping mode")
@@ -317,7 +667,11 @@ Multi-Provider Support:
             print(f"Output format: {args.format.upper()}")
 
             success = scrape_multiple_urls(
-                args.urls, scraper, args.output_dir, args.format
+                args.urls,
+                scraper,
+                args.output_dir,
+                args.format,
+                args.workers or 1,
             )
 
             if success:
@@ -89,6 +89,8 @@ setup(
         "console_scripts": [
             "universal-scraper=main:main",
             "universal-scraper-mcp=universal_scraper.mcp_server:main_sync",
+            "universal-scraper-cache-server="
+            "universal_scraper.core.caching.server:main",
         ],
     },
     keywords=[
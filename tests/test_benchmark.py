@@ -0,0 +1,131 @@
+"""Tests for the offline benchmark harness"""
+
+import os
+import asyncio
+import tempfile
+from urllib import request
+from urllib.error import HTTPError
+
+import pytest
+
+from universal_scraper.benchmark import (
+    FixtureServer,
+    FakeLLMProvider,
+    BenchmarkReport,
+    generate_corpus,
+    load_corpus,
+    percentile,
+    run_offline_benchmark,
+)
+
+
+class TestFixtureServer:
+    """Test cases for the local fixture server"""
+
+    def test_serves_corpus(self):
+        """Test that corpus pages are served and unknown paths are 404"""
+        corpus = generate_corpus(sites=2, pages_per_site=2, items=3)
+
+        with FixtureServer(corpus) as server:
+            urls = server.urls()
+            with request.urlopen(urls[0]) as response:
+                html = response.read().decode("utf-8")
+            with pytest.raises(HTTPError) as missing:
+                request.urlopen(server.url + "/nothing")
+
+        assert len(urls) == 4
+        assert html == corpus["/site0/page/0"]
+        assert html.count("data-item") == 3
+        assert missing.value.code == 404
+
+    def test_injected_errors_are_deterministic(self):
+        """Test that the same seed fails the same requests"""
+
+        def statuses(seed):
+            codes = []
+            with FixtureServer(error_rate=0.5, seed=seed) as server:
+                for url in server.urls()[:10]:
+                    try:
+                        codes.append(request.urlopen(url).status)
+                    except HTTPError as e:
+                        codes.append(e.code)
+            return codes
+
+        first = statuses(7)
+
+        assert first == statuses(7)
+        assert set(first) == {200, 503}
+
+    def test_load_corpus(self):
+        """Test that recorded pages are served at their relative paths"""
+        root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(root, "shop"))
+        with open(os.path.join(root, "shop", "list.html"), "w") as f:
+            f.write("<html>recorded</html>")
+        with open(os.path.join(root, "notes.txt"), "w") as f:
+            f.write("ignored")
+
+        assert load_corpus(root) == {"/shop/list": "<html>recorded</html>"}
+
+
+class TestFakeLLMProvider:
+    """Test cases for the deterministic fake model"""
+
+    def test_template_code_uses_requested_fields(self):
+        """Test that template code is rendered for the prompt's fields"""
+        provider = FakeLLMProvider(trailing_text="This code extracts...")
+
+        response = asyncio.run(
+            provider.agenerate("...\nFields to extract: title, price\n")
+        )
+
+        assert response.text.startswith("```python\n")
+        assert "['title', 'price']" in response.text
+        assert response.text.endswith("```\nThis code extracts...")
+        assert response.provider == "fake"
+
+    def test_recorded_code_wins(self):
+        """Test that recorded code is returned when its marker matches"""
+        provider = FakeLLMProvider(recorded={"site1": "def extract_data(h):"})
+
+        assert "def extract_data(h):" in provider.respond("/site1/page/0")
+        assert "soup.select" in provider.respond("/site2/page/0")
+
+
+def test_percentile():
+    """Test nearest-rank percentiles"""
+    assert percentile([], 0.5) == 0.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 0.5) == 2.0
+    assert percentile(list(range(1, 101)), 0.99) == 99
+    assert percentile([5.0], 0.99) == 5.0
+
+
+def test_report_ratios():
+    """Test that throughput and hit ratio exclude nothing but errors"""
+    report = BenchmarkReport(
+        pages=10,
+        errors=2,
+        elapsed=2.0,
+        p50_latency=0.1,
+        p99_latency=0.5,
+        cache_hits=6,
+        llm_calls=2,
+    )
+
+    assert report.pages_per_sec == 5.0
+    assert report.cache_hit_ratio == 0.75
+    assert report.to_dict()["cache_hit_ratio"] == 0.75
+
+
+def test_offline_end_to_end_benchmark():
+    """Test a full cold and warm run against the fixtures"""
+    corpus = generate_corpus(sites=2, pages_per_site=3, items=5)
+
+    cold, warm = run_offline_benchmark(corpus, workers=2, passes=2)
+
+    assert cold.pages == warm.pages == 6
+    assert cold.errors == warm.errors == 0
+    assert cold.llm_calls >= 1
+    assert warm.llm_calls == 0
+    assert warm.cache_hit_ratio == 1.0
+    assert warm.p99_latency >= warm.p50_latency > 0
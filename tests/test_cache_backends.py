@@ -0,0 +1,206 @@
+"""Tests for shared code cache backends and the cache service"""
+
+import os
+import json
+import sqlite3
+import tempfile
+from urllib import request
+from urllib.error import HTTPError
+
+import pytest
+
+from universal_scraper.core.code_cache import CodeCache
+from universal_scraper.core.caching import (
+    CacheService,
+    HTTPBackend,
+    MemoryBackend,
+)
+
+
+HTML = "<div class='job'><h2>Engineer</h2></div>"
+TOKEN = "test-secret"
+
+
+class TestSharedBackend:
+    """Test cases for CodeCache read-through and write-through"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def _cache(self, name, backend):
+        return CodeCache(
+            db_path=os.path.join(self.temp_dir, f"{name}.db"),
+            cache_dir=os.path.join(self.temp_dir, f"{name}_cache"),
+            backend=backend,
+        )
+
+    def test_entry_is_shared_between_nodes(self):
+        """Test that code stored on one node is served on another"""
+        backend = MemoryBackend()
+        node_a = self._cache("a", backend)
+        node_b = self._cache("b", backend)
+
+        assert node_a.store_code("https://example.com", HTML, ["t"], "code")
+        assert node_b.get_cached_code("https://example.com", HTML, ["t"]) \
+            == "code"
+
+        stats = node_b.get_cache_stats()
+        assert stats["lookup_levels"]["remote"] == 1
+        # The remote hit was kept in the local tier
+        assert stats["total_entries"] == 1
+
+    def test_remote_entry_is_not_metered_locally(self):
+        """Test that the generating node's spend stays with that node"""
+        from universal_scraper.core.llm import TokenUsage
+
+        backend = MemoryBackend()
+        node_a = self._cache("a", backend)
+        node_b = self._cache("b", backend)
+        node_a.store_code(
+            "https://example.com", HTML, ["t"], "code",
+            usage=TokenUsage(
+                prompt_tokens=1000, completion_tokens=200, cost=0.01, calls=1
+            ),
+        )
+
+        node_b.get_cached_code("https://example.com", HTML, ["t"])
+        node_b.get_cached_code("https://example.com", HTML, ["t"])
+
+        assert node_a.get_cache_stats()["llm_usage"]["metered_entries"] == 1
+        usage = node_b.get_cache_stats()["llm_usage"]
+        assert usage["metered_entries"] == 0
+        assert usage["tokens_avoided_by_hits"] == 0
+
+    def test_remote_template_lookup(self):
+        """Test that path-family entries are published under the template"""
+        backend = MemoryBackend()
+        node_a = self._cache("a", backend)
+        node_a.get_cached_code(
+            "https://example.com/jobs/red-shoes", HTML, ["t"]
+        )
+        node_a.store_code(
+            "https://example.com/jobs/blue-hats", HTML, ["t"], "code"
+        )
+
+        node_b = self._cache("b", backend)
+        node_b.url_templates.add_template("https://example.com/jobs/{slug}")
+
+        assert node_b.get_cached_code(
+            "https://example.com/jobs/green-socks", HTML, ["t"]
+        ) == "code"
+
+    def test_remote_miss(self):
+        """Test that a miss on both tiers returns None"""
+        cache = self._cache("a", MemoryBackend())
+        assert cache.get_cached_code("https://example.com", HTML, ["t"]) \
+            is None
+
+
+class TestCacheService:
+    """Test cases for the HTTP cache service and HTTPBackend"""
+
+    def setup_method(self):
+        """Start a service on a free port"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.service = CacheService(
+            port=0,
+            db_path=os.path.join(self.temp_dir, "service.db"),
+            token=TOKEN,
+        )
+        self.service.start()
+
+    def teardown_method(self):
+        """Stop the service"""
+        self.service.stop()
+
+    def test_put_and_get(self):
+        """Test storing and fetching an entry over HTTP"""
+        backend = HTTPBackend(self.service.url, TOKEN)
+        key = ("https://example.com", "abc", "def")
+
+        assert backend.get(key) is None
+        assert backend.put(key, {"extraction_code": "code"})
+        assert backend.get(key) == {"extraction_code": "code"}
+        assert backend.get_stats()["writes"] == 1
+
+    def test_health(self):
+        """Test the health endpoint"""
+        with request.urlopen(f"{self.service.url}/health") as response:
+            assert json.loads(response.read())["status"] == "ok"
+
+    def test_nodes_share_through_service(self):
+        """Test two caches sharing entries through the service"""
+        node_a = CodeCache(
+            db_path=os.path.join(self.temp_dir, "a.db"),
+            cache_dir=os.path.join(self.temp_dir, "a"),
+            backend=HTTPBackend(self.service.url, TOKEN),
+        )
+        node_b = CodeCache(
+            db_path=os.path.join(self.temp_dir, "b.db"),
+            cache_dir=os.path.join(self.temp_dir, "b"),
+            backend=HTTPBackend(self.service.url, TOKEN),
+        )
+
+        node_a.store_code("https://example.com", HTML, ["t"], "code")
+        assert node_b.get_cached_code("https://example.com", HTML, ["t"]) \
+            == "code"
+
+    def test_unreachable_service_is_skipped(self):
+        """Test that failures back off instead of raising"""
+        url = self.service.url
+        self.service.stop()
+        backend = HTTPBackend(url, TOKEN, timeout=0.5)
+        self.service = CacheService(
+            port=0,
+            db_path=os.path.join(self.temp_dir, "other.db"),
+            token=TOKEN,
+        )
+        self.service.start()
+
+        assert backend.get(("a", "b", "c")) is None
+        assert not backend.put(("a", "b", "c"), {"extraction_code": "x"})
+        stats = backend.get_stats()
+        assert stats["errors"] == 1
+        assert not stats["available"]
+
+    def test_requests_without_token_are_refused(self):
+        """Test that entries cannot be written or read without the secret"""
+        url = f"{self.service.url}/v1/entries/{'0' * 64}"
+        put = request.Request(
+            url,
+            data=json.dumps({"extraction_code": "x"}).encode("utf-8"),
+            headers={"Authorization": "Bearer wrong"},
+            method="PUT",
+        )
+
+        for req in (put, request.Request(url)):
+            with pytest.raises(HTTPError) as refused:
+                request.urlopen(req)
+            assert refused.value.code == 401
+
+    def test_tampered_entry_is_rejected(self):
+        """Test that code changed on the service is never returned"""
+        backend = HTTPBackend(self.service.url, TOKEN)
+        key = ("https://example.com", "abc", "def")
+        backend.put(key, {"extraction_code": "code"})
+
+        with sqlite3.connect(self.service.httpd.store.db_path) as conn:
+            row = conn.execute("SELECT entry_json FROM entries").fetchone()
+            entry = json.loads(row[0])
+            entry["extraction_code"] = "import os"
+            conn.execute(
+                "UPDATE entries SET entry_json = ?", (json.dumps(entry),)
+            )
+
+        assert backend.get(key) is None
+        assert backend.get_stats()["rejected"] == 1
+
+    def test_secret_is_required(self, monkeypatch):
+        """Test that neither side starts without a shared secret"""
+        monkeypatch.delenv("UNIVERSAL_SCRAPER_CACHE_TOKEN", raising=False)
+
+        with pytest.raises(ValueError):
+            HTTPBackend(self.service.url)
+        with pytest.raises(ValueError):
+            CacheService(port=0, db_path=os.path.join(self.temp_dir, "x.db"))
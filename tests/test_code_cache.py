@@ -1,10 +1,17 @@
 """Tests for the CodeCache module"""
 
+import pytest
 import tempfile
 import os
 import sqlite3
 from unittest.mock import patch
 from universal_scraper.core.code_cache import CodeCache
+from universal_scraper.core.caching import (
+    BackoffPolicy,
+    BundleError,
+    EvictionPolicy,
+    UrlTemplateLearner,
+)
 
 
 class TestCodeCache:
@@ -250,3 +257,917 @@ class TestCodeCache:
         with patch.object(cache.logger, "info") as mock_log:
             cache.logger.info("Test log message")
             mock_log.assert_called_once_with("Test log message")
+
+    def test_memory_tier_serves_repeated_hits(self):
+        """Test that repeated lookups are served from the memory tier"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+
+        url = "https://example.com/list"
+        html_content = "<div class='item'><h2>Title</h2></div>"
+        fields = ["title"]
+        code = "def extract_data(html_content): return []"
+
+        cache.store_code(url, html_content, fields, code)
+        cache.get_cached_code(url, html_content, fields)
+        entry = cache.get_cached_entry(url, html_content, fields)
+
+        assert entry.code == code
+        assert entry.compiled is not None
+        memory_stats = cache.get_cache_stats()["memory_cache"]
+        assert memory_stats["hits"] == 2
+        assert memory_stats["entries"] == 1
+
+    def test_memory_tier_promotes_from_disk(self):
+        """Test that a fresh instance loads hits from SQLite into memory"""
+        url = "https://example.com/list"
+        html_content = "<div class='item'><h2>Title</h2></div>"
+        fields = ["title"]
+        code = "def extract_data(html_content): return []"
+        CodeCache(
+            db_path=self.db_path, cache_dir=self.cache_dir
+        ).store_code(url, html_content, fields, code)
+
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        assert cache.get_cached_code(url, html_content, fields) == code
+        assert cache.get_cached_code(url, html_content, fields) == code
+
+        memory_stats = cache.get_cache_stats()["memory_cache"]
+        assert memory_stats["misses"] == 1
+        assert memory_stats["hits"] == 1
+
+    def test_memory_tier_invalidation(self):
+        """Test that store, clear and cleanup keep the memory tier in sync"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+
+        url = "https://example.com"
+        html_content = "<div>Content</div>"
+        fields = ["title"]
+        cache.store_code(url, html_content, fields, "old = 1")
+        cache.store_code(url, html_content, fields, "new = 1")
+        assert cache.get_cached_code(url, html_content, fields) == "new = 1"
+
+        cache.clear_cache()
+        assert len(cache.memory_cache) == 0
+        assert cache.get_cached_code(url, html_content, fields) is None
+
+        cache.store_code(url, html_content, fields, "new = 1")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE extraction_cache "
+                "SET last_used_at = datetime('now', '-60 days')"
+            )
+        assert cache.cleanup_old_entries(days_old=30) == 1
+        assert len(cache.memory_cache) == 0
+
+    def test_memory_tier_limits(self):
+        """Test that the memory tier respects entry and byte limits"""
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            memory_max_entries=2,
+            memory_max_bytes=100,
+        )
+
+        fields = ["title"]
+        for i in range(3):
+            cache.store_code(
+                f"https://example{i}.com", "<div>x</div>", fields, f"x = {i}"
+            )
+        assert len(cache.memory_cache) == 2
+        assert cache.memory_cache.evictions == 1
+
+        cache.store_code(
+            "https://big.com", "<div>x</div>", fields, "x" * 200
+        )
+        stats = cache.memory_cache.get_stats()
+        assert stats["bytes"] <= 100
+        assert stats["entries"] <= 2
+
+    def test_usage_stats_are_written_behind(self):
+        """Test that hits are buffered and flushed in one batch"""
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            usage_flush_interval=3600,
+            usage_flush_threshold=1000,
+        )
+
+        url = "https://example.com"
+        html_content = "<div>Content</div>"
+        fields = ["title"]
+        cache.store_code(url, html_content, fields, "x = 1")
+        for _ in range(5):
+            cache.get_cached_code(url, html_content, fields)
+
+        def stored_use_count():
+            with sqlite3.connect(self.db_path) as conn:
+                return conn.execute(
+                    "SELECT use_count FROM extraction_cache"
+                ).fetchone()[0]
+
+        # Nothing written yet - hits only live in the buffer
+        assert stored_use_count() == 1
+        assert len(cache.usage_buffer) == 5
+
+        assert cache.flush_usage_stats() == 1
+        assert stored_use_count() == 6
+        assert len(cache.usage_buffer) == 0
+
+    def test_usage_stats_flushed_for_stats_and_close(self):
+        """Test that stats reads and close() include buffered hits"""
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            usage_flush_interval=3600,
+            usage_flush_threshold=1000,
+        )
+
+        url = "https://example.com"
+        html_content = "<div>Content</div>"
+        fields = ["title"]
+        cache.store_code(url, html_content, fields, "x = 1")
+        cache.get_cached_code(url, html_content, fields)
+        assert cache.get_cache_stats()["total_uses"] == 2
+
+        cache.get_cached_code(url, html_content, fields)
+        cache.close()
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT use_count FROM extraction_cache"
+            ).fetchone()
+        assert row[0] == 3
+
+    def test_usage_flush_threshold_triggers_background_flush(self):
+        """Test that reaching the threshold flushes off the hit path"""
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            usage_flush_interval=3600,
+            usage_flush_threshold=2,
+        )
+
+        url = "https://example.com"
+        html_content = "<div>Content</div>"
+        fields = ["title"]
+        cache.store_code(url, html_content, fields, "x = 1")
+
+        with patch(
+            "universal_scraper.core.code_cache.threading.Thread"
+        ) as mock_thread:
+            cache.get_cached_code(url, html_content, fields)
+            mock_thread.assert_not_called()
+            cache.get_cached_code(url, html_content, fields)
+            mock_thread.assert_called_once()
+            mock_thread.return_value.start.assert_called_once()
+
+    def test_compile_code_persists_bytecode(self):
+        """Test that compiled bytecode is reused by a new instance"""
+        code = "def extract_data(html_content):\n    return [1]\n"
+        CodeCache(
+            db_path=self.db_path, cache_dir=self.cache_dir
+        ).compile_code(code)
+
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        with patch("builtins.compile") as mock_compile:
+            compiled = cache.compile_code(code)
+            mock_compile.assert_not_called()
+
+        namespace = {}
+        exec(compiled, namespace)
+        assert namespace["extract_data"]("") == [1]
+        assert cache.compile_code("def broken(:") is None
+
+    def _listing_page(self, card_class="card product", banner=""):
+        card = (
+            f"<div class='{card_class}'><h2 class='title'>Item {{i}}</h2>"
+            "<span class='price'>${i}</span><a href='/p/{i}'>View</a></div>"
+        )
+        items = "".join(card.format(i=i) for i in range(10))
+        return (
+            "<html><body><header><nav><a href='/'>Home</a></nav></header>"
+            f"{banner}<main class='grid'>{items}</main></body></html>"
+        )
+
+    def test_find_similar_entry_for_cosmetic_change(self):
+        """Test that a near-duplicate structure is offered on exact miss"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        fields = ["title", "price"]
+        cache.store_code(
+            "https://shop.com/list", self._listing_page(), fields, "x = 1"
+        )
+
+        changed = self._listing_page(
+            card_class="card product ab-test-b",
+            banner="<div class='banner'><p>Sale</p></div>",
+        )
+        assert cache.get_cached_code(
+            "https://shop.com/list", changed, fields
+        ) is None
+
+        match = cache.find_similar_entry(
+            "https://shop.com/other", changed, fields
+        )
+        assert match is not None
+        assert match.code == "x = 1"
+        assert match.url_clean == "https://shop.com/list"
+        assert match.distance <= cache.near_match_max_distance
+
+    def test_find_similar_entry_scoped_and_bounded(self):
+        """Test that near matches respect domain, fields and distance"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        fields = ["title", "price"]
+        cache.store_code(
+            "https://shop.com/list", self._listing_page(), fields, "x = 1"
+        )
+        table_page = "<html><body><table class='t'>" + "".join(
+            f"<tr><td>{i}</td><td>x</td></tr>" for i in range(10)
+        ) + "</table></body></html>"
+
+        page = self._listing_page(banner="<div class='promo'><p>x</p></div>")
+        assert cache.find_similar_entry(
+            "https://other.com/list", page, fields
+        ) is None
+        assert cache.find_similar_entry(
+            "https://shop.com/list", page, ["title"]
+        ) is None
+        assert cache.find_similar_entry(
+            "https://shop.com/list", table_page, fields
+        ) is None
+        assert cache.find_similar_entry(
+            "https://shop.com/list", page, fields, max_distance=0
+        ) is None
+
+    def test_schema_migration_adds_columns(self):
+        """Test that databases from older versions are upgraded in place"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE extraction_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url_clean TEXT NOT NULL,
+                    structural_hash TEXT NOT NULL,
+                    fields_hash TEXT NOT NULL,
+                    extraction_code TEXT NOT NULL,
+                    code_file_path TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    use_count INTEGER DEFAULT 1,
+                    UNIQUE(url_clean, structural_hash, fields_hash)
+                )
+            """
+            )
+
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        assert cache.store_code(
+            "https://example.com", "<div>x</div>", ["title"], "x = 1"
+        )
+        with sqlite3.connect(self.db_path) as conn:
+            columns = {
+                row[1]
+                for row in conn.execute("PRAGMA table_info(extraction_cache)")
+            }
+        assert {"domain", "simhash"} <= columns
+
+    def test_template_fallback_serves_path_family(self):
+        """Test that one entry serves every URL of the same template"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        html_content = "<div class='product'><h1>Name</h1></div>"
+        fields = ["name"]
+        cache.store_code(
+            "https://shop.com/product/123", html_content, fields, "x = 1"
+        )
+
+        for product_id in range(124, 130):
+            assert cache.get_cached_code(
+                f"https://shop.com/product/{product_id}",
+                html_content,
+                fields,
+            ) == "x = 1"
+
+        assert cache.get_cache_stats()["lookup_levels"]["template"] == 1
+        assert cache.get_cache_stats()["total_uses"] == 7
+
+    def test_fallbacks_guarded_by_structural_hash(self):
+        """Test that template/domain fallbacks need the same structure"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        fields = ["name"]
+        cache.store_code(
+            "https://shop.com/product/123",
+            "<div class='product'><h1>Name</h1></div>",
+            fields,
+            "x = 1",
+        )
+
+        assert cache.get_cached_code(
+            "https://shop.com/product/124",
+            "<table><tr><td>Other</td></tr></table>",
+            fields,
+        ) is None
+        assert cache.get_cached_code(
+            "https://shop.com/category/shoes",
+            "<div class='product'><h1>Name</h1></div>",
+            fields,
+        ) == "x = 1"
+        assert cache.get_cache_stats()["lookup_levels"]["domain"] == 1
+
+    def test_learned_slug_templates_persist(self):
+        """Test that slug templates are learned and reloaded"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        html_content = "<div class='post'><h1>Title</h1></div>"
+        cache.store_code(
+            "https://blog.com/posts/first-post", html_content, ["t"], "x = 1"
+        )
+        cache.get_cached_code(
+            "https://blog.com/posts/second-post", html_content, ["t"]
+        )
+
+        reloaded = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        assert reloaded.get_url_template(
+            "https://blog.com/posts/third-post"
+        ) == "https://blog.com/posts/{slug}"
+        with sqlite3.connect(self.db_path) as conn:
+            templates = conn.execute(
+                "SELECT url_template FROM extraction_cache"
+            ).fetchall()
+        assert templates == [("https://blog.com/posts/{slug}",)]
+
+
+class TestUrlTemplateLearner:
+    """Test cases for URL template inference"""
+
+    def test_collapses_ids_uuids_and_dates(self):
+        """Test that always-variable segments become placeholders"""
+        learner = UrlTemplateLearner()
+        assert learner.template_for(
+            "https://shop.com/product/123"
+        ) == "https://shop.com/product/{id}"
+        assert learner.template_for(
+            "https://shop.com/item/550e8400-e29b-41d4-a716-446655440000"
+        ) == "https://shop.com/item/{uuid}"
+        assert learner.template_for(
+            "https://news.com/2024/05/17/story-title"
+        ) == "https://news.com/{date}/{date}/{date}/story-title"
+        assert learner.template_for(
+            "https://news.com/archive/2024-05-17"
+        ) == "https://news.com/archive/{date}"
+
+    def test_slugs_require_observed_variation(self):
+        """Test that slugs are only collapsed after the site shows variety"""
+        learner = UrlTemplateLearner()
+        assert learner.observe("https://shop.com/p/blue-widget") is None
+        assert learner.template_for(
+            "https://shop.com/p/blue-widget"
+        ) == "https://shop.com/p/blue-widget"
+
+        learned = learner.observe("https://shop.com/p/red-gadget")
+        assert learned == "https://shop.com/p/{slug}"
+        assert learner.template_for(
+            "https://shop.com/p/green-thing"
+        ) == "https://shop.com/p/{slug}"
+        assert learner.template_for(
+            "https://shop.com/about-us"
+        ) == "https://shop.com/about-us"
+        assert learner.templates("shop.com") == ["/p/{slug}"]
+
+
+class TestSupersetLookup:
+    """Test cases for field-subset reuse"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = CodeCache(
+            db_path=os.path.join(self.temp_dir, "test.db"),
+            cache_dir=os.path.join(self.temp_dir, "cache"),
+        )
+
+    def test_prefers_smallest_superset(self):
+        """Test that the closest superset field set is chosen"""
+        url = "https://shop.com/product/1"
+        html = "<div class='product'><h1>A</h1></div>"
+        self.cache.store_code(url, html, ["a", "b", "c", "d"], "wide = 1")
+        self.cache.store_code(url, html, ["a", "b", "c"], "narrow = 1")
+
+        match = self.cache.find_superset_entry(url, html, ["a", "b"])
+        assert match.code == "narrow = 1"
+        assert match.fields == ["a", "b", "c"]
+
+    def test_requires_strict_superset_and_same_structure(self):
+        """Test that equal, disjoint or other-structure sets are ignored"""
+        url = "https://shop.com/product/1"
+        html = "<div class='product'><h1>A</h1></div>"
+        self.cache.store_code(url, html, ["a", "b"], "x = 1")
+
+        assert self.cache.find_superset_entry(url, html, ["a", "b"]) is None
+        assert self.cache.find_superset_entry(url, html, ["a", "z"]) is None
+        assert self.cache.find_superset_entry(
+            url, "<table><tr><td>x</td></tr></table>", ["a"]
+        ) is None
+        assert self.cache.find_superset_entry(
+            "https://shop.com/product/2", html, ["a"]
+        ).code == "x = 1"
+
+
+class TestEviction:
+    """Test cases for code cache eviction and garbage collection"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "test.db")
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+
+    def _store(self, cache, count, code_size=10):
+        for i in range(count):
+            cache.store_code(
+                f"https://site{i}.com",
+                f"<div class='c{i}'>x</div>",
+                ["title"],
+                f"# {i}\n" + "x" * code_size,
+            )
+
+    def _set_last_used(self, url, days_ago):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE extraction_cache "
+                "SET last_used_at = datetime('now', ?) WHERE url_clean = ?",
+                (f"-{days_ago} days", url),
+            )
+
+    def test_cleanup_keeps_old_but_recently_used_entries(self):
+        """Test that cleanup ages entries by last use, not creation"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        self._store(cache, 2)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE extraction_cache "
+                "SET created_at = datetime('now', '-365 days')"
+            )
+        self._set_last_used("https://site1.com", 60)
+
+        assert cache.cleanup_old_entries(days_old=30) == 1
+        assert cache.get_cache_stats()["total_entries"] == 1
+        assert cache.get_cached_code(
+            "https://site0.com", "<div class='c0'>x</div>", ["title"]
+        ) is not None
+
+    def test_evict_by_entry_count_in_lru_order(self):
+        """Test that the least recently used entries go first"""
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            eviction_policy=EvictionPolicy(max_entries=2, batch_size=1),
+        )
+        self._store(cache, 4)
+        for i, days in enumerate([3, 1, 4, 2]):
+            self._set_last_used(f"https://site{i}.com", days)
+
+        assert cache.evict() == {"idle": 0, "lru": 2}
+        with sqlite3.connect(self.db_path) as conn:
+            remaining = sorted(
+                row[0]
+                for row in conn.execute("SELECT url_clean FROM extraction_cache")
+            )
+        assert remaining == ["https://site1.com", "https://site3.com"]
+
+    def test_evict_by_bytes_and_idle_time(self):
+        """Test byte limit and time-to-idle eviction"""
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            eviction_policy=EvictionPolicy(
+                max_entries=None, max_bytes=250, max_idle_days=10
+            ),
+        )
+        self._store(cache, 4, code_size=100)
+        self._set_last_used("https://site0.com", 20)
+
+        result = cache.evict()
+        assert result["idle"] == 1
+        assert result["lru"] == 1
+        assert cache.get_cache_stats()["total_entries"] == 2
+
+    def test_orphaned_files_are_collected(self):
+        """Test that code files without a cache entry are removed"""
+        archive_dir = os.path.join(self.temp_dir, "extraction_codes")
+        os.makedirs(archive_dir)
+        for i in range(3):
+            with open(os.path.join(archive_dir, f"code_{i}.py"), "w") as f:
+                f.write("x = 1")
+            os.utime(os.path.join(archive_dir, f"code_{i}.py"), (i, i))
+
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            code_archive_dir=archive_dir,
+            eviction_policy=EvictionPolicy(
+                max_archived_files=1, orphan_grace_seconds=0
+            ),
+        )
+        self._store(cache, 2)
+        with open(os.path.join(self.cache_dir, "stale.py"), "w") as f:
+            f.write("x = 1")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "DELETE FROM extraction_cache WHERE url_clean = ?",
+                ("https://site0.com",),
+            )
+
+        # stale.py, the deleted entry's code and HTML, two archived files
+        assert cache.collect_orphaned_files() == 5
+        code_files = [
+            name for name in os.listdir(self.cache_dir)
+            if name.endswith(".py")
+        ]
+        assert len(code_files) == 1
+        assert len(os.listdir(cache.html_archive_dir)) == 1
+        assert os.listdir(archive_dir) == ["code_2.py"]
+
+    def test_young_orphans_are_kept(self):
+        """Test that files of an entry still being stored survive GC"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        self._store(cache, 1)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM extraction_cache")
+
+        assert cache.collect_orphaned_files() == 0
+        assert len(os.listdir(cache.html_archive_dir)) == 1
+
+    def test_clear_cache_removes_archived_html(self):
+        """Test that clearing the cache also drops the HTML archive"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        self._store(cache, 2)
+
+        assert cache.clear_cache() is True
+        assert os.listdir(cache.html_archive_dir) == []
+
+    def test_background_maintenance(self):
+        """Test that the maintenance worker can be started and stopped"""
+        cache = CodeCache(
+            db_path=self.db_path,
+            cache_dir=self.cache_dir,
+            maintenance_interval=3600,
+        )
+        assert cache._maintenance.running
+        cache.close()
+        assert cache._maintenance is None
+
+
+class TestCacheBundles:
+    """Test cases for exporting and importing cache bundles"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.temp_dir, "cache.bundle")
+        self.html = "<div class='item'><h2>Title</h2></div>"
+
+    def _cache(self, name):
+        return CodeCache(
+            db_path=os.path.join(self.temp_dir, f"{name}.db"),
+            cache_dir=os.path.join(self.temp_dir, f"{name}_cache"),
+        )
+
+    def _set_row(self, cache, assignments):
+        with sqlite3.connect(cache.db_path) as conn:
+            conn.execute(f"UPDATE extraction_cache SET {assignments}")
+
+    def test_export_import_round_trip(self):
+        """Test that an exported bundle seeds a fresh cache"""
+        source = self._cache("source")
+        source.store_code(
+            "https://example.com/page", self.html, ["title"], "code_a",
+            record_count=3,
+        )
+        source.store_code(
+            "https://other.com/page", self.html, ["title"], "code_b"
+        )
+
+        assert source.export_bundle(self.bundle_path) == 2
+
+        target = self._cache("target")
+        result = target.import_bundle(self.bundle_path)
+
+        assert result == {"inserted": 2, "updated": 0, "skipped": 0}
+        assert target.get_cached_code(
+            "https://example.com/page", self.html, ["title"]
+        ) == "code_a"
+        assert os.listdir(target.cache_dir)
+
+    def test_export_single_domain(self):
+        """Test exporting only one domain's entries"""
+        cache = self._cache("source")
+        cache.store_code("https://example.com/a", self.html, ["title"], "a")
+        cache.store_code("https://other.com/b", self.html, ["title"], "b")
+
+        assert cache.export_bundle(self.bundle_path, "EXAMPLE.com") == 1
+
+    def test_import_newest_strategy(self):
+        """Test that the newest entry wins by default"""
+        source = self._cache("source")
+        source.store_code("https://example.com", self.html, ["title"], "new")
+        source.export_bundle(self.bundle_path)
+
+        target = self._cache("target")
+        target.store_code("https://example.com", self.html, ["title"], "old")
+        self._set_row(target, "created_at = datetime('now', '-1 day')")
+
+        result = target.import_bundle(self.bundle_path)
+
+        assert result["updated"] == 1
+        assert target.get_cached_code(
+            "https://example.com", self.html, ["title"]
+        ) == "new"
+
+    def test_import_most_used_strategy(self):
+        """Test that the most used entry wins with 'most_used'"""
+        source = self._cache("source")
+        source.store_code("https://example.com", self.html, ["title"], "new")
+        source.export_bundle(self.bundle_path)
+
+        target = self._cache("target")
+        target.store_code("https://example.com", self.html, ["title"], "old")
+        self._set_row(
+            target, "use_count = 50, created_at = datetime('now', '-1 day')"
+        )
+
+        result = target.import_bundle(self.bundle_path, "most_used")
+
+        assert result["skipped"] == 1
+        assert target.get_cached_code(
+            "https://example.com", self.html, ["title"]
+        ) == "old"
+
+    def test_imported_entries_are_not_metered_locally(self):
+        """Test that another node's spend and hits are not counted here"""
+        from universal_scraper.core.llm import TokenUsage
+
+        source = self._cache("source")
+        source.store_code(
+            "https://example.com", self.html, ["title"], "code",
+            usage=TokenUsage(
+                prompt_tokens=1000, completion_tokens=200, cost=0.01, calls=1
+            ),
+        )
+        self._set_row(source, "use_count = 10")
+        source.export_bundle(self.bundle_path)
+
+        target = self._cache("target")
+        target.import_bundle(self.bundle_path)
+
+        usage = target.get_cache_stats()["llm_usage"]
+        assert usage["metered_entries"] == 0
+        assert usage["generation_tokens"] == 0
+        assert usage["tokens_avoided_by_hits"] == 0
+        with sqlite3.connect(target.db_path) as conn:
+            assert conn.execute(
+                "SELECT use_count FROM extraction_cache"
+            ).fetchone() == (1,)
+
+    def test_import_invalid_bundle(self):
+        """Test that non-bundle files are rejected"""
+        with open(self.bundle_path, "w") as f:
+            f.write("not a bundle")
+
+        with pytest.raises(BundleError):
+            self._cache("target").import_bundle(self.bundle_path)
+
+
+class TestGenerationLeases:
+    """Test cases for cross-process generation leases"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = CodeCache(
+            db_path=os.path.join(self.temp_dir, "test.db"),
+            cache_dir=os.path.join(self.temp_dir, "cache"),
+        )
+        self.key = self.cache.generation_key(
+            "https://shop.com/product/1", "<div></div>", ["title"]
+        )
+
+    def test_generation_key_uses_url_template(self):
+        """Test that pages of one path family share a generation key"""
+        assert self.key[0] == "https://shop.com/product/{id}"
+        assert self.key == self.cache.generation_key(
+            "https://shop.com/product/2", "<div></div>", ["title"]
+        )
+
+    def test_lease_is_exclusive(self):
+        """Test that a held lease is only granted to its owner"""
+        assert self.cache.acquire_generation_lease(self.key, "a")
+        assert self.cache.acquire_generation_lease(self.key, "a")
+        assert not self.cache.acquire_generation_lease(self.key, "b")
+
+        self.cache.release_generation_lease(self.key, "b")
+        assert not self.cache.acquire_generation_lease(self.key, "b")
+
+        self.cache.release_generation_lease(self.key, "a")
+        assert self.cache.acquire_generation_lease(self.key, "b")
+
+    def test_expired_lease_can_be_taken_over(self):
+        """Test that a lease abandoned by a crashed process expires"""
+        assert self.cache.acquire_generation_lease(self.key, "a", ttl=-1)
+        assert self.cache.acquire_generation_lease(self.key, "b")
+
+
+class TestGenerationFailures:
+    """Test cases for the negative cache of failed generations"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = CodeCache(
+            db_path=os.path.join(self.temp_dir, "test.db"),
+            cache_dir=os.path.join(self.temp_dir, "cache"),
+            backoff_policy=BackoffPolicy(base_delay=10, max_delay=25),
+        )
+        self.key = self.cache.generation_key(
+            "https://shop.com/list", "<div></div>", ["title"]
+        )
+
+    def test_backoff_grows_with_attempts(self):
+        """Test that repeated failures back off exponentially"""
+        first = self.cache.record_failure(self.key, "timeout")
+        second = self.cache.record_failure(self.key, "timeout")
+        third = self.cache.record_failure(self.key, "no records")
+
+        assert (first.attempts, second.attempts, third.attempts) == (1, 2, 3)
+        assert 9 < first.retry_in <= 10
+        assert 19 < second.retry_in <= 20
+        assert 24 < third.retry_in <= 25
+
+        failure = self.cache.get_recent_failure(self.key)
+        assert failure.reason == "no records"
+        assert self.cache.get_cache_stats()["failures"]["backing_off"] == 1
+
+    def test_expired_and_cleared_failures(self):
+        """Test that failures stop blocking after backoff or success"""
+        self.cache.backoff_policy = BackoffPolicy(base_delay=0)
+        self.cache.record_failure(self.key, "timeout")
+        assert self.cache.get_recent_failure(self.key) is None
+
+        self.cache.backoff_policy = BackoffPolicy(base_delay=10)
+        self.cache.record_failure(self.key, "timeout")
+        assert self.cache.get_recent_failure(self.key).attempts == 2
+        self.cache.clear_failure(self.key)
+        assert self.cache.get_recent_failure(self.key) is None
+
+    def test_remove_code(self):
+        """Test removing a stored entry"""
+        self.cache.store_code(
+            "https://shop.com/list", "<div></div>", ["title"], "code"
+        )
+        assert self.cache.remove_code(
+            "https://shop.com/list", "<div></div>", ["title"]
+        )
+        assert self.cache.get_cached_code(
+            "https://shop.com/list", "<div></div>", ["title"]
+        ) is None
+
+
+class TestVersioning:
+    """Test cases for entry versions, scoped invalidation and migration"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "test.db")
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        self.html = "<div class='item'><h2>A</h2></div>"
+
+    def _cache(self, cache_class=CodeCache):
+        return cache_class(db_path=self.db_path, cache_dir=self.cache_dir)
+
+    def test_entries_served_only_to_matching_versions(self):
+        """Test that a prompt version change does not mix entries"""
+        cache = self._cache()
+        cache.set_versions(model_name="model-a", prompt_version="1")
+        cache.store_code("https://shop.com", self.html, ["t"], "code")
+
+        cache.set_versions(prompt_version="2")
+        assert cache.get_cached_code("https://shop.com", self.html, ["t"]) \
+            is None
+
+        # The model is recorded but does not restrict lookups by default
+        cache.set_versions(model_name="model-b", prompt_version="1")
+        assert cache.get_cached_code("https://shop.com", self.html, ["t"]) \
+            == "code"
+
+        with pytest.raises(ValueError):
+            cache.set_versions(temperature="0")
+
+    def test_invalidate_versions(self):
+        """Test removing only one model's entries"""
+        cache = self._cache()
+        cache.set_versions(model_name="model-a")
+        cache.store_code("https://a.com", self.html, ["t"], "code_a")
+        cache.set_versions(model_name="model-b")
+        cache.store_code("https://b.com", self.html, ["t"], "code_b")
+
+        assert cache.invalidate_versions(model_name="model-a") == 1
+        assert cache.get_cached_code("https://a.com", self.html, ["t"]) \
+            is None
+        assert cache.get_cached_code("https://b.com", self.html, ["t"]) \
+            == "code_b"
+
+        stats = cache.get_cache_stats()["versions"]
+        assert stats["entries"][0]["model_name"] == "model-b"
+
+        with pytest.raises(ValueError):
+            cache.invalidate_versions(domain="b.com")
+
+    def test_hash_scheme_change_is_migrated_lazily(self):
+        """Test that entries are re-fingerprinted from archived HTML"""
+        self._cache().store_code(
+            "https://shop.com/a", self.html, ["t"], "code"
+        )
+
+        class NewSchemeCache(CodeCache):
+            STRUCTURAL_HASH_VERSION = 2
+
+            def _structural_html(self, html_content):
+                return "v2:" + super()._structural_html(html_content)
+
+        cache = self._cache(NewSchemeCache)
+        assert cache.get_cache_stats()["versions"]["outdated_hash_scheme"] \
+            == 1
+
+        assert cache.get_cached_code(
+            "https://shop.com/a", self.html, ["t"]
+        ) == "code"
+        assert cache.get_cache_stats()["versions"]["outdated_hash_scheme"] \
+            == 0
+
+    def test_legacy_bundle_entries_get_default_versions(self):
+        """Test that bundles without version columns still import"""
+        from universal_scraper.core.caching.bundle import write_bundle
+
+        source = self._cache()
+        source.store_code("https://shop.com", self.html, ["t"], "code")
+        bundle_path = os.path.join(self.temp_dir, "old.bundle")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            entries = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT url_clean, structural_hash, fields_hash, "
+                    "extraction_code, domain FROM extraction_cache"
+                )
+            ]
+        write_bundle(bundle_path, entries)
+
+        target = CodeCache(
+            db_path=os.path.join(self.temp_dir, "target.db"),
+            cache_dir=os.path.join(self.temp_dir, "target"),
+        )
+        target.import_bundle(bundle_path)
+        assert target.get_cached_code("https://shop.com", self.html, ["t"]) \
+            == "code"
+
+    def test_model_tier_per_domain(self):
+        """Test that the successful model tier is remembered per domain"""
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        tiers = ["small-model", "large-model"]
+
+        assert cache.get_model_tier("https://shop.com/a", tiers) is None
+
+        cache.record_model_tier("https://shop.com/a", tiers, 1)
+
+        assert cache.get_model_tier("https://shop.com/b?page=2", tiers) == 1
+        assert cache.get_model_tier("https://other.com/a", tiers) is None
+        # A different tier list starts from scratch
+        assert cache.get_model_tier("https://shop.com/a", ["x", "y"]) is None
+
+    def test_generation_usage_and_tokens_avoided(self):
+        """Test that hits on an entry count the LLM tokens they avoided"""
+        from universal_scraper.core.llm import TokenUsage
+
+        cache = CodeCache(db_path=self.db_path, cache_dir=self.cache_dir)
+        url = "https://example.com/list"
+        html_content = "<div class='item'><h2>Title</h2></div>"
+        fields = ["title"]
+        code = "def extract_data(html_content): return []"
+
+        cache.store_code(
+            url,
+            html_content,
+            fields,
+            code,
+            usage=TokenUsage(
+                prompt_tokens=1000, completion_tokens=200, cost=0.01, calls=1
+            ),
+        )
+        cache.store_code(
+            "https://example.com/other", "<p>x</p>", fields, code
+        )
+        cache.get_cached_code(url, html_content, fields)
+        cache.get_cached_code(url, html_content, fields)
+
+        usage = cache.get_cache_stats()["llm_usage"]
+        # The entry stored without usage is not metered
+        assert usage["metered_entries"] == 1
+        assert usage["generation_tokens"] == 1200
+        assert usage["tokens_avoided_by_hits"] == 2400
+        assert usage["cost_avoided_by_hits"] == pytest.approx(0.02)
@@ -77,6 +77,16 @@ class TestDataExtractor:
         assert extractor.model_name == "gpt-4"
         assert extractor.use_litellm is True
 
+    def test_usable_response_needs_compiling_code(self):
+        """Test the check deciding which hedged response wins"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        check = DataExtractor._is_usable_response
+        assert check("```python\ndef extract_data(html):\n    return []\n```")
+        assert not check("Sorry, I cannot help with that page.")
+        assert not check("```python\ndef extract_data(html:\n```")
+        assert not check("")
+
     def test_directories_created(self):
         """Test that required directories are created"""
         from universal_scraper.core.data_extractor import DataExtractor
@@ -178,3 +188,878 @@ class TestDataExtractor:
                     )
                     assert hasattr(extractor, "logger")
                     assert extractor.logger is not None
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_execute_extraction_code_reuses_compiled_function(self):
+        """Test that the same code is compiled once and reused per page"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        code = (
+            "def extract_data(html_content):\n"
+            "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+            "    return [{'title': h.get_text()} for h in soup.find_all('h2')]\n"
+        )
+
+        first = extractor.execute_extraction_code(code, "<h2>A</h2>")
+        second = extractor.execute_extraction_code(
+            code, "<h2>B</h2><h2>C</h2>"
+        )
+
+        assert first == [{"title": "A"}]
+        assert second == [{"title": "B"}, {"title": "C"}]
+        stats = extractor.compiled_extractors.get_stats()
+        assert stats["compilations"] == 1
+        assert stats["hits"] == 1
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_execute_extraction_code_without_extract_data(self):
+        """Test that code lacking extract_data is rejected"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+            enable_cache=False,
+        )
+
+        with pytest.raises(Exception, match="extract_data"):
+            extractor.execute_extraction_code("x = 1", "<div></div>")
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_sandbox_engine_runs_code_in_workers(self):
+        """Test that the sandbox engine keeps generated code out of process"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+            execution_engine="sandbox",
+            execution_workers=1,
+            execution_timeout=2.0,
+        )
+        code = (
+            "def extract_data(html_content):\n"
+            "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+            "    return [{'title': h.get_text()} for h in soup.find_all('h2')]\n"
+        )
+        try:
+            data = extractor.execute_extraction_code(code, "<h2>A</h2>")
+            with pytest.raises(Exception, match="did not finish"):
+                extractor.execute_extraction_code(
+                    "def extract_data(html_content):\n    while True: pass",
+                    "<h2>A</h2>",
+                )
+            stats = extractor.get_cache_stats()["execution_pool"]
+        finally:
+            extractor.execution_pool.close()
+
+        assert data == [{"title": "A"}]
+        assert extractor.compiled_extractors.get_stats()["compilations"] == 0
+        assert stats["timeouts"] == 1
+        assert stats["replaced"] == 1
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_structural_miss_reuses_code_that_still_works(self):
+        """Test that a cosmetic change is served by trial execution"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        code = (
+            "def extract_data(html_content):\n"
+            "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+            "    return [{'title': h.get_text()}\n"
+            "            for h in soup.select('.item h2')]\n"
+        )
+        url = "https://shop.com/list"
+        old_html = "<div class='item'><h2>A</h2></div>"
+        new_html = (
+            "<div class='banner'><p>Sale</p></div>"
+            "<div class='item'><h2>A</h2></div>"
+        )
+        extractor.code_cache.store_code(
+            url, old_html, ["title"], code, model_name="gpt-4o-mini"
+        )
+
+        with patch.object(
+            extractor, "_generate_content_with_ai"
+        ) as mock_generate:
+            result = extractor.generate_beautifulsoup_code(
+                new_html, url, ["title"]
+            )
+            mock_generate.assert_not_called()
+
+        assert result == code
+        # Registered under the new structural hash
+        assert extractor.code_cache.get_cached_code(
+            url, new_html, ["title"]
+        ) == code
+        # Both entries keep the model that generated the code
+        cache = extractor.code_cache
+        assert cache.invalidate_versions(model_name="gpt-4") == 0
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_trial_compares_record_count_on_cleaned_html(self):
+        """Test that code generated on a sampled page survives a trial"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        code = (
+            "def extract_data(html_content):\n"
+            "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+            "    return [{'title': h.get_text()}\n"
+            "            for h in soup.select('.item h2')]"
+        )
+        url = "https://shop.com/list"
+        item = "<div class='item'><h2>A</h2></div>"
+        # Cleaning keeps two of the page's twenty items
+        cleaned_html = item * 2
+        original_html = item * 20
+        changed_html = "<div class='banner'><p>Sale</p></div>" + item * 2
+
+        with patch.object(
+            extractor, "_generate_content_with_ai", return_value=code
+        ) as mock_generate:
+            extractor.generate_beautifulsoup_code(
+                cleaned_html, url, ["title"], validation_html=original_html
+            )
+            result = extractor.generate_beautifulsoup_code(
+                changed_html, url, ["title"]
+            )
+            mock_generate.assert_called_once()
+
+        assert result == code
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_structural_miss_regenerates_when_trial_fails(self):
+        """Test that failed trial validation falls through to the model"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        url = "https://shop.com/list"
+        extractor.code_cache.store_code(
+            url,
+            "<div class='item'><h2>A</h2></div>",
+            ["title"],
+            "def extract_data(html_content):\n    return []\n",
+        )
+        new_code = "def extract_data(html_content):\n    return [1]\n"
+
+        with patch.object(
+            extractor, "_generate_content_with_ai", return_value=new_code
+        ) as mock_generate:
+            result = extractor.generate_beautifulsoup_code(
+                "<table><tr><td>A</td></tr></table>", url, ["title"]
+            )
+            mock_generate.assert_called_once()
+
+        assert result == new_code.strip()
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_narrower_fields_served_from_superset_extractor(self):
+        """Test that a field subset reuses code cached for a superset"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        code = (
+            "def extract_data(html_content):\n"
+            "    return [{'title': 'A', 'price': '1', 'rating': 5,\n"
+            "             'availability': 'yes'}]\n"
+        )
+        url = "https://shop.com/product/1"
+        html = "<div class='product'><h1>A</h1></div>"
+        extractor.code_cache.store_code(
+            url,
+            html,
+            ["title", "price", "rating", "availability"],
+            code,
+            model_name="gpt-4o-mini",
+        )
+
+        with patch.object(
+            extractor, "_generate_content_with_ai"
+        ) as mock_generate:
+            projected = extractor.generate_beautifulsoup_code(
+                html, "https://shop.com/product/2", ["price", "title"]
+            )
+            mock_generate.assert_not_called()
+
+        assert extractor.execute_extraction_code(projected, html) == [
+            {"price": "1", "title": "A"}
+        ]
+        # The projection is cached under the narrower field set
+        assert extractor.code_cache.get_cached_code(
+            "https://shop.com/product/2", html, ["price", "title"]
+        ) == projected
+        # ...and records the model that generated the superset code
+        cache = extractor.code_cache
+        assert cache.invalidate_versions(model_name="gpt-4") == 0
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_failing_superset_projection_is_not_cached(self):
+        """Test that a projection that does not validate falls through"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        html = "<div class='product'><h1>A</h1></div>"
+        extractor.code_cache.store_code(
+            "https://shop.com/product/1",
+            html,
+            ["title", "price", "rating"],
+            "def extract_data(html_content):\n    return []\n",
+        )
+        new_code = (
+            "def extract_data(html_content):\n"
+            "    return [{'title': 'A', 'price': '1'}]"
+        )
+
+        with patch.object(
+            extractor, "_generate_content_with_ai", return_value=new_code
+        ) as mock_generate:
+            code = extractor.generate_beautifulsoup_code(
+                html, "https://shop.com/product/2", ["price", "title"]
+            )
+            mock_generate.assert_called_once()
+
+        assert code == new_code
+        assert extractor.code_cache.get_cached_code(
+            "https://shop.com/product/2", html, ["price", "title"]
+        ) == new_code
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_concurrent_misses_share_one_generation(self):
+        """Test that concurrent misses for one template call the AI once"""
+        import threading
+        import time
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        html = "<div class='product'><h1>A</h1></div>"
+        code = "def extract_data(html_content):\n    return [{'title': 'A'}]"
+
+        def slow_generation(prompt):
+            time.sleep(0.3)
+            return code
+
+        results = []
+        with patch.object(
+            extractor, "_generate_content_with_ai", side_effect=slow_generation
+        ) as mock_generate:
+            threads = [
+                threading.Thread(
+                    target=lambda i=i: results.append(
+                        extractor.generate_beautifulsoup_code(
+                            html, f"https://shop.com/product/{i}", ["title"]
+                        )
+                    )
+                )
+                for i in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            mock_generate.assert_called_once()
+
+        assert results == [code] * 4
+        assert extractor.generation_flights.get_stats()["followers"] == 3
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_waits_for_generation_lease_held_by_another_process(self):
+        """Test that a lease held elsewhere is waited for, not duplicated"""
+        import threading
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        extractor.generation_poll_interval = 0.05
+        url = "https://shop.com/list"
+        html = "<div class='item'><h2>A</h2></div>"
+        code = "def extract_data(html_content):\n    return []"
+        cache = extractor.code_cache
+        key = cache.generation_key(url, html, ["title"])
+        assert cache.acquire_generation_lease(key, "other-process")
+
+        def other_process_finishes():
+            cache.store_code(url, html, ["title"], code)
+            cache.release_generation_lease(key, "other-process")
+
+        timer = threading.Timer(0.2, other_process_finishes)
+        timer.start()
+        with patch.object(
+            extractor, "_generate_content_with_ai"
+        ) as mock_generate:
+            result = extractor.generate_beautifulsoup_code(
+                html, url, ["title"]
+            )
+            mock_generate.assert_not_called()
+        timer.join()
+
+        assert result == code
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_failed_generation_backs_off(self):
+        """Test that a failed generation is not retried during backoff"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper import RecentlyFailedError
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        html = "<div class='item'><h2>A</h2></div>"
+
+        with patch.object(
+            extractor,
+            "_generate_content_with_ai",
+            side_effect=Exception("quota exceeded"),
+        ) as mock_generate:
+            with pytest.raises(Exception, match="quota exceeded"):
+                extractor.generate_beautifulsoup_code(
+                    html, "https://shop.com/item/1", ["title"]
+                )
+            with pytest.raises(RecentlyFailedError) as error:
+                extractor.generate_beautifulsoup_code(
+                    html, "https://shop.com/item/2", ["title"]
+                )
+            mock_generate.assert_called_once()
+
+        assert error.value.failure.attempts == 1
+        assert "quota exceeded" in error.value.failure.reason
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_generated_code_without_extract_data_is_not_cached(self):
+        """Test that unusable generated code is rejected and recorded"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        url = "https://shop.com/list"
+        html = "<div class='item'><h2>A</h2></div>"
+
+        with patch.object(
+            extractor, "_generate_content_with_ai", return_value="x = 1"
+        ):
+            with pytest.raises(Exception, match="extract_data"):
+                extractor.generate_beautifulsoup_code(html, url, ["title"])
+
+        cache = extractor.code_cache
+        assert cache.get_cached_code(url, html, ["title"]) is None
+        key = cache.generation_key(url, html, ["title"])
+        assert cache.get_recent_failure(key) is not None
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_generated_code_with_no_records_is_dropped(self):
+        """Test that code still returning nothing after repairs backs off"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper import RecentlyFailedError
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        html = "<div class='item'><h2>A</h2></div>"
+        code = "def extract_data(html_content):\n    return []"
+
+        with patch.object(
+            extractor, "_generate_content_with_ai", return_value=code
+        ) as mock_generate:
+            with pytest.raises(Exception, match="no records"):
+                extractor.extract_data(
+                    html, "https://shop.com/item/1", ["title"]
+                )
+            with pytest.raises(RecentlyFailedError):
+                extractor.extract_data(
+                    html, "https://shop.com/item/2", ["title"]
+                )
+            assert mock_generate.call_count == (
+                1 + extractor.max_repair_attempts
+            )
+
+        assert extractor.code_cache.get_cached_code(
+            "https://shop.com/item/1", html, ["title"]
+        ) is None
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_cache_entries_record_generation_versions(self):
+        """Test that the model, prompt and cleaner versions are recorded"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.cleaning import HtmlCleaner
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+
+        assert extractor.code_cache.versions == {
+            "model_name": "gpt-4",
+            "prompt_version": DataExtractor.PROMPT_VERSION,
+            "cleaner_version": HtmlCleaner.VERSION,
+        }
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_generation_goes_through_llm_client(self):
+        """Test that model calls use the bounded async client"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import AsyncLLMClient, StubProvider
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+            llm_max_concurrency=2,
+            llm_timeout=30.0,
+        )
+        assert extractor.llm_client.max_concurrency == 2
+        assert extractor.llm_client.timeout == 30.0
+
+        provider = StubProvider(responses=["x = 1"])
+        extractor.llm_client.close()
+        extractor.llm_client = AsyncLLMClient(provider)
+        try:
+            assert extractor._generate_content_with_ai("prompt") == "x = 1"
+        finally:
+            extractor.llm_client.close()
+
+        assert provider.prompts == ["prompt"]
+        assert extractor.get_cache_stats()["llm_client"]["requests"] == 1
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_fallback_models_are_raced(self):
+        """Test that fallback models become hedge providers"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4o-mini",
+            llm_fallback_models=["gpt-4o-mini", "gpt-4o", "claude-3-haiku"],
+            llm_hedge_delay=5.0,
+        )
+
+        fallbacks = extractor.llm_client.fallbacks
+        assert [p.model_name for p in fallbacks] == [
+            "gpt-4o",
+            "claude-3-haiku",
+        ]
+        # Only the primary's provider shares the configured key
+        assert [p.api_key for p in fallbacks] == ["test_key", None]
+        assert extractor.llm_client.hedge_policy.initial_delay == 5.0
+        extractor.llm_client.close()
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_tiered_generation_escalates_on_invalid_code(self):
+        """Test that a stronger tier is used only when validation fails"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import StubProvider
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            llm_tiers=["gpt-4o-mini", "gpt-4o"],
+        )
+        assert extractor.model_name == "gpt-4o"
+
+        empty_code = "def extract_data(html_content):\n    return []"
+        good_code = (
+            "def extract_data(html_content):\n"
+            "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+            "    return [{'title': h.get_text()}\n"
+            "            for h in soup.find_all('h2')]"
+        )
+        cheap = StubProvider(
+            responses=[empty_code], model_name="gpt-4o-mini"
+        )
+        strong = StubProvider(responses=[good_code], model_name="gpt-4o")
+        extractor.tier_providers = [cheap, strong]
+
+        html = "<h2>A</h2>"
+        try:
+            code = extractor.generate_beautifulsoup_code(
+                html,
+                "https://shop.com/list",
+                ["title"],
+                validation_html="<h2>A</h2><h2>B</h2>",
+            )
+            assert code == good_code
+            # The cheap tier's code is repaired before escalating
+            assert len(cheap.prompts) == 1 + extractor.max_repair_attempts
+            assert len(strong.prompts) == 1
+
+        finally:
+            extractor.llm_client.close()
+
+        # The next miss on the domain starts at the tier that worked
+        assert extractor._starting_tier("https://shop.com/other") == 1
+        assert extractor._starting_tier("https://news.com/") == 0
+        stats = extractor.get_cache_stats()["model_tiers"]
+        assert stats["successes"] == {"gpt-4o": 1}
+        assert stats["escalations"] == 1
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_cache_entry_records_the_model_that_answered(self):
+        """Test that the tier producing the code is recorded, not the top"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import StubProvider
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            llm_tiers=["gpt-4o-mini", "gpt-4o"],
+        )
+        good_code = (
+            "def extract_data(html_content):\n"
+            "    return [{'title': 'A'}]"
+        )
+        extractor.tier_providers = [
+            StubProvider(responses=[good_code], model_name="gpt-4o-mini"),
+            StubProvider(responses=[good_code], model_name="gpt-4o"),
+        ]
+
+        try:
+            extractor.generate_beautifulsoup_code(
+                "<h2>A</h2>", "https://shop.com/list", ["title"]
+            )
+        finally:
+            extractor.llm_client.close()
+
+        cache = extractor.code_cache
+        assert cache.invalidate_versions(model_name="gpt-4o") == 0
+        assert cache.invalidate_versions(model_name="gpt-4o-mini") == 1
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_failing_generated_code_is_repaired(self):
+        """Test that execution errors are sent back to the model"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        url = "https://shop.com/list"
+        html = "<div class='item'><h2>A</h2></div>"
+        broken_code = (
+            "def extract_data(html_content):\n"
+            "    return [{'title': html_content.missing_attribute}]"
+        )
+        fixed_code = (
+            "def extract_data(html_content):\n"
+            "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+            "    return [{'title': h.get_text()}\n"
+            "            for h in soup.find_all('h2')]"
+        )
+
+        with patch.object(
+            extractor,
+            "_generate_content_with_ai",
+            side_effect=[broken_code, fixed_code],
+        ) as mock_generate:
+            code = extractor.generate_beautifulsoup_code(html, url, ["title"])
+
+            repair_prompt = mock_generate.call_args_list[1][0][0].text
+
+        assert code == fixed_code
+        assert "AttributeError" in repair_prompt
+        assert "missing_attribute" in repair_prompt
+        assert broken_code in repair_prompt
+        assert extractor.code_cache.get_cached_code(
+            url, html, ["title"]
+        ) == fixed_code
+        assert extractor.get_cache_stats()["code_repairs"] == {
+            "attempts": 1,
+            "repaired": 1,
+            "exhausted": 0,
+        }
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_code_failing_on_full_page_is_repaired(self):
+        """Test that code is also checked on the page it will run on"""
+        from universal_scraper.core.data_extractor import DataExtractor
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        cleaned_html = "<div class='item'><h2>A</h2></div>"
+        original_html = "<main>" + cleaned_html + "</main>"
+        sample_only_code = (
+            "def extract_data(html_content):\n"
+            "    if html_content.startswith('<main>'):\n"
+            "        return []\n"
+            "    return [{'title': 'A'}]"
+        )
+        full_page_code = (
+            "def extract_data(html_content):\n    return [{'title': 'A'}]"
+        )
+
+        with patch.object(
+            extractor,
+            "_generate_content_with_ai",
+            side_effect=[sample_only_code, full_page_code],
+        ) as mock_generate:
+            data = extractor.extract_data_with_separation(
+                cleaned_html, original_html, "https://shop.com/list", ["title"]
+            )
+
+            assert mock_generate.call_count == 2
+            assert "no records" in mock_generate.call_args_list[1][0][0].text
+
+        assert data == [{"title": "A"}]
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_generation_usage_is_accounted(self):
+        """Test that generation tokens are tracked per run and per entry"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import AsyncLLMClient, StubProvider
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        code = "def extract_data(html_content):\n    return [{'title': 'A'}]"
+        extractor.llm_client.close()
+        extractor.llm_client = AsyncLLMClient(
+            StubProvider(responses=[code], model_name="gpt-4")
+        )
+        url = "https://shop.com/list"
+        html = "<div class='item'><h2>A</h2></div>"
+
+        try:
+            extractor.extract_data(html, url, ["title"])
+            generated = extractor.get_last_usage()
+            extractor.extract_data(html, url, ["title"])
+            cached = extractor.get_last_usage()
+        finally:
+            extractor.llm_client.close()
+
+        assert generated["calls"] == 1
+        assert generated["prompt_tokens"] > 0
+        assert cached["calls"] == 0
+
+        usage = extractor.get_llm_usage()
+        assert usage["by_domain"]["shop.com"]["calls"] == 1
+        assert usage["cache"]["tokens_avoided_by_hits"] == (
+            generated["total_tokens"]
+        )
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_async_generation_usage_is_attributed_to_domain(self):
+        """Test that async generations are accounted like sync ones"""
+        import asyncio
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import AsyncLLMClient, StubProvider
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        extractor.llm_client.close()
+        extractor.llm_client = AsyncLLMClient(
+            StubProvider(responses=["code"], model_name="gpt-4")
+        )
+        extractor._generation_state.url = "https://shop.com/list"
+
+        try:
+            asyncio.run(extractor._agenerate_content_with_ai("prompt"))
+        finally:
+            extractor.llm_client.close()
+
+        usage = extractor.get_llm_usage()
+        assert usage["by_domain"]["shop.com"]["calls"] == 1
+        assert extractor.get_last_usage()["calls"] == 1
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_prompts_share_a_cacheable_prefix(self):
+        """Test that page and fields only appear after the fixed prefix"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import AsyncLLMClient, StubProvider
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        first = extractor._build_generation_prompt(
+            "<h2>Shoes</h2>", ["title"]
+        )
+        second = extractor._build_generation_prompt(
+            "<span>Jobs</span>", ["company_name", "salary_range"]
+        )
+
+        assert first.instructions == second.instructions
+        assert "Shoes" not in first.instructions
+        assert "salary_range" in second.content
+        assert second.text.endswith("```<span>Jobs</span>```\n")
+
+        extractor.llm_client.close()
+        extractor.llm_client = AsyncLLMClient(
+            StubProvider(responses=["x = 1"], model_name="gpt-4")
+        )
+        try:
+            extractor._generate_content_with_ai(first)
+            extractor._generate_content_with_ai(second)
+        finally:
+            extractor.llm_client.close()
+
+        total = extractor.get_llm_usage()["total"]
+        assert total["cached_tokens"] > 0
+        assert 0 < total["cached_share"] < 1
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_streamed_generation_stops_at_code_block(self):
+        """Test that streamed code is used without its trailing text"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import (
+            AsyncLLMClient,
+            StubProvider,
+            code_block_end,
+        )
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+        )
+        assert extractor.llm_client.streaming is True
+        assert extractor.llm_client.stream_stop is code_block_end
+
+        code = "def extract_data(html_content):\n    return [{'title': 'A'}]"
+        provider = StubProvider(
+            responses=[f"```python\n{code}\n```\nThis function finds..."],
+            model_name="gpt-4",
+        )
+        extractor.llm_client.close()
+        extractor.llm_client = AsyncLLMClient(
+            provider, streaming=True, stream_stop=code_block_end
+        )
+        try:
+            generated = extractor.generate_beautifulsoup_code(
+                "<h2>A</h2>", "https://shop.com/list", ["title"]
+            )
+        finally:
+            extractor.llm_client.close()
+
+        assert generated == code
+        assert extractor.get_cache_stats()["llm_client"]["stopped_early"] == 1
+
+    def test_given_provider_needs_no_api_setup(self):
+        """Test that a ready provider replaces the model-name lookup"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import StubProvider
+
+        provider = StubProvider(model_name="offline-model")
+        extractor = DataExtractor(
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            llm_provider=provider,
+        )
+        try:
+            assert extractor.model_name == "offline-model"
+            assert extractor.llm_client.provider is provider
+        finally:
+            extractor.llm_client.close()
+
+    @patch("universal_scraper.core.data_extractor.LITELLM_AVAILABLE", True)
+    def test_oversized_page_prompt_fits_budget(self):
+        """Test that prompts for oversized pages stay within the budget"""
+        from universal_scraper.core.data_extractor import DataExtractor
+        from universal_scraper.core.llm import count_tokens
+
+        extractor = DataExtractor(
+            api_key="test_key",
+            temp_dir=self.temp_dir,
+            output_dir=self.output_dir,
+            model_name="gpt-4",
+            llm_max_prompt_tokens=3000,
+        )
+        cards = "".join(
+            f'<div class="card"><h2>Item {i}</h2>'
+            f'<p>{"Details of the item. " * 10}</p></div>'
+            for i in range(300)
+        )
+        html = f"<html><body><main>{cards}</main></body></html>"
+
+        try:
+            prompt = extractor._build_generation_prompt(html, ["title"])
+            repair = extractor._build_repair_prompt(
+                "def extract_data(html_content):\n    return []",
+                html,
+                ["title"],
+                "it returned no records",
+            )
+        finally:
+            extractor.llm_client.close()
+
+        assert count_tokens(prompt.text) <= 3000
+        assert count_tokens(repair.text) <= 3000
+        assert "Item 0" in prompt.content
+        assert "only a representative part" in prompt.content
+        assert extractor.get_cache_stats()["prompt_budget"]["subtree"] >= 1
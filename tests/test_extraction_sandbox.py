@@ -0,0 +1,157 @@
+"""Tests for the sandboxed extraction worker pool"""
+
+import os
+import time
+import signal
+
+import pytest
+from bs4 import BeautifulSoup
+
+from universal_scraper.core.extraction_sandbox import (
+    ExtractionWorkerPool,
+    ExtractionCodeError,
+    ExtractionTimeoutError,
+    WorkerCrashedError,
+)
+
+TITLES_CODE = (
+    "def extract_data(html_content):\n"
+    "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+    "    return [{'title': h.get_text()} for h in soup.find_all('h2')]\n"
+)
+
+
+def namespace():
+    return {"BeautifulSoup": BeautifulSoup}
+
+
+@pytest.fixture
+def pool():
+    with ExtractionWorkerPool(
+        namespace, workers=1, timeout=2.0, max_memory_mb=256
+    ) as pool:
+        yield pool
+
+
+class TestExtractionWorkerPool:
+    """Test cases for ExtractionWorkerPool class"""
+
+    def test_runs_code_and_reuses_page(self, pool):
+        """Test that a page held by the worker is not sent again"""
+        html = "<h2>A</h2><h2>B</h2>"
+
+        assert pool.run(TITLES_CODE, html) == [
+            {"title": "A"},
+            {"title": "B"},
+        ]
+        assert pool.run(TITLES_CODE, html) == [
+            {"title": "A"},
+            {"title": "B"},
+        ]
+        assert pool.run(TITLES_CODE, "<h2>C</h2>") == [{"title": "C"}]
+
+        stats = pool.get_stats()
+        assert stats["pages_sent"] == 2
+        assert stats["pages_reused"] == 1
+
+    def test_pages_of_equal_length_are_told_apart(self, pool):
+        """Test that a different page of the same length is sent again"""
+        assert pool.run(TITLES_CODE, "<h2>A</h2>") == [{"title": "A"}]
+        assert pool.run(TITLES_CODE, "<h2>B</h2>") == [{"title": "B"}]
+        assert pool.get_stats()["pages_sent"] == 2
+
+    def test_pages_larger_than_buffer_are_piped(self):
+        """Test that pages beyond the shared buffer still arrive intact"""
+        html = "<h2>é</h2>" * 200
+
+        with ExtractionWorkerPool(
+            namespace, workers=1, max_html_bytes=100
+        ) as pool:
+            data = pool.run(TITLES_CODE, html)
+
+        assert len(data) == 200
+        assert data[0] == {"title": "é"}
+
+    def test_errors_carry_worker_traceback(self, pool):
+        """Test that exceptions of the code are reported with its line"""
+        code = (
+            "def extract_data(html_content):\n"
+            "    return [{'title': html_content.missing_attribute}]\n"
+        )
+
+        with pytest.raises(ExtractionCodeError) as error:
+            pool.run(code, "<h2>A</h2>")
+        with pytest.raises(ExtractionCodeError, match="extract_data"):
+            pool.load("x = 1")
+
+        assert "AttributeError" in str(error.value)
+        assert "missing_attribute" in error.value.remote_traceback
+        assert pool.get_stats()["replaced"] == 0
+
+    def test_hanging_code_is_killed_and_replaced(self, pool):
+        """Test that a call past the timeout costs only its worker"""
+        code = "def extract_data(html_content):\n    while True: pass\n"
+
+        with pytest.raises(ExtractionTimeoutError):
+            pool.run(code, "<h2>A</h2>")
+
+        assert pool.run(TITLES_CODE, "<h2>A</h2>") == [{"title": "A"}]
+        stats = pool.get_stats()
+        assert stats["timeouts"] == 1
+        assert stats["replaced"] == 1
+
+    def test_replacements_are_forked_by_the_spawner(self, pool):
+        """Test that workers never fork from the threaded parent"""
+        code = (
+            "import os\n"
+            "def extract_data(html_content):\n"
+            "    return [os.getppid()]\n"
+        )
+        hang = "def extract_data(html_content):\n    while True: pass\n"
+
+        assert pool.run(code, "") == [pool._spawner.pid]
+        with pytest.raises(ExtractionTimeoutError):
+            pool.run(hang, "")
+        assert pool.run(code, "") == [pool._spawner.pid]
+
+    def test_crash_reports_exit_code_of_reaped_worker(self, pool):
+        """Test that the spawner reaps a crashed worker for its exit code"""
+        code = (
+            "import os\n"
+            "def extract_data(html_content):\n"
+            "    os._exit(3)\n"
+        )
+        pid = pool._workers[0].pid
+
+        with pytest.raises(WorkerCrashedError, match="exit code 3"):
+            pool.run(code, "")
+
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+        assert pool.run(TITLES_CODE, "<h2>A</h2>") == [{"title": "A"}]
+
+    def test_worker_dead_while_idle_is_replaced(self, pool):
+        """Test that a worker killed between calls is replaced first"""
+        worker = pool._workers[0]
+        os.kill(worker.pid, signal.SIGKILL)
+        deadline = time.monotonic() + 5
+        while worker.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert pool.run(TITLES_CODE, "<h2>A</h2>") == [{"title": "A"}]
+        stats = pool.get_stats()
+        assert stats["replaced"] == 1
+        assert stats["crashes"] == 0
+
+    def test_memory_limit_stops_allocation(self, pool):
+        """Test that code allocating past the limit fails and is recycled"""
+        code = (
+            "def extract_data(html_content):\n"
+            "    return [len(bytearray(1024 * 1024 * 1024))]\n"
+        )
+
+        with pytest.raises(ExtractionCodeError, match="MemoryError"):
+            pool.run(code, "<h2>A</h2>")
+
+        assert pool.run(TITLES_CODE, "<h2>A</h2>") == [{"title": "A"}]
+        assert pool.get_stats()["recycled"] == 1
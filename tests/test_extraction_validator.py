@@ -0,0 +1,47 @@
+"""Tests for the ExtractionValidator module"""
+
+from universal_scraper.core.extraction_validator import ExtractionValidator
+
+
+class TestExtractionValidator:
+    """Test cases for ExtractionValidator class"""
+
+    def test_valid_records(self):
+        """Test that filled records pass validation"""
+        result = ExtractionValidator().validate(
+            [{"title": "A", "price": "1"}, {"title": "B", "price": None}],
+            ["title", "price"],
+        )
+        assert result.valid is True
+        assert result.record_count == 2
+        assert result.fill_rate == 0.75
+        assert result.empty_fields == []
+
+    def test_empty_result_is_invalid(self):
+        """Test that empty output fails validation"""
+        result = ExtractionValidator().validate([], ["title"])
+        assert result.valid is False
+        assert "records" in result.reason
+
+    def test_low_fill_rate_is_invalid(self):
+        """Test that mostly empty fields fail validation"""
+        result = ExtractionValidator(min_fill_rate=0.5).validate(
+            [{"title": "A", "price": ""}, {"title": " ", "price": None}],
+            ["title", "price"],
+        )
+        assert result.valid is False
+        assert result.fill_rate == 0.25
+        assert result.empty_fields == ["price"]
+
+    def test_expected_record_count(self):
+        """Test that far fewer records than expected fail validation"""
+        validator = ExtractionValidator(min_record_ratio=0.5)
+        records = [{"title": "A"}]
+        assert validator.validate(records, ["title"], 2).valid is True
+        assert validator.validate(records, ["title"], 10).valid is False
+
+    def test_dict_result_counts_as_one_record(self):
+        """Test that a structured dict result is treated as one record"""
+        result = ExtractionValidator().validate({"title": "A"}, ["title"])
+        assert result.valid is True
+        assert result.record_count == 1
@@ -402,3 +402,71 @@ class TestHtmlCleaner:
         # Main content should be preserved
         assert "Article Title" in result
         assert len(result) > 0
+
+
+class TestPromptBudgeter:
+    """Test cases for fitting HTML into a prompt token budget"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        from universal_scraper.core.cleaning import PromptBudgeter
+
+        self.budgeter = PromptBudgeter(temp_dir=tempfile.mkdtemp())
+
+    @staticmethod
+    def _listing(items):
+        cards = "".join(
+            f'<div class="card"><h2 class="title">Product number {i}</h2>'
+            f'<p class="desc">{"A long product description. " * 8}</p>'
+            f'<span class="price">${i}.99</span></div>'
+            for i in range(items)
+        )
+        return (
+            "<html><head><title>Shop</title></head><body>"
+            f"<aside>{'Sidebar filler text. ' * 200}</aside>"
+            f'<main><section class="results">{cards}</section></main>'
+            "</body></html>"
+        )
+
+    def test_small_page_is_unchanged(self):
+        """Test that HTML within the budget is returned as is"""
+        html = self._listing(2)
+
+        fitted = self.budgeter.fit(html, 100000)
+
+        assert fitted.html == html
+        assert fitted.strategy == "full"
+
+    def test_keeps_repeated_items_and_their_ancestors(self):
+        """Test that the item container is kept without its surroundings"""
+        html = self._listing(40)
+
+        fitted = self.budgeter.fit(html, 1000)
+
+        assert fitted.strategy == "subtree"
+        assert fitted.tokens <= 1000 < fitted.original_tokens
+        assert "Sidebar filler" not in fitted.html
+        assert '<section class="results">' in fitted.html
+        assert "Product number 0" in fitted.html
+        assert fitted.html.count('class="card"') >= 2
+
+    def test_page_without_repeats_falls_back_to_densest_chunk(self):
+        """Test that pages without repeated items keep their densest part"""
+        html = (
+            "<html><body><nav>menu</nav>"
+            f"<article>{'<p>Paragraph of the article body.</p>' * 100}"
+            "</article><footer>footer</footer></body></html>"
+        )
+
+        fitted = self.budgeter.fit(html, 200)
+
+        assert fitted.strategy in ("chunk", "truncated")
+        assert fitted.tokens <= 200
+        assert "Paragraph of the article body." in fitted.html
+
+    def test_oversized_text_is_truncated(self):
+        """Test that the budget holds even for a single huge text node"""
+        fitted = self.budgeter.fit("<p>" + "word " * 5000 + "</p>", 100)
+
+        assert fitted.strategy == "truncated"
+        assert fitted.tokens <= 100
@@ -0,0 +1,597 @@
+"""Tests for the async LLM client layer"""
+
+import os
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from universal_scraper.core.llm import (
+    AsyncLLMClient,
+    CostModel,
+    HedgePolicy,
+    LLMError,
+    LLMTimeoutError,
+    LiteLLMProvider,
+    Prompt,
+    RateLimit,
+    RateLimiter,
+    StubProvider,
+    TokenBucket,
+    TokenUsage,
+    UsageTracker,
+    code_block_end,
+    count_tokens,
+    detect_provider,
+    is_rate_limit_error,
+)
+
+
+class TestStubProvider:
+    """Test cases for the deterministic stub provider"""
+
+    def test_cycles_through_responses(self):
+        """Responses are returned in turn and prompts are recorded"""
+        provider = StubProvider(responses=["one", "two"])
+
+        texts = [
+            asyncio.run(provider.agenerate(f"p{i}")).text for i in range(3)
+        ]
+
+        assert texts == ["one", "two", "one"]
+        assert provider.prompts == ["p0", "p1", "p2"]
+
+    def test_handler_overrides_responses(self):
+        """A handler maps each prompt to its response"""
+        provider = StubProvider(responses=["ignored"], handler=str.upper)
+
+        response = asyncio.run(provider.agenerate("code"))
+
+        assert response.text == "CODE"
+        assert response.provider == "stub"
+
+    def test_empty_response_raises(self):
+        """An empty completion is reported as a provider error"""
+        provider = StubProvider(responses=[""])
+
+        with pytest.raises(LLMError, match="No response"):
+            asyncio.run(provider.agenerate("prompt"))
+
+
+class TestAsyncLLMClient:
+    """Test cases for AsyncLLMClient"""
+
+    def test_generate_sync(self):
+        """Synchronous callers get the provider response"""
+        client = AsyncLLMClient(StubProvider(responses=["x = 1"]))
+        try:
+            response = client.generate_sync("prompt")
+        finally:
+            client.close()
+
+        assert response.text == "x = 1"
+        assert client.get_stats()["requests"] == 1
+
+    def test_generate_from_event_loop(self):
+        """Async callers overlap their requests up to the cap"""
+        provider = StubProvider(responses=["ok"], latency=0.2)
+        client = AsyncLLMClient(provider, max_concurrency=4)
+
+        async def run_batch():
+            return await asyncio.gather(
+                *(client.generate(f"p{i}") for i in range(4))
+            )
+
+        try:
+            started = time.monotonic()
+            responses = asyncio.run(run_batch())
+            elapsed = time.monotonic() - started
+        finally:
+            client.close()
+
+        assert [r.text for r in responses] == ["ok"] * 4
+        assert elapsed < 0.6
+        assert client.get_stats()["max_in_flight"] == 4
+
+    def test_concurrency_cap_across_threads(self):
+        """Threads sharing a client never exceed max_concurrency"""
+        client = AsyncLLMClient(
+            StubProvider(responses=["ok"], latency=0.05), max_concurrency=2
+        )
+
+        threads = [
+            threading.Thread(target=client.generate_sync, args=(f"p{i}",))
+            for i in range(6)
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            client.close()
+
+        stats = client.get_stats()
+        assert stats["requests"] == 6
+        assert stats["max_in_flight"] == 2
+        assert stats["in_flight"] == 0
+
+    def test_timeout(self):
+        """Slow requests fail with LLMTimeoutError"""
+        client = AsyncLLMClient(
+            StubProvider(responses=["late"], latency=1.0), timeout=0.05
+        )
+        try:
+            with pytest.raises(LLMTimeoutError):
+                client.generate_sync("prompt")
+        finally:
+            client.close()
+
+        assert client.get_stats()["timeouts"] == 1
+
+    def test_provider_errors_propagate(self):
+        """Errors raised by the provider reach the caller and are counted"""
+
+        def failing(prompt):
+            raise RuntimeError("quota exceeded")
+
+        client = AsyncLLMClient(StubProvider(handler=failing))
+        try:
+            with pytest.raises(RuntimeError, match="quota exceeded"):
+                client.generate_sync("prompt")
+        finally:
+            client.close()
+
+        assert client.get_stats()["errors"] == 1
+
+    def test_reusable_after_close(self):
+        """Closing stops the loop; the next request starts a new one"""
+        client = AsyncLLMClient(StubProvider(responses=["again"]))
+        client.generate_sync("first")
+        client.close()
+        try:
+            assert client.generate_sync("second").text == "again"
+        finally:
+            client.close()
+
+
+def test_detect_provider():
+    """Provider names are derived from model names"""
+    assert detect_provider("gemini-2.5-flash") == "gemini"
+    assert detect_provider("gpt-4o") == "openai"
+    assert detect_provider("claude-3-haiku-20240307") == "anthropic"
+    assert detect_provider("llama3") == "ollama"
+    assert detect_provider("mistral-large") == "unknown"
+
+
+class TestRateLimiter:
+    """Test cases for the RPM/TPM rate limiter"""
+
+    def test_token_bucket_reserve(self):
+        """Reservations beyond the burst wait for the refill"""
+        bucket = TokenBucket(60, capacity=2)
+        now = bucket.updated
+
+        assert bucket.reserve(1, now) == 0.0
+        assert bucket.reserve(1, now) == 0.0
+        assert bucket.reserve(1, now) == pytest.approx(1.0)
+        # Later callers queue behind the earlier reservation
+        assert bucket.reserve(1, now) == pytest.approx(2.0)
+
+    def test_oversized_reservation_is_capped(self):
+        """A request larger than the burst does not wait forever"""
+        bucket = TokenBucket(600, capacity=100)
+        now = bucket.updated
+
+        assert bucket.reserve(1000, now) == 0.0
+        assert bucket.reserve(100, now) == pytest.approx(10.0)
+
+    def test_limits_resolve_most_specific_key(self):
+        """provider/model beats model, provider and the wildcard"""
+        limiter = RateLimiter(
+            {
+                "*": {"rpm": 10},
+                "openai": {"rpm": 20},
+                "openai/gpt-4o": RateLimit(rpm=30, tpm=1000),
+            }
+        )
+
+        assert limiter.limit_for("openai", "gpt-4o") == RateLimit(30, 1000)
+        assert limiter.limit_for("openai", "gpt-4") == RateLimit(rpm=20)
+        assert limiter.limit_for("gemini", "gemini-pro") == RateLimit(rpm=10)
+        assert RateLimiter().limit_for("openai", "gpt-4") == RateLimit()
+
+    def test_tpm_budget_throttles(self):
+        """Token budgets make later requests wait"""
+        limiter = RateLimiter({"stub": {"tpm": 600}})
+
+        assert limiter.reserve("stub", "stub", 600) == 0.0
+        assert limiter.reserve("stub", "stub", 60) == pytest.approx(6.0, 0.1)
+        assert limiter.get_stats()["throttled"] == 1
+
+    def test_is_rate_limit_error(self):
+        """429s are recognised from status codes and exception names"""
+
+        class RateLimitError(Exception):
+            pass
+
+        error = Exception("Too many requests")
+        error.status_code = 429
+
+        assert is_rate_limit_error(error)
+        assert is_rate_limit_error(RateLimitError("slow down"))
+        assert not is_rate_limit_error(ValueError("bad prompt"))
+
+    def test_client_retries_rate_limited_requests(self):
+        """Rate-limit errors are retried after backing off, not raised"""
+        calls = []
+
+        def flaky(prompt):
+            calls.append(prompt)
+            if len(calls) == 1:
+                raise Exception("429 rate limit exceeded")
+            return "x = 1"
+
+        limiter = RateLimiter(retry_delay=0.01)
+        client = AsyncLLMClient(
+            StubProvider(handler=flaky), rate_limiter=limiter
+        )
+        try:
+            assert client.generate_sync("prompt").text == "x = 1"
+        finally:
+            client.close()
+
+        assert len(calls) == 2
+        assert client.get_stats()["rate_limit_retries"] == 1
+        assert limiter.get_stats()["rate_limit_errors"] == 1
+
+    def test_client_gives_up_after_max_retries(self):
+        """Persistent rate limiting eventually surfaces to the caller"""
+
+        def always_limited(prompt):
+            raise Exception("429 rate limit exceeded")
+
+        limiter = RateLimiter(max_retries=1, retry_delay=0.01)
+        client = AsyncLLMClient(
+            StubProvider(handler=always_limited), rate_limiter=limiter
+        )
+        try:
+            with pytest.raises(Exception, match="429"):
+                client.generate_sync("prompt")
+        finally:
+            client.close()
+
+        assert client.get_stats()["rate_limit_retries"] == 1
+
+
+class TestHedging:
+    """Test cases for hedged requests across fallback models"""
+
+    def test_hedge_policy_uses_latency_percentile(self):
+        """The delay follows the model's observed latencies"""
+        policy = HedgePolicy(percentile=0.9, initial_delay=30.0, min_samples=5)
+        assert policy.delay("fast") == 30.0
+
+        for latency in [1.0, 2.0, 3.0, 4.0, 10.0]:
+            policy.record("fast", latency)
+
+        assert policy.delay("fast") == 10.0
+        assert policy.delay("other") == 30.0
+
+    def test_slow_primary_is_hedged(self):
+        """A fallback answering first wins and the primary is cancelled"""
+        primary = StubProvider(
+            responses=["slow"], latency=2.0, model_name="a"
+        )
+        fallback = StubProvider(responses=["fast"], model_name="b")
+        client = AsyncLLMClient(
+            primary,
+            fallbacks=[fallback],
+            hedge_policy=HedgePolicy(initial_delay=0.05),
+        )
+        try:
+            started = time.monotonic()
+            response = client.generate_sync("prompt")
+            elapsed = time.monotonic() - started
+        finally:
+            client.close()
+
+        assert response.text == "fast"
+        assert response.model == "b"
+        assert elapsed < 1.0
+        stats = client.get_stats()
+        assert stats["hedges"] == 1
+        assert stats["wins"] == {"b": 1}
+        assert stats["in_flight"] == 0
+
+    def test_unusable_hedge_response_does_not_win(self):
+        """A fast response failing the check waits for the other model"""
+        primary = StubProvider(
+            responses=["x = 1"], latency=0.3, model_name="a"
+        )
+        fallback = StubProvider(responses=["no code here ("], model_name="b")
+        client = AsyncLLMClient(
+            primary,
+            fallbacks=[fallback],
+            hedge_policy=HedgePolicy(initial_delay=0.05),
+            response_check=lambda text: "(" not in text,
+        )
+        try:
+            response = client.generate_sync("prompt")
+        finally:
+            client.close()
+
+        assert response.text == "x = 1"
+        stats = client.get_stats()
+        assert stats["rejected"] == 1
+        assert stats["wins"] == {"a": 1}
+
+    def test_all_responses_unusable_returns_first(self):
+        """With no usable response the first one is returned for repair"""
+        client = AsyncLLMClient(
+            StubProvider(responses=["bad a"], model_name="a"),
+            fallbacks=[StubProvider(responses=["bad b"], model_name="b")],
+            response_check=lambda text: False,
+        )
+        try:
+            response = client.generate_sync("prompt")
+        finally:
+            client.close()
+
+        assert response.text == "bad a"
+        assert client.get_stats()["rejected"] == 2
+
+    def test_failed_primary_falls_back(self):
+        """Provider errors move on to the next model without waiting"""
+
+        def failing(prompt):
+            raise RuntimeError("model overloaded")
+
+        client = AsyncLLMClient(
+            StubProvider(handler=failing, model_name="a"),
+            fallbacks=[StubProvider(responses=["ok"], model_name="b")],
+            hedge_policy=HedgePolicy(initial_delay=60.0),
+        )
+        try:
+            assert client.generate_sync("prompt").text == "ok"
+        finally:
+            client.close()
+
+        assert client.get_stats()["fallbacks"] == 1
+
+    def test_all_models_failing_raises_first_error(self):
+        """When every model fails the primary's error is raised"""
+
+        def failing(message):
+            def handler(prompt):
+                raise RuntimeError(message)
+
+            return handler
+
+        client = AsyncLLMClient(
+            StubProvider(handler=failing("primary down"), model_name="a"),
+            fallbacks=[
+                StubProvider(handler=failing("fallback down"), model_name="b")
+            ],
+        )
+        try:
+            with pytest.raises(RuntimeError, match="primary down"):
+                client.generate_sync("prompt")
+        finally:
+            client.close()
+
+
+class TestUsageAccounting:
+    """Test cases for token and cost accounting"""
+
+    def test_stub_usage_is_estimated(self):
+        """Providers without usage data fall back to a local count"""
+        response = asyncio.run(
+            StubProvider(responses=["x = 1"]).agenerate("a" * 400)
+        )
+
+        assert response.prompt_tokens == count_tokens("a" * 400)
+        assert response.completion_tokens == count_tokens("x = 1")
+        assert response.usage_estimated is True
+
+    def test_uncached_encoding_is_not_downloaded(self, tmp_path):
+        """Without a cached encoding tokens are estimated, never fetched"""
+        from universal_scraper.core.llm import usage
+
+        with patch.object(usage, "_encoding", None), patch.dict(
+            os.environ, {"TIKTOKEN_CACHE_DIR": str(tmp_path)}
+        ), patch.object(usage, "tiktoken") as mock_tiktoken:
+            assert count_tokens("a" * 400) == 100
+            assert usage._encoding is False
+
+        mock_tiktoken.get_encoding.assert_not_called()
+
+    def test_cost_model_uses_configured_prices(self):
+        """Prices are given in USD per million tokens"""
+        costs = CostModel({"cheap": {"input": 1.0, "output": 4.0}})
+
+        assert costs.cost("cheap", 1000, 500) == pytest.approx(0.003)
+        assert costs.cost("unpriced-model", 1000, 500) == 0.0
+
+    def test_tracker_aggregates_per_model_and_domain(self):
+        """Usage is summed in total, per model and per domain"""
+        tracker = UsageTracker(
+            CostModel({"stub": {"input": 1.0, "output": 1.0}})
+        )
+        response = asyncio.run(
+            StubProvider(responses=["x = 1"]).agenerate("prompt")
+        )
+        usage = tracker.usage_for(response)
+
+        tracker.record(usage, "stub", "shop.com")
+        tracker.record(usage, "stub", "news.com")
+        tracker.record(usage, "stub")
+
+        stats = tracker.get_stats()
+        assert stats["total"]["calls"] == 3
+        assert stats["total"]["total_tokens"] == 3 * usage.total_tokens
+        assert stats["by_model"]["stub"]["calls"] == 3
+        assert stats["by_domain"]["shop.com"] == usage.to_dict()
+        assert stats["total"]["cost"] == pytest.approx(
+            3 * usage.total_tokens / 1e6
+        )
+
+    def test_token_usage_addition(self):
+        """TokenUsage values add up field by field"""
+        total = TokenUsage(10, 5, 0.1, 1) + TokenUsage(1, 2, 0.2, 1, True)
+
+        assert total == TokenUsage(11, 7, pytest.approx(0.3), 2, True)
+        assert total.total_tokens == 18
+
+
+class TestPromptCaching:
+    """Test cases for stable prompt prefixes and cached-token reporting"""
+
+    def test_prompt_text_joins_instructions_and_content(self):
+        """A Prompt reads as its instructions followed by its content"""
+        prompt = Prompt("Do this.\n", "With this.")
+
+        assert prompt.text == "Do this.\nWith this."
+
+    def test_litellm_messages_put_instructions_first(self):
+        """Instructions become the system turn, content the user turn"""
+        prompt = Prompt("instructions", "page")
+
+        messages = LiteLLMProvider("gpt-4o")._messages(prompt)
+
+        assert messages == [
+            {"role": "system", "content": "instructions"},
+            {"role": "user", "content": "page"},
+        ]
+        assert LiteLLMProvider("gpt-4o")._messages("plain") == [
+            {"role": "user", "content": "plain"}
+        ]
+
+    def test_anthropic_instructions_are_marked_cacheable(self):
+        """Providers needing explicit cache_control get the marker"""
+        prompt = Prompt("instructions", "page")
+
+        system = LiteLLMProvider("claude-3-haiku")._messages(prompt)[0]
+        uncached = LiteLLMProvider(
+            "claude-3-haiku", prompt_caching=False
+        )._messages(prompt)[0]
+
+        assert system["content"][0]["cache_control"] == {"type": "ephemeral"}
+        assert uncached["content"] == "instructions"
+
+    def test_repeated_prefix_is_reported_cached(self):
+        """The stub reports repeated instructions as cached tokens"""
+        provider = StubProvider(responses=["x = 1"])
+        instructions = "Generate extraction code. " * 20
+
+        first = asyncio.run(provider.agenerate(Prompt(instructions, "a")))
+        second = asyncio.run(provider.agenerate(Prompt(instructions, "b")))
+
+        assert first.cached_tokens == 0
+        assert second.cached_tokens == count_tokens(instructions)
+        assert provider.prompts[1] == instructions + "b"
+
+    def test_cached_tokens_are_priced_and_shared(self):
+        """Cached prompt tokens use the cached price and show as a share"""
+        tracker = UsageTracker(
+            CostModel(
+                {"m": {"input": 2.0, "output": 0.0, "cached_input": 0.5}}
+            )
+        )
+        provider = StubProvider(responses=["x"], model_name="m")
+        instructions = "fixed " * 300
+        for content in ("one", "two"):
+            response = asyncio.run(
+                provider.agenerate(Prompt(instructions, content))
+            )
+            tracker.record(tracker.usage_for(response), "m")
+
+        total = tracker.total
+        uncached = total.prompt_tokens - total.cached_tokens
+        assert total.cached_tokens == count_tokens(instructions)
+        assert total.cost == pytest.approx(
+            (uncached * 2.0 + total.cached_tokens * 0.5) / 1e6
+        )
+        assert tracker.get_stats()["total"]["cached_share"] == round(
+            total.cached_share, 3
+        )
+        assert 0.4 < total.cached_share <= 0.5
+
+
+class TestStreaming:
+    """Test cases for streamed generation with early termination"""
+
+    CODE_RESPONSE = (
+        "```python\ndef extract_data(html_content):\n    return []\n```"
+    )
+
+    def test_code_block_end(self):
+        """The end is found once the closing fence has arrived"""
+        assert code_block_end("```python\nx = 1\n") is None
+        assert code_block_end("```pyth") is None
+        assert code_block_end("x = 1\n") is None
+        text = "```python\nx = '```'\n```\nThis code extracts"
+        assert text[: code_block_end(text)] == "```python\nx = '```'\n```"
+
+    def test_stream_stops_after_code_block(self):
+        """Trailing explanation is cut off and not streamed"""
+        provider = StubProvider(
+            responses=[self.CODE_RESPONSE + "\n\nExplanation. " * 20],
+            chunk_size=8,
+        )
+
+        response = asyncio.run(
+            provider.agenerate_stream("prompt", code_block_end)
+        )
+
+        assert response.text == self.CODE_RESPONSE
+        assert response.stopped_early is True
+        assert provider.chunks_sent < len(provider.responses[0]) / 8
+        assert response.completion_tokens == count_tokens(response.text)
+
+    def test_stream_without_stop_returns_everything(self):
+        """Without a stop condition the whole response is streamed"""
+        provider = StubProvider(responses=["x = 1\n" * 10], chunk_size=4)
+
+        response = asyncio.run(provider.agenerate_stream("prompt"))
+
+        assert response.text == "x = 1\n" * 10
+        assert response.stopped_early is False
+
+    def test_client_reports_time_to_first_token(self):
+        """Streaming clients time the first chunk and the whole response"""
+        provider = StubProvider(
+            responses=["x" * 40], latency=0.05, chunk_size=10, chunk_delay=0.05
+        )
+        client = AsyncLLMClient(provider, streaming=True)
+        try:
+            response = client.generate_sync("prompt")
+        finally:
+            client.close()
+
+        assert response.time_to_first_token < response.latency
+        assert response.latency >= 0.2
+        stats = client.get_stats()
+        assert stats["streamed"] == 1
+        assert stats["time_to_first_token"]["avg"] == pytest.approx(
+            response.time_to_first_token, abs=1e-3
+        )
+        assert stats["generation_time"]["p90"] == pytest.approx(
+            response.latency, abs=1e-3
+        )
+
+    def test_client_counts_early_stops(self):
+        """Responses cut off by stream_stop are counted"""
+        client = AsyncLLMClient(
+            StubProvider(responses=[self.CODE_RESPONSE + "\nDone."]),
+            streaming=True,
+            stream_stop=code_block_end,
+        )
+        try:
+            assert client.generate_sync("prompt").text == self.CODE_RESPONSE
+        finally:
+            client.close()
+
+        assert client.get_stats()["stopped_early"] == 1
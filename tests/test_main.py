@@ -1,8 +1,11 @@
 """Tests for the main CLI module"""
 
+import sys
 import tempfile
 import os
 from unittest.mock import Mock, patch
+
+import pytest
 import main
 
 
@@ -197,6 +200,18 @@ class TestUtilityFunctions:
         assert hasattr(main, "scrape_multiple_urls")
         assert callable(main.scrape_multiple_urls)
 
+    def test_batch_mode_is_serial_by_default(self):
+        """Test that --urls scrapes one page at a time unless --workers"""
+        for extra, workers in (([], 1), (["--workers", "3"], 3)):
+            argv = ["universal-scraper", "--urls", "urls.txt"] + extra
+            with patch.object(sys, "argv", argv), patch(
+                "main.UniversalScraper"
+            ), patch("main.scrape_multiple_urls", return_value=True) as run:
+                with patch("builtins.print"), pytest.raises(SystemExit):
+                    main.main()
+
+            assert run.call_args.args[4] == workers
+
     def test_main_function_exists(self):
         """Test that main function exists"""
         assert hasattr(main, "main")
@@ -265,3 +280,65 @@ class TestUtilityFunctions:
         os.makedirs(test_dir, exist_ok=True)
         assert os.path.exists(test_dir)
         assert os.path.isdir(test_dir)
+
+
+class TestCacheBundleCommands:
+    """Test cases for the cache bundle CLI modes"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.temp_dir, "cache.bundle")
+
+    def test_export_then_import(self):
+        """Test exporting and importing a cache through the CLI helpers"""
+        cache = main.open_code_cache(os.path.join(self.temp_dir, "a"))
+        cache.store_code("https://example.com", "<div></div>", ["t"], "code")
+        cache.close()
+
+        with patch("builtins.print"):
+            assert main.export_cache(
+                self.bundle_path, os.path.join(self.temp_dir, "a")
+            )
+            assert main.import_cache(
+                self.bundle_path, os.path.join(self.temp_dir, "b")
+            )
+
+        cache = main.open_code_cache(os.path.join(self.temp_dir, "b"))
+        assert cache.get_cache_stats()["total_entries"] == 1
+
+    def test_import_missing_bundle(self):
+        """Test importing a bundle that does not exist"""
+        with patch("builtins.print") as mock_print:
+            assert not main.import_cache("missing.bundle", self.temp_dir)
+            assert mock_print.called
+
+    def test_warm_cache_reports_coverage(self):
+        """Test the cache warm-up CLI helper"""
+        urls_file = os.path.join(self.temp_dir, "urls.txt")
+        with open(urls_file, "w") as f:
+            f.write("https://example.com/a\nhttps://example.com/b\n")
+
+        mock_scraper = Mock()
+        mock_scraper.warm_cache.return_value = {
+            "urls": 2,
+            "invalid_urls": 0,
+            "templates": 1,
+            "samples": 1,
+            "generated": 1,
+            "cached": 0,
+            "invalid": 0,
+            "failed": 0,
+            "covered_urls": 2,
+            "coverage": 1.0,
+            "uncovered_templates": [],
+        }
+
+        with patch("builtins.print"):
+            assert main.warm_cache(urls_file, mock_scraper, 2, 3)
+
+        mock_scraper.warm_cache.assert_called_once_with(
+            ["https://example.com/a", "https://example.com/b"],
+            sample_per_template=2,
+            max_workers=3,
+        )
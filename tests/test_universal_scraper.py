@@ -81,6 +81,26 @@ class TestUniversalScraper:
             )
             assert scraper.model_name == "gemini-2.5-flash"
 
+    def test_set_model_name_updates_cache_versions(self):
+        """Test that entries stored after a model switch record the new one"""
+        with patch.dict(os.environ, {"GEMINI_API_KEY": "test_key"}):
+            scraper = UniversalScraper(
+                temp_dir=self.temp_dir, model_name="gemini-2.5-flash"
+            )
+            scraper.set_model_name("gemini-2.5-pro")
+
+        cache = scraper.extractor.code_cache
+        assert cache.versions["model_name"] == "gemini-2.5-pro"
+
+    def test_repair_attempts_reach_the_extractor(self):
+        """Test that the repair budget is forwarded to the extractor"""
+        with patch.dict(os.environ, {"GEMINI_API_KEY": "test_key"}):
+            scraper = UniversalScraper(
+                temp_dir=self.temp_dir, max_repair_attempts=0
+            )
+
+        assert scraper.extractor.max_repair_attempts == 0
+
     def test_api_key_setting(self):
         """Test API key setting"""
         with patch.dict(os.environ, {"GEMINI_API_KEY": "env_key"}):
@@ -210,3 +230,45 @@ class TestUniversalScraperMethods:
             str_repr = str(scraper)
             assert isinstance(str_repr, str)
             assert len(str_repr) > 0
+
+    def test_warm_cache_generates_one_extractor_per_template(self):
+        """Test that warm-up samples templates and later runs hit the cache"""
+        code = (
+            "def extract_data(html_content):\n"
+            "    soup = BeautifulSoup(html_content, 'html.parser')\n"
+            "    return [{'title': h.get_text()} "
+            "for h in soup.find_all('h2')]\n"
+        )
+        pages = {
+            "https://shop.com/product/1": "<div><h2>One</h2></div>",
+            "https://shop.com/product/2": "<div><h2>Two</h2></div>",
+            "https://shop.com/product/3": "<div><h2>Three</h2></div>",
+            "https://shop.com/about": "<section><h2>About</h2></section>",
+        }
+        with patch.dict(os.environ, {"GEMINI_API_KEY": "test_key"}):
+            scraper = UniversalScraper(
+                temp_dir=self.temp_dir, output_dir=self.output_dir
+            )
+        scraper.set_fields(["title"])
+
+        with patch.object(
+            scraper.fetcher, "fetch_html", side_effect=pages.get
+        ), patch.object(
+            scraper.cleaner, "clean_html", side_effect=lambda html, url: html
+        ), patch.object(
+            scraper.extractor, "_generate_content_with_ai", return_value=code
+        ) as mock_generate:
+            report = scraper.warm_cache(
+                list(pages) + ["not a url"], max_workers=2
+            )
+            assert mock_generate.call_count == 2
+
+            result = scraper.scrape_url("https://shop.com/product/3")
+            assert mock_generate.call_count == 2
+
+        assert report["templates"] == 2
+        assert report["samples"] == 2
+        assert report["generated"] == 2
+        assert report["invalid_urls"] == 1
+        assert report["coverage"] == 1.0
+        assert result["data"] == [{"title": "Three"}]
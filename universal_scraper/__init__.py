@@ -6,9 +6,10 @@ and extracting structured data using AI.
 """
 
 from .scraper import UniversalScraper, scrape
+from .core.caching import RecentlyFailedError
 
 __version__ = "1.9.3"
 __author__ = "Witeso"
 __email__ = "support@witeso.com"
 
-__all__ = ["UniversalScraper", "scrape"]
+__all__ = ["UniversalScraper", "scrape", "RecentlyFailedError"]
@@ -0,0 +1,37 @@
+"""
+Offline Benchmark Harness
+
+This package runs UniversalScraper end to end without network access or
+API keys:
+- fixture_server: Local HTTP server for recorded or generated pages, with
+  configurable latency and injected errors
+- fake_llm: Deterministic provider returning recorded or template code
+- runner: Benchmark runner reporting pages/sec, p50/p99 latency and the
+  cache hit ratio
+"""
+
+from .fixture_server import (
+    FixtureServer,
+    CORPUS_FIELDS,
+    generate_corpus,
+    load_corpus,
+)
+from .fake_llm import FakeLLMProvider
+from .runner import (
+    BenchmarkReport,
+    BenchmarkRunner,
+    percentile,
+    run_offline_benchmark,
+)
+
+__all__ = [
+    'FixtureServer',
+    'CORPUS_FIELDS',
+    'generate_corpus',
+    'load_corpus',
+    'FakeLLMProvider',
+    'BenchmarkReport',
+    'BenchmarkRunner',
+    'percentile',
+    'run_offline_benchmark',
+]
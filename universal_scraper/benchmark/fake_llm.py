@@ -0,0 +1,100 @@
+"""
+Deterministic stand-in for a code generation model
+"""
+import re
+from typing import Dict, Optional, List
+
+from ..core.llm import StubProvider
+
+FIELDS_LINE = re.compile(r"^Fields to extract: (.*)$", re.MULTILINE)
+
+# extract_data rendered for the requested fields: one record per element
+# matching the item selector, each field read from the descendant whose
+# class is the field name (its href for links, otherwise its text)
+CODE_TEMPLATE = '''from bs4 import BeautifulSoup
+
+
+def extract_data(html_content):
+    soup = BeautifulSoup(html_content, 'html.parser')
+    extracted_data = []
+    for item in soup.select({item_selector!r}):
+        record = {{}}
+        for field in {fields!r}:
+            node = item.select_one('.' + field)
+            if node is None:
+                record[field] = None
+            elif node.get('href'):
+                record[field] = node['href']
+            else:
+                record[field] = node.get_text(strip=True)
+        extracted_data.append(record)
+    return extracted_data
+'''
+
+
+class FakeLLMProvider(StubProvider):
+    """
+    Returns pre-recorded extraction code, or code rendered from a template
+    for the fields named in the prompt, after a configurable delay. Needs
+    no API key or network, so whole scraping runs can be benchmarked
+    offline against the FixtureServer corpus.
+    """
+
+    provider_name = "fake"
+
+    def __init__(
+        self,
+        recorded: Optional[Dict[str, str]] = None,
+        item_selector: str = "[data-item]",
+        delay: float = 0.0,
+        trailing_text: str = "",
+        model_name: str = "fake-llm",
+        chunk_size: int = 64,
+    ):
+        """
+        Initialize the provider.
+
+        Args:
+            recorded: {marker: code}; the code of the first marker found
+                      in the prompt is returned as is
+            item_selector: CSS selector of the repeated items in template
+                           code
+            delay: Seconds before responding, simulating generation time
+            trailing_text: Explanation appended after the code block, as
+                           real models often add
+            model_name: Model name reported in responses
+            chunk_size: Characters per chunk when streaming
+        """
+        super().__init__(
+            handler=self.respond,
+            latency=delay,
+            model_name=model_name,
+            chunk_size=chunk_size,
+        )
+        self.recorded = dict(recorded or {})
+        self.item_selector = item_selector
+        self.trailing_text = trailing_text
+
+    def code_for(self, prompt: str) -> str:
+        """Extraction code for a prompt"""
+        for marker, code in self.recorded.items():
+            if marker in prompt:
+                return code
+        return CODE_TEMPLATE.format(
+            item_selector=self.item_selector,
+            fields=self.fields_in(prompt),
+        )
+
+    @staticmethod
+    def fields_in(prompt: str) -> List[str]:
+        """Fields requested by a generation or repair prompt"""
+        match = FIELDS_LINE.search(prompt)
+        if not match:
+            return []
+        return [f.strip() for f in match.group(1).split(",") if f.strip()]
+
+    def respond(self, prompt: str) -> str:
+        response = f"```python\n{self.code_for(prompt)}```"
+        if self.trailing_text:
+            response += f"\n{self.trailing_text}"
+        return response
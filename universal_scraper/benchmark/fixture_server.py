@@ -0,0 +1,219 @@
+"""
+Local HTTP server for a corpus of recorded or generated pages, with
+configurable latency and error injection
+"""
+import os
+import time
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+# Fields every page of the generated corpus carries for each item
+CORPUS_FIELDS = ["title", "price", "rating", "link"]
+
+# Markup of one item, per template; every template marks items with the
+# data-item attribute and fields with their name as class
+_ITEM_TEMPLATES = [
+    '<div class="product" data-item>'
+    '<h2 class="title">{title}</h2>'
+    '<span class="price">{price}</span>'
+    '<span class="rating">{rating}</span>'
+    '<a class="link" href="{link}">View</a></div>',
+    '<li class="row" data-item><a class="link" href="{link}">'
+    '<strong class="title">{title}</strong></a>'
+    '<p>Price: <b class="price">{price}</b></p>'
+    '<p class="rating">{rating}</p></li>',
+    '<article data-item><header><h3 class="title">{title}</h3></header>'
+    '<div class="meta"><em class="price">{price}</em>'
+    '<small class="rating">{rating}</small></div>'
+    '<footer><a class="link" href="{link}">More</a></footer></article>',
+]
+
+
+def generate_corpus(
+    sites: int = 3, pages_per_site: int = 10, items: int = 20, seed: int = 0
+) -> Dict[str, str]:
+    """
+    Generate listing pages for offline runs.
+
+    Args:
+        sites: Number of sites, each with its own page template
+        pages_per_site: Pages per site, sharing the site's structure
+        items: Items listed on each page
+        seed: Seed of the generated values
+
+    Returns:
+        {path: html}, with paths /site<i>/page/<j>
+    """
+    rng = random.Random(seed)
+    corpus = {}
+    for site in range(sites):
+        template = _ITEM_TEMPLATES[site % len(_ITEM_TEMPLATES)]
+        for page in range(pages_per_site):
+            listing = "".join(
+                template.format(
+                    title=f"Item {site}-{page}-{i}",
+                    price=f"${rng.randint(1, 999)}.{rng.randint(0, 99):02d}",
+                    rating=f"{rng.randint(10, 50) / 10:.1f} stars",
+                    link=f"/site{site}/item/{page * items + i}",
+                )
+                for i in range(items)
+            )
+            corpus[f"/site{site}/page/{page}"] = (
+                f"<html><head><title>Site {site} page {page}</title>"
+                f"<script>var tracking = {page};</script></head><body>"
+                f"<nav><a href='/site{site}'>Home</a></nav>"
+                f"<main><h1>Listing {page}</h1>{listing}</main>"
+                f"<footer>Site {site}</footer></body></html>"
+            )
+    return corpus
+
+
+def load_corpus(directory: str) -> Dict[str, str]:
+    """
+    Load recorded pages: every .html file below directory is served at its
+    relative path without the extension (shop/list.html -> /shop/list)
+    """
+    corpus = {}
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if not name.endswith(".html"):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory)[: -len(".html")]
+            with open(path, "r", encoding="utf-8") as f:
+                corpus["/" + relative.replace(os.sep, "/")] = f.read()
+    return corpus
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Request handler; corpus and settings are taken from the server"""
+
+    server_version = "UniversalScraperFixtures/1"
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?", 1)[0]
+        delay, fail = server.fixture.plan_request()
+        if delay:
+            time.sleep(delay)
+
+        if fail:
+            self._send(server.fixture.error_status, b"Injected error")
+            return
+
+        html = server.fixture.corpus.get(path)
+        if html is None:
+            self._send(404, b"Not found")
+            return
+        self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _send(
+        self, status: int, body: bytes, content_type: str = "text/plain"
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format % args)
+
+
+class FixtureServer:
+    """
+    Serves a page corpus on a background thread. Each request waits
+    latency plus up to jitter seconds and fails with error_status at
+    error_rate; the choices come from a seeded generator so runs repeat.
+    """
+
+    def __init__(
+        self,
+        corpus: Optional[Dict[str, str]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int = 0,
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            corpus: {path: html} to serve; generate_corpus() by default
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Seconds added to every response
+            jitter: Upper bound of a random extra delay per response
+            error_rate: Fraction of requests answered with error_status
+            error_status: HTTP status of injected errors
+            seed: Seed of the jitter and error choices
+        """
+        self.logger = logging.getLogger(__name__)
+        self.corpus = corpus if corpus is not None else generate_corpus()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0}
+
+        self.httpd = ThreadingHTTPServer((host, port), FixtureRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fixture = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self) -> List[str]:
+        """Absolute URLs of the corpus pages"""
+        return [self.url + path for path in sorted(self.corpus)]
+
+    def plan_request(self):
+        """(delay, fail) for the next request"""
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        return delay, fail
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, pages=len(self.corpus))
+
+    def start(self) -> "FixtureServer":
+        """Serve on a daemon thread"""
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="fixture-server", daemon=True
+        )
+        self._thread.start()
+        self.logger.info(
+            f"Serving {len(self.corpus)} fixture pages on {self.url}"
+        )
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "FixtureServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
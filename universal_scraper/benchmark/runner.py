@@ -0,0 +1,225 @@
+"""
+End-to-end benchmark of UniversalScraper against local fixtures
+
+Run it offline with:
+
+    python -m universal_scraper.benchmark.runner --workers 4 --passes 2
+
+It serves a generated (or recorded, --corpus-dir) page corpus from a
+FixtureServer, generates code with the FakeLLMProvider, scrapes every page
+once per pass and reports pages/sec, p50/p99 page latency and the cache
+hit ratio of each pass.
+"""
+import json
+import math
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, List, Dict, Any, Optional
+
+from .fixture_server import (
+    FixtureServer,
+    CORPUS_FIELDS,
+    generate_corpus,
+    load_corpus,
+)
+from .fake_llm import FakeLLMProvider
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of values (0.0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(fraction * len(ordered))
+    return ordered[min(len(ordered), max(1, rank)) - 1]
+
+
+class BenchmarkReport(NamedTuple):
+    """Throughput, latency and cache behaviour of one benchmark pass"""
+
+    pages: int
+    errors: int
+    elapsed: float
+    p50_latency: float
+    p99_latency: float
+    cache_hits: int
+    llm_calls: int
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Share of scraped pages whose code needed no generation"""
+        scraped = self.pages - self.errors
+        return self.cache_hits / scraped if scraped else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pages": self.pages,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "pages_per_sec": round(self.pages_per_sec, 2),
+            "p50_latency": round(self.p50_latency, 3),
+            "p99_latency": round(self.p99_latency, 3),
+            "cache_hit_ratio": round(self.cache_hit_ratio, 3),
+            "llm_calls": self.llm_calls,
+        }
+
+
+class BenchmarkRunner:
+    """Scrapes a list of URLs with a scraper and measures the run"""
+
+    def __init__(self, scraper, workers: int = 1):
+        """
+        Args:
+            scraper: UniversalScraper to benchmark
+            workers: Pages scraped concurrently
+        """
+        self.logger = logging.getLogger(__name__)
+        self.scraper = scraper
+        self.workers = max(1, workers)
+
+    def _scrape(self, url: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            result = self.scraper.scrape_url(url)
+            calls = result["metadata"]["llm_usage"]["calls"]
+            error = None
+        except Exception as e:
+            calls = 0
+            error = str(e)
+        return {
+            "latency": time.monotonic() - started,
+            "llm_calls": calls,
+            "error": error,
+        }
+
+    def run(self, urls: List[str]) -> BenchmarkReport:
+        """Scrape every URL once and report the pass"""
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self._scrape, urls))
+        elapsed = time.monotonic() - started
+
+        scraped = [r for r in results if r["error"] is None]
+        latencies = [r["latency"] for r in results]
+        return BenchmarkReport(
+            pages=len(results),
+            errors=len(results) - len(scraped),
+            elapsed=elapsed,
+            p50_latency=percentile(latencies, 0.5),
+            p99_latency=percentile(latencies, 0.99),
+            cache_hits=sum(1 for r in scraped if r["llm_calls"] == 0),
+            llm_calls=sum(r["llm_calls"] for r in results),
+        )
+
+
+def run_offline_benchmark(
+    corpus: Optional[Dict[str, str]] = None,
+    fields: Optional[List[str]] = None,
+    workers: int = 1,
+    passes: int = 2,
+    page_latency: float = 0.0,
+    page_jitter: float = 0.0,
+    error_rate: float = 0.0,
+    llm_delay: float = 0.0,
+    temp_dir: Optional[str] = None,
+    **scraper_options,
+) -> List[BenchmarkReport]:
+    """
+    Benchmark a fresh UniversalScraper on a fixture corpus with the fake
+    model, without network access or API keys.
+
+    Args:
+        corpus: {path: html} to serve; generate_corpus() by default
+        fields: Fields to extract; the generated corpus's fields by default
+        workers: Pages scraped concurrently
+        passes: Times the corpus is scraped; later passes measure the warm
+                cache
+        page_latency: Seconds the fixture server adds to every page
+        page_jitter: Upper bound of random extra seconds per page
+        error_rate: Fraction of page requests failing with HTTP 503
+        llm_delay: Seconds the fake model takes per generation
+        temp_dir: Directory for the scraper's cache and output; a
+                  temporary directory removed afterwards by default
+        **scraper_options: Further UniversalScraper arguments
+
+    Returns:
+        One BenchmarkReport per pass
+    """
+    from ..scraper import UniversalScraper
+
+    own_dir = temp_dir is None
+    temp_dir = temp_dir or tempfile.mkdtemp(prefix="scraper-bench-")
+    server = FixtureServer(
+        corpus,
+        latency=page_latency,
+        jitter=page_jitter,
+        error_rate=error_rate,
+    )
+    scraper_options.setdefault("log_level", logging.WARNING)
+    try:
+        with server:
+            scraper = UniversalScraper(
+                temp_dir=temp_dir,
+                output_dir=f"{temp_dir}/output",
+                llm_provider=FakeLLMProvider(delay=llm_delay),
+                llm_max_concurrency=max(4, workers),
+                **scraper_options,
+            )
+            scraper.set_fields(fields or CORPUS_FIELDS)
+            runner = BenchmarkRunner(scraper, workers)
+            return [runner.run(server.urls()) for _ in range(passes)]
+    finally:
+        if own_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline end-to-end benchmark of Universal Scraper"
+    )
+    parser.add_argument(
+        "--corpus-dir",
+        help="Directory of recorded .html pages to serve instead of the "
+        "generated corpus",
+    )
+    parser.add_argument("--sites", type=int, default=3)
+    parser.add_argument("--pages-per-site", type=int, default=10)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--fields", nargs="+")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--passes", type=int, default=2)
+    parser.add_argument("--page-latency", type=float, default=0.0)
+    parser.add_argument("--page-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.corpus_dir:
+        corpus = load_corpus(args.corpus_dir)
+    else:
+        corpus = generate_corpus(args.sites, args.pages_per_site, args.items)
+
+    reports = run_offline_benchmark(
+        corpus,
+        fields=args.fields,
+        workers=args.workers,
+        passes=args.passes,
+        page_latency=args.page_latency,
+        page_jitter=args.page_jitter,
+        error_rate=args.error_rate,
+        llm_delay=args.llm_delay,
+    )
+    for i, report in enumerate(reports, 1):
+        print(json.dumps({"pass": i, **report.to_dict()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Code Cache Components
+
+This package provides the building blocks used by CodeCache:
+- memory_cache: Bounded in-process LRU tier in front of SQLite
+- usage_buffer: Write-behind batching of usage statistics
+- compiled_code: Warm compiled extraction functions keyed by code hash
+- fingerprint: SimHash structural fingerprints for near-duplicate lookups
+- url_templates: URL-template inference for path families
+- eviction: Eviction limits and background maintenance worker
+- bundle: Portable compressed export/import bundles
+- backends: Shared storage backends (in-process and HTTP)
+- server: HTTP key-value service shared by caches on several nodes
+- single_flight: In-process deduplication of concurrent generations
+- failures: Negative cache and backoff for failed generations
+"""
+
+from .memory_cache import LRUMemoryCache
+from .usage_buffer import UsageStatsBuffer
+from .compiled_code import CompiledExtractorCache, compute_code_hash
+from .fingerprint import structural_simhash, hamming_distance
+from .url_templates import UrlTemplateLearner
+from .eviction import EvictionPolicy, MaintenanceWorker
+from .bundle import BundleError
+from .backends import CacheBackend, MemoryBackend, HTTPBackend
+from .server import CacheService
+from .single_flight import SingleFlight
+from .failures import BackoffPolicy, FailureRecord, RecentlyFailedError
+
+__all__ = [
+    'LRUMemoryCache',
+    'UsageStatsBuffer',
+    'CompiledExtractorCache',
+    'compute_code_hash',
+    'structural_simhash',
+    'hamming_distance',
+    'UrlTemplateLearner',
+    'EvictionPolicy',
+    'MaintenanceWorker',
+    'BundleError',
+    'CacheBackend',
+    'MemoryBackend',
+    'HTTPBackend',
+    'CacheService',
+    'SingleFlight',
+    'BackoffPolicy',
+    'FailureRecord',
+    'RecentlyFailedError',
+]
@@ -0,0 +1,260 @@
+"""
+Shared storage backends for the code cache
+
+CodeCache keeps its SQLite database as a local tier and can sit in front of
+a shared backend: local misses read through to the backend and newly stored
+entries are written through to it, so code generated on one node is served
+to every other node.
+
+Cached code is executed by every node that reads it, so the HTTP service is
+only as trustworthy as whoever can write to it. HTTPBackend therefore needs a
+shared secret: it authenticates to the service with it and signs every entry
+it writes with an HMAC of it, and entries whose signature does not verify
+are treated as misses. Nodes that share the secret trust each other's code;
+the service host itself never needs to be trusted.
+"""
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+from urllib import request, error
+
+
+def entry_id(key: tuple) -> str:
+    """
+    Stable identifier of a (url_clean, structural_hash, fields_hash) key.
+
+    Args:
+        key: Cache key tuple
+
+    Returns:
+        Hex digest usable as a path segment
+    """
+    return hashlib.sha256(
+        json.dumps(list(key)).encode("utf-8")
+    ).hexdigest()
+
+
+# Environment variable holding the shared secret of the cache service
+CACHE_TOKEN_ENV = "UNIVERSAL_SCRAPER_CACHE_TOKEN"
+
+
+def sign_entry(entry_key: str, entry: Dict[str, Any], secret: str) -> str:
+    """
+    HMAC-SHA256 of an entry and the identifier it is stored under, so an
+    entry can neither be altered nor moved to another key.
+
+    Args:
+        entry_key: Identifier from entry_id()
+        entry: Entry dict, without its signature
+        secret: Shared secret
+
+    Returns:
+        Hex digest
+    """
+    message = f"{entry_key}\n{json.dumps(entry, sort_keys=True)}"
+    return hmac.new(
+        secret.encode("utf-8"), message.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+
+class CacheBackend:
+    """
+    Interface of a shared code-cache store.
+
+    Entries are dicts keyed by the bundle columns (see
+    caching.bundle.BUNDLE_COLUMNS). Implementations must be thread-safe and
+    should report failures by returning None/False rather than raising, so
+    an unavailable backend only costs a local miss.
+    """
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        """Return the entry stored under key, or None"""
+        raise NotImplementedError
+
+    def put(self, key: tuple, entry: Dict[str, Any]) -> bool:
+        """Store entry under key; returns True on success"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resources held by the backend"""
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return backend statistics"""
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """In-process backend, e.g. for several caches in one process or tests"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(entry_id(key))
+            return dict(entry) if entry else None
+
+    def put(self, key: tuple, entry: Dict[str, Any]) -> bool:
+        with self._lock:
+            self._entries[entry_id(key)] = dict(entry)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries)}
+
+
+class HTTPBackend(CacheBackend):
+    """
+    Client of the HTTP key-value service in caching.server.
+
+    Requests carry the shared secret as a bearer token and entries are
+    signed with it; fetched entries with a missing or wrong signature are
+    rejected. After a connection failure the backend is skipped for
+    retry_interval seconds so an unreachable service does not add a
+    timeout to every lookup.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str] = None,
+        timeout: float = 2.0,
+        retry_interval: float = 30.0,
+    ):
+        """
+        Initialize the HTTP backend.
+
+        Args:
+            base_url: Service URL, e.g. http://cache-host:8765
+            token: Shared secret of the service and the nodes; defaults to
+                   the UNIVERSAL_SCRAPER_CACHE_TOKEN environment variable
+            timeout: Per-request timeout in seconds
+            retry_interval: Seconds to skip the service after a failure
+
+        Raises:
+            ValueError: If no shared secret is configured
+        """
+        token = token or os.environ.get(CACHE_TOKEN_ENV)
+        if not token:
+            raise ValueError(
+                f"The shared code cache needs a shared secret: pass token "
+                f"or set {CACHE_TOKEN_ENV}"
+            )
+
+        self.logger = logging.getLogger(__name__)
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._unavailable_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "errors": 0,
+            "rejected": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def _failed(self, action: str, e: Exception) -> None:
+        self._count("errors")
+        self._unavailable_until = time.monotonic() + self.retry_interval
+        self.logger.warning(
+            f"Cache service {action} failed ({self.base_url}): {str(e)}"
+        )
+
+    def _entry_url(self, key: tuple) -> str:
+        return f"{self.base_url}/v1/entries/{entry_id(key)}"
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+        }
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        if not self._available():
+            return None
+
+        try:
+            req = request.Request(
+                self._entry_url(key), headers=self._headers()
+            )
+            with request.urlopen(req, timeout=self.timeout) as response:
+                entry = json.loads(response.read().decode("utf-8"))
+
+            signature = entry.pop("signature", None)
+            expected = sign_entry(entry_id(key), entry, self.token)
+            if not isinstance(signature, str) or not hmac.compare_digest(
+                signature, expected
+            ):
+                self._count("rejected")
+                self.logger.warning(
+                    f"Rejected cache service entry with an invalid "
+                    f"signature ({self.base_url})"
+                )
+                return None
+
+            self._count("hits")
+            return entry
+
+        except error.HTTPError as e:
+            if e.code == 404:
+                self._count("misses")
+            else:
+                self._failed("lookup", e)
+            return None
+
+        except Exception as e:
+            self._failed("lookup", e)
+            return None
+
+    def put(self, key: tuple, entry: Dict[str, Any]) -> bool:
+        if not self._available():
+            return False
+
+        try:
+            signed = dict(
+                entry, signature=sign_entry(entry_id(key), entry, self.token)
+            )
+            req = request.Request(
+                self._entry_url(key),
+                data=json.dumps(signed).encode("utf-8"),
+                headers=self._headers(),
+                method="PUT",
+            )
+            with request.urlopen(req, timeout=self.timeout):
+                pass
+            self._count("writes")
+            return True
+
+        except Exception as e:
+            self._failed("write", e)
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(
+            {
+                "backend": "http",
+                "url": self.base_url,
+                "available": self._available(),
+            }
+        )
+        return stats
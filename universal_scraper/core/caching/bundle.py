@@ -0,0 +1,118 @@
+"""
+Portable, compressed bundles of code-cache entries
+"""
+import gzip
+import json
+from datetime import datetime, timezone
+
+BUNDLE_FORMAT = "universal-scraper-code-cache"
+BUNDLE_VERSION = 1
+
+# Columns of extraction_cache that travel with an entry; code_file_path is
+# node-local and recreated on import
+BUNDLE_COLUMNS = [
+    "url_clean",
+    "structural_hash",
+    "fields_hash",
+    "fields_json",
+    "extraction_code",
+    "domain",
+    "simhash",
+    "url_template",
+    "record_count",
+    "fill_rate",
+    "created_at",
+    "last_used_at",
+    "use_count",
+    "model_name",
+    "prompt_version",
+    "cleaner_version",
+    "hash_version",
+    "prompt_tokens",
+    "completion_tokens",
+    "llm_cost",
+]
+
+# Versions assumed for entries created before versions were recorded
+LEGACY_VERSIONS = {
+    "prompt_version": "1",
+    "cleaner_version": "1",
+    "hash_version": 1,
+}
+
+MERGE_STRATEGIES = ("newest", "most_used")
+
+
+class BundleError(ValueError):
+    """Raised when a file is not a readable cache bundle"""
+    pass
+
+
+def write_bundle(path, entries, url_templates=None):
+    """
+    Write entries to a gzip-compressed JSON bundle.
+
+    Args:
+        path: Destination file
+        entries: List of dicts keyed by BUNDLE_COLUMNS
+        url_templates: List of (domain, template) pairs
+    """
+    payload = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "entries": entries,
+        "url_templates": [list(pair) for pair in url_templates or []],
+    }
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+
+
+def read_bundle(path):
+    """
+    Read a bundle written by write_bundle.
+
+    Returns:
+        Decoded bundle dict
+
+    Raises:
+        BundleError: If the file is not a supported bundle
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Not a cache bundle: {path} ({e})")
+
+    if payload.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"Not a cache bundle: {path}")
+    if payload.get("version", 0) > BUNDLE_VERSION:
+        raise BundleError(
+            f"Bundle version {payload['version']} is newer than supported "
+            f"version {BUNDLE_VERSION}"
+        )
+    return payload
+
+
+def incoming_wins(existing, incoming, strategy="newest"):
+    """
+    Decide whether an incoming bundle entry replaces an existing one.
+
+    Args:
+        existing: Dict with created_at and use_count of the local entry
+        incoming: Dict with created_at and use_count of the bundle entry
+        strategy: 'newest' (created_at, then use_count) or 'most_used'
+                  (use_count, then created_at)
+    """
+    if strategy not in MERGE_STRATEGIES:
+        raise ValueError(
+            f"Unknown merge strategy '{strategy}', "
+            f"expected one of {MERGE_STRATEGIES}"
+        )
+
+    def rank(entry):
+        created = entry.get("created_at") or ""
+        uses = entry.get("use_count") or 0
+        return (created, uses) if strategy == "newest" else (uses, created)
+
+    return rank(incoming) > rank(existing)
@@ -0,0 +1,84 @@
+"""
+Cache of compiled extraction functions keyed by code hash
+"""
+import hashlib
+from .memory_cache import LRUMemoryCache
+
+
+def compute_code_hash(code):
+    """SHA256 of the extraction code text"""
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class CompiledExtractorCache:
+    """
+    Keeps the ``extract_data`` callable of each generated module warm so a
+    page only pays for calling it, not for compiling and exec'ing the
+    module again.
+
+    The module is executed once in a namespace built by
+    ``namespace_factory``; later pages reuse that function (and therefore
+    its module globals).
+    """
+
+    def __init__(self, namespace_factory, compiler=None, max_entries=128):
+        """
+        Args:
+            namespace_factory: Callable returning a fresh globals dict
+            compiler: Optional callable returning a code object for the
+                      source (e.g. one backed by persisted bytecode); it
+                      may return None to fall back to compile()
+            max_entries: Maximum number of functions kept warm
+        """
+        self.namespace_factory = namespace_factory
+        self.compiler = compiler
+        self._functions = LRUMemoryCache(
+            max_entries=max_entries, max_bytes=float("inf")
+        )
+        self.compilations = 0
+
+    def _compile(self, code):
+        code_object = self.compiler(code) if self.compiler else None
+        if code_object is None:
+            code_object = compile(code, "<extraction_code>", "exec")
+        self.compilations += 1
+        return code_object
+
+    def get_function(self, code):
+        """
+        Return the ``extract_data`` function defined by code.
+
+        Raises:
+            SyntaxError: If the code does not compile
+            Exception: If the code does not define ``extract_data``
+        """
+        code_hash = compute_code_hash(code)
+        function = self._functions.get(code_hash)
+        if function is not None:
+            return function
+
+        namespace = self.namespace_factory()
+        exec(self._compile(code), namespace)
+
+        function = namespace.get("extract_data")
+        if not callable(function):
+            raise Exception(
+                "Generated code doesn't contain 'extract_data' function"
+            )
+
+        self._functions.put(code_hash, function, 1)
+        return function
+
+    def clear(self):
+        """Forget every warm function"""
+        self._functions.clear()
+
+    def get_stats(self):
+        """Return warm-function counters"""
+        stats = self._functions.get_stats()
+        return {
+            "functions": stats["entries"],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "compilations": self.compilations,
+        }
@@ -0,0 +1,88 @@
+"""
+Eviction policy and background maintenance for the code cache
+"""
+import logging
+import threading
+
+
+class EvictionPolicy:
+    """
+    Limits enforced by CodeCache eviction.
+
+    Entries idle for longer than ``max_idle_days`` are removed first; after
+    that the least recently used entries are removed until both the entry
+    and the byte limits hold. ``None`` disables a limit.
+    """
+
+    def __init__(
+        self,
+        max_entries=10000,
+        max_bytes=100 * 1024 * 1024,
+        max_idle_days=90,
+        batch_size=200,
+        max_archived_files=500,
+        orphan_grace_seconds=600,
+    ):
+        """
+        Args:
+            max_entries: Maximum number of cache entries
+            max_bytes: Maximum total size of cached code
+            max_idle_days: Remove entries not used for this many days
+            batch_size: Rows deleted per transaction, so a large eviction
+                        never holds the write lock for long
+            max_archived_files: Newest files kept in the code archive
+                                directory (e.g. temp/extraction_codes)
+            orphan_grace_seconds: Unreferenced code and HTML files younger
+                                  than this are kept; their entry may still
+                                  be on its way into the database
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_idle_days = max_idle_days
+        self.batch_size = batch_size
+        self.max_archived_files = max_archived_files
+        self.orphan_grace_seconds = orphan_grace_seconds
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class MaintenanceWorker:
+    """
+    Daemon thread that periodically runs ``run_maintenance()`` on a cache.
+
+    Only a weak reference to the cache is held, so the thread stops by
+    itself once the cache is garbage collected.
+    """
+
+    def __init__(self, cache_ref, interval):
+        self.cache_ref = cache_ref
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="code-cache-maintenance", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            cache = self.cache_ref()
+            if cache is None:
+                return
+            try:
+                cache.run_maintenance()
+            except Exception as e:
+                self.logger.error(f"Cache maintenance failed: {str(e)}")
+            finally:
+                del cache
@@ -0,0 +1,77 @@
+"""
+Negative caching of failed code generations
+"""
+import time
+from typing import NamedTuple, Dict, Any
+
+
+class FailureRecord(NamedTuple):
+    """Most recent failure recorded for a generation key"""
+
+    reason: str
+    attempts: int
+    retry_at: float
+
+    @property
+    def retry_in(self) -> float:
+        """Seconds until generation may be retried"""
+        return max(0.0, self.retry_at - time.time())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "reason": self.reason,
+            "attempts": self.attempts,
+            "retry_in": round(self.retry_in, 1),
+        }
+
+
+class BackoffPolicy:
+    """Exponential backoff between generation attempts for one key"""
+
+    def __init__(
+        self,
+        base_delay: float = 60.0,
+        factor: float = 2.0,
+        max_delay: float = 3600.0,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            base_delay: Seconds to wait after the first failure
+            factor: Multiplier applied for each further failure
+            max_delay: Upper bound on the wait
+        """
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+
+    def delay(self, attempts: int) -> float:
+        """Seconds to wait after the given number of failed attempts"""
+        return min(
+            self.max_delay,
+            self.base_delay * self.factor ** max(0, attempts - 1),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base_delay": self.base_delay,
+            "factor": self.factor,
+            "max_delay": self.max_delay,
+        }
+
+
+class RecentlyFailedError(RuntimeError):
+    """
+    Raised instead of calling the AI model again while a key is backing
+    off after failed generations.
+    """
+
+    def __init__(self, url: str, failure: FailureRecord):
+        self.url = url
+        self.failure = failure
+        super().__init__(
+            f"Code generation for {url} recently failed "
+            f"({failure.attempts} attempt(s), last: {failure.reason}); "
+            f"retrying in {failure.retry_in:.0f}s"
+        )
@@ -0,0 +1,84 @@
+"""
+Locality-sensitive structural fingerprints (SimHash) for near-duplicate
+page detection
+"""
+import hashlib
+import re
+from collections import Counter
+
+SIMHASH_BITS = 64
+
+_TAG_PATTERN = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9-]*)([^>]*)>")
+_CLASS_PATTERN = re.compile(r"""class=["']([^"']*)["']""")
+
+
+def structural_features(structural_html, shingle_size=4):
+    """
+    Extract SimHash features from structural HTML.
+
+    The tag sequence contributes overlapping shingles (layout), while each
+    distinct ``tag.class`` pair is a single feature of its own, so one
+    extra class on a repeated card shifts the fingerprint slightly instead
+    of rewriting every shingle that contains the card.
+    """
+    tags = []
+    class_features = set()
+    for closing, tag, attrs in _TAG_PATTERN.findall(structural_html):
+        tag = tag.lower()
+        if closing:
+            tags.append(f"/{tag}")
+            continue
+        tags.append(tag)
+        classes = _CLASS_PATTERN.search(attrs)
+        if classes:
+            class_features.update(
+                f"{tag}.{name}" for name in classes.group(1).split()
+            )
+    return shingles(tags, shingle_size) + sorted(class_features)
+
+
+def shingles(tokens, size=4):
+    """Overlapping windows of ``size`` consecutive tokens"""
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return [
+        " ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)
+    ]
+
+
+def simhash(features, bits=SIMHASH_BITS):
+    """
+    Compute a SimHash over weighted features.
+
+    Similar feature multisets yield fingerprints with a small Hamming
+    distance, unlike a cryptographic hash where one change flips
+    everything.
+
+    Returns:
+        Fingerprint as an integer in [0, 2**bits)
+    """
+    weights = [0] * bits
+    for feature, count in Counter(features).items():
+        digest = hashlib.blake2b(
+            feature.encode("utf-8"), digest_size=bits // 8
+        ).digest()
+        value = int.from_bytes(digest, "big")
+        for bit in range(bits):
+            weights[bit] += count if value >> bit & 1 else -count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def structural_simhash(structural_html, shingle_size=4):
+    """SimHash of the structural shingles of a page, as a hex string"""
+    value = simhash(structural_features(structural_html, shingle_size))
+    return f"{value:0{SIMHASH_BITS // 4}x}"
+
+
+def hamming_distance(first, second):
+    """Number of differing bits between two hex fingerprints"""
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
@@ -0,0 +1,116 @@
+"""
+Bounded in-process LRU tier used in front of the SQLite code cache
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUMemoryCache:
+    """
+    Thread-safe LRU cache bounded by entry count and total size in bytes.
+
+    Each entry carries an explicit size so callers decide what "bytes"
+    means for their values (e.g. the encoded length of the code text).
+    """
+
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        """Whether the tier can hold anything at all"""
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key):
+        """Return the cached value for key (marking it recently used) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """
+        Insert or replace a value and evict least recently used entries
+        until both limits are respected.
+
+        Returns:
+            True if the value was stored, False if it can never fit
+        """
+        if not self.enabled or size > self.max_bytes:
+            self.invalidate(key)
+            return False
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+
+            while (
+                len(self._entries) > self.max_entries
+                or self._total_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key):
+        """Drop a single key; returns True if it was present"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._total_bytes -= entry[1]
+            return True
+
+    def invalidate_where(self, predicate):
+        """Drop every entry for which predicate(key, value) is true"""
+        with self._lock:
+            doomed = [
+                key for key, (value, _) in self._entries.items()
+                if predicate(key, value)
+            ]
+            for key in doomed:
+                self._total_bytes -= self._entries.pop(key)[1]
+            return len(doomed)
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get_stats(self):
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            }
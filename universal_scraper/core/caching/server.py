@@ -0,0 +1,266 @@
+"""
+HTTP key-value service shared by code caches on several nodes
+
+Run it with:
+
+    export UNIVERSAL_SCRAPER_CACHE_TOKEN=<shared secret>
+    python -m universal_scraper.core.caching.server --port 8765
+
+and point scrapers, which need the same secret, at it with
+--cache-url http://host:8765.
+
+Endpoints:
+- GET /v1/entries/<id>: entry JSON, or 404
+- PUT /v1/entries/<id>: store the JSON body as the entry
+- GET /health: service status and entry count (needs no token)
+
+Trust model: entries hold extraction code that every node executes. Entry
+requests must carry the shared secret as a bearer token, and nodes also sign
+the entries they write with it and reject entries that do not verify, so
+only holders of the secret can get code run on the fleet. Anyone holding it
+can; treat it like a deploy credential. Traffic is plain HTTP: the service
+binds to 127.0.0.1 by default, and should only be exposed on a trusted
+network or behind a TLS-terminating proxy.
+"""
+import os
+import re
+import hmac
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any
+
+from .backends import CACHE_TOKEN_ENV
+
+ENTRY_PATH = re.compile(r"^/v1/entries/([0-9a-f]{64})$")
+
+# Largest entry accepted by PUT; extraction code is a few KB
+MAX_ENTRY_BYTES = 1024 * 1024
+
+
+class EntryStore:
+    """SQLite-backed storage of the service's entries"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    entry_id TEXT PRIMARY KEY,
+                    entry_json TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+            )
+            conn.commit()
+
+    def get(self, entry_id: str) -> Optional[str]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT entry_json FROM entries WHERE entry_id = ?",
+                (entry_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, entry_id: str, entry_json: str) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO entries (entry_id, entry_json)
+                VALUES (?, ?)
+            """,
+                (entry_id, entry_json),
+            )
+            conn.commit()
+
+    def count(self) -> int:
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    """Request handler; the store is taken from the server instance"""
+
+    server_version = "UniversalScraperCache/1"
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self._send(status, body)
+
+    def _send(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        """Check the bearer token, answering 401 when it is wrong"""
+        expected = f"Bearer {self.server.token}"
+        given = self.headers.get("Authorization") or ""
+        if hmac.compare_digest(
+            given.encode("utf-8"), expected.encode("utf-8")
+        ):
+            return True
+        self._send_json(401, {"error": "unauthorized"})
+        return False
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(
+                200, {"status": "ok", "entries": self.server.store.count()}
+            )
+            return
+        if not self._authorized():
+            return
+
+        match = ENTRY_PATH.match(self.path)
+        if not match:
+            self._send_json(404, {"error": "not found"})
+            return
+
+        entry_json = self.server.store.get(match.group(1))
+        if entry_json is None:
+            self._send_json(404, {"error": "not found"})
+        else:
+            self._send(200, entry_json.encode("utf-8"))
+
+    def do_PUT(self):
+        if not self._authorized():
+            return
+
+        match = ENTRY_PATH.match(self.path)
+        if not match:
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if not 0 < length <= MAX_ENTRY_BYTES:
+            self._send_json(413, {"error": "invalid entry size"})
+            return
+
+        try:
+            entry = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(entry, dict) or "extraction_code" not in entry:
+                raise ValueError("entry must contain extraction_code")
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        self.server.store.put(match.group(1), json.dumps(entry))
+        self._send(204)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format % args)
+
+
+class CacheService:
+    """
+    The HTTP key-value service, runnable in the foreground (serve_forever)
+    or on a background thread (start/stop).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        db_path: str = "cache_service.db",
+        token: Optional[str] = None,
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            db_path: SQLite database holding the shared entries
+            token: Shared secret clients must present; defaults to the
+                   UNIVERSAL_SCRAPER_CACHE_TOKEN environment variable
+
+        Raises:
+            ValueError: If no shared secret is configured
+        """
+        token = token or os.environ.get(CACHE_TOKEN_ENV)
+        if not token:
+            raise ValueError(
+                f"The cache service needs a shared secret: pass token or "
+                f"set {CACHE_TOKEN_ENV}"
+            )
+
+        self.logger = logging.getLogger(__name__)
+        self.httpd = ThreadingHTTPServer((host, port), CacheRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.store = EntryStore(db_path)
+        self.httpd.token = token
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self.logger.info(f"Code cache service listening on {self.url}")
+        self.httpd.serve_forever()
+
+    def start(self) -> None:
+        """Serve on a daemon thread"""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="code-cache-service", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Shared code cache service for Universal Scraper"
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Interface to bind (default: 127.0.0.1); only expose the "
+        "service on a trusted network",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default="cache_service.db")
+    parser.add_argument(
+        "--token",
+        default=os.environ.get(CACHE_TOKEN_ENV),
+        help=f"Shared secret of the service and its nodes (default: "
+        f"${CACHE_TOKEN_ENV})",
+    )
+    args = parser.parse_args()
+    if not args.token:
+        parser.error(
+            f"a shared secret is required: --token or {CACHE_TOKEN_ENV}"
+        )
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    service = CacheService(args.host, args.port, args.db, args.token)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Single-flight coordination of concurrent code generations
+"""
+import threading
+from typing import Dict, Any, Tuple
+
+
+class SingleFlight:
+    """
+    Lets one thread (the leader) run the work for a key while other
+    threads asking for the same key wait for it to finish.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def begin(self, key) -> Tuple[bool, threading.Event]:
+        """
+        Join the flight for key, starting it if none is in progress.
+
+        Args:
+            key: Hashable flight key
+
+        Returns:
+            Tuple of (is_leader, event set when the leader ends the flight)
+        """
+        with self._lock:
+            done = self._flights.get(key)
+            if done is not None:
+                self.followers += 1
+                return False, done
+
+            done = threading.Event()
+            self._flights[key] = done
+            self.leaders += 1
+            return True, done
+
+    def end(self, key) -> None:
+        """Finish the flight for key and wake its followers"""
+        with self._lock:
+            done = self._flights.pop(key, None)
+        if done is not None:
+            done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight(),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
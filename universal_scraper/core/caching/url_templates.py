@@ -0,0 +1,172 @@
+"""
+URL-template inference so one cached extractor serves a whole path family
+"""
+import re
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+
+ID_PLACEHOLDER = "{id}"
+UUID_PLACEHOLDER = "{uuid}"
+DATE_PLACEHOLDER = "{date}"
+HASH_PLACEHOLDER = "{hash}"
+SLUG_PLACEHOLDER = "{slug}"
+
+_NUMERIC = re.compile(r"^\d+$")
+_UUID = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I
+)
+_FULL_DATE = re.compile(r"^(19|20)\d{2}-?(0[1-9]|1[0-2])-?(0[1-9]|[12]\d|3[01])$")
+_YEAR = re.compile(r"^(19|20)\d{2}$")
+_MONTH_OR_DAY = re.compile(r"^(0?[1-9]|[12]\d|3[01])$")
+_HEX_HASH = re.compile(r"^(?=.*\d)(?=.*[a-f])[0-9a-f]{16,}$", re.I)
+_SLUG = re.compile(r"^[a-z0-9]+(?:[-_][a-z0-9]+)+$", re.I)
+
+
+def _split_extension(segment):
+    stem, dot, extension = segment.rpartition(".")
+    if dot and stem and extension.isalpha() and len(extension) <= 5:
+        return stem, "." + extension
+    return segment, ""
+
+
+def is_slug(segment):
+    """Whether a path segment looks like a human-readable slug"""
+    stem, _ = _split_extension(segment)
+    return bool(_SLUG.match(stem))
+
+
+def generalize_segments(segments):
+    """
+    Replace segments that are always variable (numeric IDs, UUIDs, hashes
+    and dates) with placeholders; slugs are left to the learner.
+    """
+    result = list(segments)
+    for i, segment in enumerate(segments):
+        stem, extension = _split_extension(segment)
+        if _FULL_DATE.match(stem):
+            result[i] = DATE_PLACEHOLDER + extension
+        elif (
+            _YEAR.match(stem)
+            and i + 1 < len(segments)
+            and _MONTH_OR_DAY.match(segments[i + 1])
+        ):
+            # /2024/05/17/... style archives
+            result[i] = DATE_PLACEHOLDER
+            result[i + 1] = DATE_PLACEHOLDER
+            if i + 2 < len(segments) and _MONTH_OR_DAY.match(segments[i + 2]):
+                result[i + 2] = DATE_PLACEHOLDER
+        elif result[i] != segment:
+            continue
+        elif _UUID.match(stem):
+            result[i] = UUID_PLACEHOLDER + extension
+        elif _NUMERIC.match(stem):
+            result[i] = ID_PLACEHOLDER + extension
+        elif _HEX_HASH.match(stem):
+            result[i] = HASH_PLACEHOLDER + extension
+    return result
+
+
+class UrlTemplateLearner:
+    """
+    Learns URL templates per domain from observed URLs.
+
+    Numeric IDs, UUIDs, hashes and dates are collapsed on sight. Slugs are
+    only collapsed once two observed URLs differ in exactly that segment,
+    so static pages such as ``/about-us`` keep their own template until
+    the site shows that the position really varies.
+    """
+
+    def __init__(self, max_observed_per_shape=200):
+        self.max_observed_per_shape = max_observed_per_shape
+        self._observed = defaultdict(list)
+        self._templates = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _split(url):
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.split("/") if segment]
+        return parsed, segments
+
+    @staticmethod
+    def _join(parsed, segments):
+        path = "/" + "/".join(segments) if segments else ""
+        return f"{parsed.scheme}://{parsed.netloc}{path}"
+
+    def add_template(self, template):
+        """Register a template learned earlier (e.g. loaded from storage)"""
+        parsed, segments = self._split(template)
+        with self._lock:
+            self._templates[parsed.netloc.lower()].add(tuple(segments))
+
+    def templates(self, domain):
+        """Learned slug templates for a domain, as URLs"""
+        with self._lock:
+            learned = sorted(self._templates.get(domain.lower(), ()))
+        return [
+            "/" + "/".join(segments) for segments in learned
+        ]
+
+    def _match(self, domain, segments):
+        for template in self._templates.get(domain, ()):
+            if len(template) != len(segments):
+                continue
+            if all(
+                expected == actual
+                or (expected == SLUG_PLACEHOLDER and is_slug(actual))
+                for expected, actual in zip(template, segments)
+            ):
+                return list(template)
+        return None
+
+    def observe(self, url):
+        """
+        Record a URL and learn new slug templates from it.
+
+        Returns:
+            Newly learned template URL, or None
+        """
+        parsed, segments = self._split(url)
+        domain = parsed.netloc.lower()
+        generalized = tuple(generalize_segments(segments))
+
+        with self._lock:
+            if self._match(domain, list(generalized)):
+                return None
+
+            shape = (domain, len(generalized))
+            observed = self._observed[shape]
+            learned = None
+            for other in observed:
+                differing = [
+                    i for i, (a, b) in enumerate(zip(other, generalized))
+                    if a != b
+                ]
+                if (
+                    len(differing) == 1
+                    and is_slug(other[differing[0]])
+                    and is_slug(generalized[differing[0]])
+                ):
+                    template = list(generalized)
+                    template[differing[0]] = SLUG_PLACEHOLDER
+                    self._templates[domain].add(tuple(template))
+                    learned = self._join(parsed, template)
+                    break
+
+            if learned is None and generalized not in observed:
+                observed.append(generalized)
+                if len(observed) > self.max_observed_per_shape:
+                    observed.pop(0)
+            return learned
+
+    def template_for(self, url):
+        """
+        Template URL for a URL: learned slug templates first, otherwise
+        the URL with IDs, UUIDs, hashes and dates collapsed.
+        """
+        parsed, segments = self._split(url)
+        generalized = generalize_segments(segments)
+        with self._lock:
+            matched = self._match(parsed.netloc.lower(), generalized)
+        return self._join(parsed, matched or generalized)
@@ -0,0 +1,81 @@
+"""
+Write-behind buffer for cache usage statistics
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class UsageStatsBuffer:
+    """
+    Accumulates cache hits in memory so they can be written to SQLite in
+    one batched transaction instead of one UPDATE + commit per hit.
+    """
+
+    def __init__(self, flush_interval=30.0, flush_threshold=100):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = {}
+        self._pending_hits = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def _timestamp():
+        """Timestamp in the same format SQLite uses for CURRENT_TIMESTAMP"""
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    def record(self, key):
+        """Record one use of key; returns True when a flush is due"""
+        now = self._timestamp()
+        with self._lock:
+            count, _ = self._pending.get(key, (0, now))
+            self._pending[key] = (count + 1, now)
+            self._pending_hits += 1
+            return self._is_due()
+
+    def _is_due(self):
+        return self._pending_hits >= self.flush_threshold or (
+            self._pending
+            and time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def drain(self):
+        """
+        Take every pending update out of the buffer.
+
+        Returns:
+            List of (use_count_delta, last_used_at, *key) tuples ready for
+            executemany()
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_hits = 0
+            self._last_flush = time.monotonic()
+        return [
+            (count, last_used, *key)
+            for key, (count, last_used) in pending.items()
+        ]
+
+    def restore(self, rows):
+        """Put drained rows back after a failed flush so no hits are lost"""
+        with self._lock:
+            for count, last_used, *key in rows:
+                key = tuple(key)
+                pending_count, pending_last = self._pending.get(
+                    key, (0, last_used)
+                )
+                self._pending[key] = (
+                    pending_count + count,
+                    max(pending_last, last_used),
+                )
+                self._pending_hits += count
+
+    def discard(self):
+        """Forget every pending update (e.g. after the cache was cleared)"""
+        with self._lock:
+            self._pending = {}
+            self._pending_hits = 0
+
+    def __len__(self):
+        return self._pending_hits
@@ -9,9 +9,11 @@ This package provides modular HTML cleaning functionality split into focused com
 - content_optimizer: Text collapsing, empty divs, whitespace removal
 - duplicate_finder: Find and remove repeating structures
 - attribute_cleaner: Remove non-essential attributes
+- prompt_budget: Fit cleaned HTML into a prompt token budget
 - html_cleaner: Main orchestrator that coordinates all cleaning steps
 """
 
 from .html_cleaner import HtmlCleaner
+from .prompt_budget import PromptBudgeter, FittedHtml
 
-__all__ = ['HtmlCleaner']
+__all__ = ['HtmlCleaner', 'PromptBudgeter', 'FittedHtml']
@@ -77,11 +77,20 @@ class DuplicateFinder(BaseHtmlCleaner):
         structure_str = get_element_tree_structure(element)
         return hashlib.sha256(structure_str.encode()).hexdigest()[:16]
 
-    def find_repeating_structures(
-        self, soup, min_keep=2, min_total=3, similarity_threshold=0.85
+    def find_repeating_groups(
+        self,
+        soup,
+        min_total=3,
+        similarity_threshold=0.85,
+        min_chars=200,
+        max_chars=10000,
+        max_text=2000,
     ):
         """
-        Find repeating HTML structures and return elements to remove.
+        Find groups of structurally similar elements (repeated items such
+        as listing cards or table rows) with at least min_total members.
+        Candidates are elements of min_chars to max_chars of HTML with at
+        most max_text characters of text (None for no upper bound).
         """
         body = soup.find("body")
         if not body:
@@ -100,8 +109,10 @@ class DuplicateFinder(BaseHtmlCleaner):
 
             # Skip if too small, too large, or mostly empty
             if (
-                len(elem_str) < 200 or len(elem_str) > 10000
-                or len(elem_text) < 10 or len(elem_text) > 2000
+                len(elem_str) < min_chars
+                or (max_chars is not None and len(elem_str) > max_chars)
+                or len(elem_text) < 10
+                or (max_text is not None and len(elem_text) > max_text)
             ):
                 continue
 
@@ -156,10 +167,20 @@ class DuplicateFinder(BaseHtmlCleaner):
             if len(similar_group) >= min_total:
                 similar_groups[group_key] = similar_group
 
+        return list(similar_groups.values())
+
+    def find_repeating_structures(
+        self, soup, min_keep=2, min_total=3, similarity_threshold=0.85
+    ):
+        """
+        Find repeating HTML structures and return elements to remove.
+        """
         # Determine which elements to remove
         elements_to_remove = []
 
-        for group_key, elements in similar_groups.items():
+        for elements in self.find_repeating_groups(
+            soup, min_total, similarity_threshold
+        ):
             if len(elements) >= min_total:
                 # Sort by position in document to keep the first ones
                 elements_with_pos = []
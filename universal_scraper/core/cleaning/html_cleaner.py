@@ -24,6 +24,10 @@ class HtmlCleaner(BaseHtmlCleaner):
     6. Remove non-essential attributes
     """
 
+    # Recorded with cached extraction code; bump when a cleaning change
+    # alters the HTML that code is generated from and fingerprinted on
+    VERSION = "1"
+
     def __init__(self, temp_dir="temp"):
         super().__init__(temp_dir)
 
@@ -0,0 +1,168 @@
+"""
+Fit page HTML into a prompt token budget
+"""
+from typing import NamedTuple, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from .base_cleaner import BaseHtmlCleaner
+from .duplicate_finder import DuplicateFinder
+from ..llm.usage import count_tokens
+
+
+class FittedHtml(NamedTuple):
+    """HTML shown to the model and how it was reduced"""
+
+    html: str
+    tokens: int
+    original_tokens: int
+    # "full" (unchanged), "subtree" (repeated items and their ancestors),
+    # "chunk" (densest run of blocks) or "truncated"
+    strategy: str
+
+
+class PromptBudgeter(BaseHtmlCleaner):
+    """
+    Reduces cleaned HTML that is still too large for the prompt. The
+    repeated-item container found by DuplicateFinder is kept with as many
+    items as fit and only its ancestor tags around it; pages without
+    repeated items fall back to the densest run of top-level blocks.
+    """
+
+    def __init__(self, temp_dir="temp"):
+        super().__init__(temp_dir)
+        self.duplicate_finder = DuplicateFinder(temp_dir)
+
+    def fit(self, html_content, max_tokens):
+        """
+        Fit html_content into max_tokens.
+
+        Returns:
+            FittedHtml
+        """
+        max_tokens = max(1, max_tokens)
+        tokens = count_tokens(html_content)
+        if tokens <= max_tokens:
+            return FittedHtml(html_content, tokens, tokens, "full")
+
+        strategy = "subtree"
+        html = self._representative_subtree(html_content, max_tokens)
+        if html is None:
+            strategy = "chunk"
+            html = self._densest_chunk(html_content, max_tokens)
+        if count_tokens(html) > max_tokens:
+            strategy = "truncated"
+            html = self._truncate(html, max_tokens)
+
+        fitted = FittedHtml(html, count_tokens(html), tokens, strategy)
+        self.logger.info(
+            f"Prompt HTML reduced from {tokens} to {fitted.tokens} tokens "
+            f"({strategy})"
+        )
+        return fitted
+
+    def _representative_subtree(self, html_content, max_tokens):
+        """
+        The container of the densest group of repeated items with the
+        leading items that fit, inside its ancestors stripped of all other
+        content; None if the page has no repeated items or not even one
+        item fits
+        """
+        soup = BeautifulSoup(html_content, "html.parser")
+        # Cleaned pages keep two samples of each repeated structure; items
+        # of any size count, the page being too large is the problem here
+        groups = self.duplicate_finder.find_repeating_groups(
+            soup, min_total=2, min_chars=50, max_chars=None, max_text=None
+        )
+        if not groups:
+            return None
+
+        order = {id(tag): i for i, tag in enumerate(soup.find_all(True))}
+        items = max(
+            groups,
+            key=lambda group: sum(len(item.get_text()) for item in group),
+        )
+        items = sorted(items, key=lambda item: order[id(item)])
+        container = self._common_ancestor(items)
+
+        # Drop everything beside the path from the root to the container
+        node = container
+        while node.parent is not None:
+            for sibling in list(node.parent.children):
+                if sibling is not node:
+                    sibling.extract()
+            node = node.parent
+
+        # Drop items from the end until the rest fits
+        item_tokens = [count_tokens(str(item)) for item in items]
+        total = count_tokens(str(soup))
+        kept = len(items)
+        while kept > 1 and total > max_tokens:
+            kept -= 1
+            items[kept].decompose()
+            total -= item_tokens[kept]
+        html = str(soup)
+        if count_tokens(html) > max_tokens:
+            return None
+        return html
+
+    @staticmethod
+    def _common_ancestor(elements):
+        """Lowest element containing all of elements"""
+        shared = set.intersection(
+            *({id(parent) for parent in e.parents} for e in elements)
+        )
+        for parent in elements[0].parents:
+            if id(parent) in shared:
+                return parent
+        return elements[0].parent
+
+    def _blocks(self, element, max_tokens) -> List[Tuple[str, int, int]]:
+        """
+        (html, tokens, text length) of the blocks of element in document
+        order, descending into elements larger than max_tokens
+        """
+        blocks = []
+        for child in element.children:
+            html = str(child)
+            if not html.strip():
+                continue
+            tokens = count_tokens(html)
+            if tokens > max_tokens and getattr(child, "contents", None):
+                blocks.extend(self._blocks(child, max_tokens))
+                continue
+            text = child.get_text() if hasattr(child, "get_text") else html
+            blocks.append((html, tokens, len(text.strip())))
+        return blocks
+
+    def _densest_chunk(self, html_content, max_tokens):
+        """The consecutive blocks within max_tokens with the most text"""
+        soup = BeautifulSoup(html_content, "html.parser")
+        blocks = self._blocks(soup.body or soup, max_tokens)
+        if not blocks:
+            return html_content
+
+        best = (-1, 0, 1)
+        start = tokens = text = 0
+        for end, (_, block_tokens, block_text) in enumerate(blocks):
+            tokens += block_tokens
+            text += block_text
+            while tokens > max_tokens and start < end:
+                tokens -= blocks[start][1]
+                text -= blocks[start][2]
+                start += 1
+            if text > best[0]:
+                best = (text, start, end + 1)
+
+        _, start, end = best
+        return "".join(html for html, _, _ in blocks[start:end])
+
+    @staticmethod
+    def _truncate(html, max_tokens):
+        """Cut html down to max_tokens"""
+        tokens = count_tokens(html)
+        while tokens > max_tokens:
+            # Token density varies along the page; shrink until it fits
+            html = html[: int(len(html) * max_tokens / tokens * 0.95)]
+            tokens = count_tokens(html)
+        return html
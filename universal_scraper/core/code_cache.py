@@ -1,24 +1,109 @@
 import os
+import gzip
 import json
+import sys
+import atexit
+import marshal
 import hashlib
 import sqlite3
 import logging
 import re
-from typing import Optional, Dict, Any
+import threading
+import time
+import weakref
+from typing import Optional, Dict, Any, NamedTuple, Tuple
+from types import CodeType
 from urllib.parse import urlparse
 from datetime import datetime
 from bs4 import BeautifulSoup
+from .caching import (
+    LRUMemoryCache,
+    UsageStatsBuffer,
+    compute_code_hash,
+    structural_simhash,
+    hamming_distance,
+    UrlTemplateLearner,
+    EvictionPolicy,
+    MaintenanceWorker,
+)
+from .caching.backends import CacheBackend, entry_id
+from .caching.failures import BackoffPolicy, FailureRecord
+from .llm.usage import TokenUsage
+from .caching.bundle import (
+    BUNDLE_COLUMNS,
+    LEGACY_VERSIONS,
+    read_bundle,
+    write_bundle,
+    incoming_wins,
+)
+
+
+class CachedCode(NamedTuple):
+    """Extraction code held by the in-memory tier with its compiled form"""
+
+    code: str
+    compiled: Optional[CodeType]
+    # (url_clean, structural_hash, fields_hash) of the row that served it
+    key: Optional[tuple] = None
+
+
+class NearMatch(NamedTuple):
+    """Closest cached entry for a page whose exact structure was not found"""
+
+    code: str
+    url_clean: str
+    structural_hash: str
+    distance: int
+    model_name: Optional[str] = None
+
+
+class TrialCandidate(NamedTuple):
+    """Previously cached code worth trying on a page before regenerating"""
+
+    code: str
+    url_clean: str
+    structural_hash: str
+    source: str
+    record_count: Optional[int] = None
+    # Model that generated the code
+    model_name: Optional[str] = None
+
+
+class SupersetMatch(NamedTuple):
+    """Cached code for the same structure that extracts more fields"""
+
+    code: str
+    url_clean: str
+    fields: list
+    model_name: Optional[str] = None
 
 
 class CodeCache:
     """
     A caching system for BeautifulSoup extraction codes.
     Stores generated codes based on URL (without query params) and
-    structural hash.
+    structural hash, with a bounded in-memory LRU tier in front of SQLite.
     """
 
+    # Bump when _structural_html/_compute_fingerprints change; entries
+    # fingerprinted by an older scheme are migrated from archived HTML
+    STRUCTURAL_HASH_VERSION = 1
+
     def __init__(
-        self, db_path: str = "extraction_cache.db", cache_dir: str = "cache"
+        self,
+        db_path: str = "extraction_cache.db",
+        cache_dir: str = "cache",
+        memory_max_entries: int = 256,
+        memory_max_bytes: int = 8 * 1024 * 1024,
+        usage_flush_interval: float = 30.0,
+        usage_flush_threshold: int = 100,
+        near_match_max_distance: int = 8,
+        eviction_policy: Optional[EvictionPolicy] = None,
+        maintenance_interval: Optional[float] = None,
+        code_archive_dir: Optional[str] = None,
+        backend: Optional[CacheBackend] = None,
+        backoff_policy: Optional[BackoffPolicy] = None,
+        match_versions: tuple = ("prompt_version", "cleaner_version"),
     ):
         """
         Initialize the code cache.
@@ -26,16 +111,84 @@ class CodeCache:
         Args:
             db_path: Path to SQLite database file
             cache_dir: Directory to store cached extraction codes
+            memory_max_entries: Maximum entries kept in the in-memory LRU
+                                tier (0 disables the tier)
+            memory_max_bytes: Maximum total size of code held in the
+                              in-memory LRU tier
+            usage_flush_interval: Seconds after which buffered usage
+                                  statistics are written to SQLite
+            usage_flush_threshold: Number of buffered hits that triggers
+                                   a flush regardless of the interval
+            near_match_max_distance: Maximum SimHash Hamming distance (out
+                                     of 64 bits) for a near-duplicate
+                                     structure to be offered as a candidate
+            eviction_policy: Size, recency and idle limits enforced by
+                             evict(); defaults to EvictionPolicy()
+            maintenance_interval: Seconds between background maintenance
+                                  runs (eviction + orphan GC); None
+                                  disables the background worker
+            code_archive_dir: Extra directory of saved extraction code
+                              (e.g. temp/extraction_codes) pruned by GC
+            backend: Shared store (e.g. HTTPBackend) that local misses read
+                     through to and new entries are written through to
+            backoff_policy: Delays between generation attempts for a key
+                            after failures; defaults to BackoffPolicy()
+            match_versions: Version fields (of model_name, prompt_version,
+                            cleaner_version) an entry must share with
+                            set_versions() to be served
         """
         self.logger = logging.getLogger(__name__)
         self.db_path = db_path
         self.cache_dir = cache_dir
+        self.memory_cache = LRUMemoryCache(
+            max_entries=memory_max_entries, max_bytes=memory_max_bytes
+        )
+        self.usage_buffer = UsageStatsBuffer(
+            flush_interval=usage_flush_interval,
+            flush_threshold=usage_flush_threshold,
+        )
+        self._flush_lock = threading.Lock()
+        self.near_match_max_distance = near_match_max_distance
+        self.near_match_hits = 0
+        self.near_match_misses = 0
+        self.url_templates = UrlTemplateLearner()
+        self.lookup_levels = {
+            "exact": 0,
+            "template": 0,
+            "domain": 0,
+            "remote": 0,
+        }
+        self.eviction_policy = eviction_policy or EvictionPolicy()
+        self.code_archive_dir = code_archive_dir
+        self.eviction_stats = {"idle": 0, "lru": 0, "files": 0}
+        self._maintenance = None
+        self.backend = backend
+        self.backoff_policy = backoff_policy or BackoffPolicy()
+        self.versions = {
+            "model_name": None,
+            "prompt_version": LEGACY_VERSIONS["prompt_version"],
+            "cleaner_version": LEGACY_VERSIONS["cleaner_version"],
+        }
+        self.match_versions = tuple(match_versions)
+        self.html_archive_dir = os.path.join(cache_dir, "html")
+        self._pending_migrations = set()
 
         # Create cache directory
         os.makedirs(cache_dir, exist_ok=True)
+        os.makedirs(self.html_archive_dir, exist_ok=True)
 
         # Initialize database
         self._init_database()
+        self._load_url_templates()
+        self._load_pending_migrations()
+
+        # Make sure buffered usage statistics survive interpreter shutdown
+        # without the exit hook keeping this instance alive
+        self._atexit_hook = self._make_atexit_hook(weakref.ref(self))
+        atexit.register(self._atexit_hook)
+
+        if maintenance_interval:
+            self.start_maintenance(maintenance_interval)
 
         self.logger.info(f"CodeCache initialized with database: {db_path}")
 
@@ -44,6 +197,9 @@ class CodeCache:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
 
+            # WAL lets readers proceed while a batched usage flush writes
+            cursor.execute("PRAGMA journal_mode=WAL")
+
             # Create cache table
             cursor.execute(
                 """
@@ -62,6 +218,46 @@ class CodeCache:
             """
             )
 
+            # Columns added after the original schema
+            self._ensure_columns(
+                cursor,
+                "extraction_cache",
+                {
+                    "domain": "TEXT",
+                    "simhash": "TEXT",
+                    "url_template": "TEXT",
+                    "record_count": "INTEGER",
+                    "fill_rate": "REAL",
+                    "fields_json": "TEXT",
+                    "model_name": "TEXT",
+                    "prompt_version": (
+                        f"TEXT DEFAULT '{LEGACY_VERSIONS['prompt_version']}'"
+                    ),
+                    "cleaner_version": (
+                        f"TEXT DEFAULT '{LEGACY_VERSIONS['cleaner_version']}'"
+                    ),
+                    "hash_version": (
+                        f"INTEGER DEFAULT {LEGACY_VERSIONS['hash_version']}"
+                    ),
+                    "html_path": "TEXT",
+                    "prompt_tokens": "INTEGER",
+                    "completion_tokens": "INTEGER",
+                    "llm_cost": "REAL",
+                },
+            )
+
+            # Slug templates learned per domain
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS url_templates (
+                    domain TEXT NOT NULL,
+                    template TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (domain, template)
+                )
+            """
+            )
+
             # Create index for faster lookups
             cursor.execute(
                 """
@@ -69,10 +265,212 @@ class CodeCache:
                 ON extraction_cache(url_clean, structural_hash, fields_hash)
             """
             )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_domain_fields
+                ON extraction_cache(domain, fields_hash)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_template_hash
+                ON extraction_cache(url_template, structural_hash, fields_hash)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_domain_hash
+                ON extraction_cache(domain, structural_hash, fields_hash)
+            """
+            )
+
+            # Marshalled bytecode per interpreter so warm starts skip
+            # compiling the generated modules
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS compiled_code (
+                    code_hash TEXT NOT NULL,
+                    cache_tag TEXT NOT NULL,
+                    bytecode BLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (code_hash, cache_tag)
+                )
+            """
+            )
+
+            # Generation leases coordinate processes sharing this database
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS generation_leases (
+                    lease_key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """
+            )
+
+            # Failed generations per generation key, for backoff
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS generation_failures (
+                    failure_key TEXT PRIMARY KEY,
+                    url_key TEXT NOT NULL,
+                    reason TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_failed_at REAL NOT NULL,
+                    retry_at REAL NOT NULL
+                )
+            """
+            )
+
+            # Model tier whose code last validated per domain, so later
+            # misses skip tiers known to be too weak for the site
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS model_tiers (
+                    domain TEXT NOT NULL,
+                    tiers TEXT NOT NULL,
+                    tier INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (domain, tiers)
+                )
+            """
+            )
 
             conn.commit()
             self.logger.debug("Database initialized successfully")
 
+    def _ensure_columns(self, cursor, table: str, columns: Dict[str, str]):
+        """
+        Add columns missing from databases created by older versions.
+
+        Args:
+            cursor: SQLite cursor
+            table: Table name
+            columns: Mapping of column name to SQL type declaration
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, declaration in columns.items():
+            if name not in existing:
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {name} {declaration}"
+                )
+                self.logger.debug(f"Added column {table}.{name}")
+
+    def set_versions(self, **versions) -> None:
+        """
+        Set the versions recorded with new entries and required of served
+        entries (see match_versions).
+
+        Args:
+            **versions: model_name, prompt_version and/or cleaner_version
+        """
+        unknown = set(versions) - set(self.versions)
+        if unknown:
+            raise ValueError(f"Unknown version fields: {sorted(unknown)}")
+
+        if any(self.versions[k] != v for k, v in versions.items()):
+            self.versions.update(versions)
+            # Entries held in memory were matched against the old versions
+            self.memory_cache.clear()
+
+    def _version_filter(self) -> Tuple[str, tuple]:
+        """SQL condition and parameters restricting rows to served versions"""
+        clause = "".join(f" AND {name} IS ?" for name in self.match_versions)
+        return clause, tuple(self.versions[name] for name in self.match_versions)
+
+    def _versions_match(self, entry: Dict[str, Any]) -> bool:
+        """Whether an entry dict (bundle columns) may be served"""
+        return all(
+            entry.get(name, LEGACY_VERSIONS.get(name)) == self.versions[name]
+            for name in self.match_versions
+        )
+
+    def _domain(self, url: str) -> str:
+        """Host part of a URL used to scope near-duplicate lookups"""
+        return urlparse(url).netloc.lower()
+
+    def _load_url_templates(self):
+        """Seed the template learner with templates learned earlier"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    "SELECT template FROM url_templates"
+                ).fetchall()
+            for (template,) in rows:
+                self.url_templates.add_template(template)
+        except Exception as e:
+            self.logger.error(f"Error loading URL templates: {str(e)}")
+
+    def _observe_url(self, url: str) -> None:
+        """
+        Feed a URL to the template learner; when it learns a new template,
+        persist it and re-key existing entries of that domain.
+        """
+        template = self.url_templates.observe(self._clean_url(url))
+        if not template:
+            return
+
+        self.logger.info(f"Learned URL template: {template}")
+        domain = self._domain(url)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    """
+                    INSERT OR IGNORE INTO url_templates (domain, template)
+                    VALUES (?, ?)
+                """,
+                    (domain, template),
+                )
+                rows = conn.execute(
+                    "SELECT id, url_clean FROM extraction_cache "
+                    "WHERE domain = ?",
+                    (domain,),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE extraction_cache SET url_template = ? "
+                    "WHERE id = ?",
+                    [
+                        (self.url_templates.template_for(url_clean), row_id)
+                        for row_id, url_clean in rows
+                    ],
+                )
+                conn.commit()
+        except Exception as e:
+            self.logger.error(f"Error storing URL template: {str(e)}")
+
+    def get_url_template(self, url: str) -> str:
+        """
+        Template URL (IDs, UUIDs, dates and learned slugs replaced by
+        placeholders) that groups this URL with the rest of its path family.
+
+        Args:
+            url: Original URL
+
+        Returns:
+            Template URL such as https://shop.com/product/{id}
+        """
+        return self.url_templates.template_for(self._clean_url(url))
+
+    def group_by_template(self, urls: list) -> Dict[str, list]:
+        """
+        Learn templates from a list of URLs and group the URLs by template.
+
+        Args:
+            urls: URLs to group
+
+        Returns:
+            Mapping of template URL to its URLs, in first-seen order
+        """
+        for url in urls:
+            self._observe_url(url)
+
+        groups = {}
+        for url in urls:
+            groups.setdefault(self.get_url_template(url), []).append(url)
+        return groups
+
     def _clean_url(self, url: str) -> str:
         """
         Clean URL by removing query parameters and fragments.
@@ -90,92 +488,123 @@ class CodeCache:
             clean_url = clean_url[:-1]
         return clean_url
 
-    def _compute_structural_hash(self, html_content: str) -> str:
+    def _structural_html(self, html_content: str) -> str:
         """
-        Compute structural hash by replacing all text content with
-        placeholders.
-        This creates a hash based on HTML structure rather than content.
+        Reduce HTML to its structure by replacing all text content and
+        dynamic attribute values with placeholders.
 
         Args:
             html_content: Raw HTML content
 
         Returns:
-            SHA256 hash of structural HTML
+            Normalized structural HTML
         """
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
+        soup = BeautifulSoup(html_content, "html.parser")
+
+        # Remove script and style elements completely
+        for element in soup(
+            ["script", "style", "meta", "link", "noscript"]
+        ):
+            element.decompose()
+
+        # Replace all text content with a placeholder
+        def replace_text_content(element):
+            if element.string:
+                # Replace text with placeholder based on length
+                text_length = len(element.string.strip())
+                if text_length > 0:
+                    element.string.replace_with("TEXT_PLACEHOLDER")
+
+            # Handle attributes that might contain dynamic content
+            if hasattr(element, "attrs"):
+                attrs_to_clean = [
+                    "href",
+                    "src",
+                    "action",
+                    "data-",
+                    "id",
+                    "title",
+                    "alt",
+                ]
+                for attr in list(element.attrs.keys()):
+                    # Clean dynamic attributes but preserve structural
+                    # ones like class
+                    if any(
+                        attr.startswith(pattern)
+                        for pattern in attrs_to_clean
+                    ):
+                        if attr in ["href", "src", "action"]:
+                            element.attrs[attr] = "URL_PLACEHOLDER"
+                        elif attr.startswith("data-"):
+                            element.attrs[attr] = "DATA_PLACEHOLDER"
+                        elif attr in ["id", "title", "alt"]:
+                            element.attrs[attr] = "TEXT_PLACEHOLDER"
+
+        # Recursively process all elements
+        for element in soup.find_all(text=True):
+            if element.parent:
+                text_content = element.strip()
+                if text_content and element.parent.name not in [
+                    "script",
+                    "style",
+                ]:
+                    element.replace_with("TEXT_PLACEHOLDER")
+
+        # Also clean attributes in all elements
+        for element in soup.find_all():
+            replace_text_content(element)
+
+        # Get the structural HTML as string
+        structural_html = str(soup)
+
+        # Remove extra whitespace and normalize
+        structural_html = re.sub(r"\s+", " ", structural_html)
+        return structural_html.strip()
+
+    def _compute_fingerprints(
+        self, html_content: str
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Compute the exact structural hash and the SimHash fingerprint of a
+        page from a single structural pass.
 
-            # Remove script and style elements completely
-            for element in soup(
-                ["script", "style", "meta", "link", "noscript"]
-            ):
-                element.decompose()
-
-            # Replace all text content with a placeholder
-            def replace_text_content(element):
-                if element.string:
-                    # Replace text with placeholder based on length
-                    text_length = len(element.string.strip())
-                    if text_length > 0:
-                        element.string.replace_with("TEXT_PLACEHOLDER")
-
-                # Handle attributes that might contain dynamic content
-                if hasattr(element, "attrs"):
-                    attrs_to_clean = [
-                        "href",
-                        "src",
-                        "action",
-                        "data-",
-                        "id",
-                        "title",
-                        "alt",
-                    ]
-                    for attr in list(element.attrs.keys()):
-                        # Clean dynamic attributes but preserve structural
-                        # ones like class
-                        if any(
-                            attr.startswith(pattern)
-                            for pattern in attrs_to_clean
-                        ):
-                            if attr in ["href", "src", "action"]:
-                                element.attrs[attr] = "URL_PLACEHOLDER"
-                            elif attr.startswith("data-"):
-                                element.attrs[attr] = "DATA_PLACEHOLDER"
-                            elif attr in ["id", "title", "alt"]:
-                                element.attrs[attr] = "TEXT_PLACEHOLDER"
-
-            # Recursively process all elements
-            for element in soup.find_all(text=True):
-                if element.parent:
-                    text_content = element.strip()
-                    if text_content and element.parent.name not in [
-                        "script",
-                        "style",
-                    ]:
-                        element.replace_with("TEXT_PLACEHOLDER")
-
-            # Also clean attributes in all elements
-            for element in soup.find_all():
-                replace_text_content(element)
-
-            # Get the structural HTML as string
-            structural_html = str(soup)
-
-            # Remove extra whitespace and normalize
-            structural_html = re.sub(r"\s+", " ", structural_html)
-            structural_html = structural_html.strip()
+        Args:
+            html_content: Raw HTML content
+
+        Returns:
+            Tuple of (SHA256 structural hash, hex SimHash or None)
+        """
+        try:
+            structural_html = self._structural_html(html_content)
 
             # Compute SHA256 hash
             hash_object = hashlib.sha256(structural_html.encode("utf-8"))
             structural_hash = hash_object.hexdigest()
 
             self.logger.debug(f"Computed structural hash: {structural_hash}")
-            return structural_hash
+            return structural_hash, structural_simhash(structural_html)
 
         except Exception as e:
             self.logger.error(f"Error computing structural hash: {str(e)}")
             # Fallback to content-based hash
-            return hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+            return (
+                hashlib.sha256(html_content.encode("utf-8")).hexdigest(),
+                None,
+            )
+
+    def _compute_structural_hash(self, html_content: str) -> str:
+        """
+        Compute structural hash by replacing all text content with
+        placeholders.
+        This creates a hash based on HTML structure rather than content.
+
+        Args:
+            html_content: Raw HTML content
+
+        Returns:
+            SHA256 hash of structural HTML
+        """
+        return self._compute_fingerprints(html_content)[0]
 
     def _compute_fields_hash(self, fields: list) -> str:
         """
@@ -187,8 +616,13 @@ class CodeCache:
         Returns:
             SHA256 hash of fields configuration
         """
-        fields_str = json.dumps(sorted(fields), ensure_ascii=False)
-        return hashlib.sha256(fields_str.encode("utf-8")).hexdigest()
+        return hashlib.sha256(
+            self._fields_json(fields).encode("utf-8")
+        ).hexdigest()
+
+    def _fields_json(self, fields: list) -> str:
+        """Canonical JSON form of a field set (stored with each entry)"""
+        return json.dumps(sorted(fields), ensure_ascii=False)
 
     def _save_code_to_file(
         self, code: str, url_clean: str, structural_hash: str
@@ -229,147 +663,1124 @@ class CodeCache:
             self.logger.error(f"Error saving code to file: {str(e)}")
             return None
 
-    def get_cached_code(
-        self, url: str, html_content: str, fields: list
+    def _archive_html(
+        self, html_content: str, url_clean: str, structural_hash: str
     ) -> Optional[str]:
         """
-        Retrieve cached extraction code if available.
+        Keep a compressed copy of the HTML an entry was generated from.
+
+        Returns:
+            Path to the archived file, or None if it could not be written
+        """
+        try:
+            domain = urlparse(url_clean).netloc.replace("www.", "")
+            filename = (
+                f"{domain.replace('.', '_')}_{structural_hash[:16]}.html.gz"
+            )
+            filepath = os.path.join(self.html_archive_dir, filename)
+            with gzip.open(filepath, "wt", encoding="utf-8") as f:
+                f.write(html_content)
+            return filepath
+
+        except Exception as e:
+            self.logger.error(f"Error archiving HTML: {str(e)}")
+            return None
+
+    def compile_code(self, code: str) -> Optional[CodeType]:
+        """
+        Compile extraction code, reusing marshalled bytecode persisted by
+        an earlier process running the same interpreter version.
 
         Args:
-            url: Original URL
-            html_content: HTML content for structural hash computation
-            fields: List of field names
+            code: Extraction code
 
         Returns:
-            Cached extraction code or None if not found
+            Compiled code object, or None if the code does not compile
         """
-        try:
-            url_clean = self._clean_url(url)
-            structural_hash = self._compute_structural_hash(html_content)
-            fields_hash = self._compute_fields_hash(fields)
+        code_hash = compute_code_hash(code)
+        cache_tag = sys.implementation.cache_tag
 
+        try:
             with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-
-                # Look for cached code
-                cursor.execute(
+                row = conn.execute(
                     """
-                    SELECT extraction_code, code_file_path,
-                           use_count
-                    FROM extraction_cache
-                    WHERE url_clean = ? AND structural_hash = ?
-                          AND fields_hash = ?
+                    SELECT bytecode FROM compiled_code
+                    WHERE code_hash = ? AND cache_tag = ?
                 """,
-                    (url_clean, structural_hash, fields_hash),
-                )
+                    (code_hash, cache_tag),
+                ).fetchone()
+            if row:
+                return marshal.loads(row[0])
+        except Exception as e:
+            self.logger.debug(f"Could not load cached bytecode: {str(e)}")
 
-                result = cursor.fetchone()
+        try:
+            compiled = compile(code, "<extraction_code>", "exec")
+        except (SyntaxError, ValueError) as e:
+            self.logger.debug(f"Cached code does not compile: {str(e)}")
+            return None
 
-                if result:
-                    extraction_code, code_file_path, use_count = result
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO compiled_code
+                    (code_hash, cache_tag, bytecode)
+                    VALUES (?, ?, ?)
+                """,
+                    (code_hash, cache_tag, marshal.dumps(compiled)),
+                )
+                conn.commit()
+        except Exception as e:
+            self.logger.debug(f"Could not persist bytecode: {str(e)}")
+
+        return compiled
+
+    def _remember(
+        self, key: tuple, code: str, source_key: Optional[tuple] = None
+    ) -> CachedCode:
+        """Put code (and its compiled form) into the in-memory tier"""
+        entry = CachedCode(
+            code=code,
+            compiled=self.compile_code(code),
+            key=source_key or key,
+        )
+        self.memory_cache.put(key, entry, len(code.encode("utf-8")))
+        return entry
+
+    def _record_usage(self, key: tuple) -> None:
+        """Buffer one hit and hand a due flush to a background thread"""
+        if self.usage_buffer.record(key) and not self._flush_lock.locked():
+            threading.Thread(
+                target=self.flush_usage_stats,
+                name="code-cache-usage-flush",
+                daemon=True,
+            ).start()
+
+    def flush_usage_stats(self) -> int:
+        """
+        Write buffered usage statistics to SQLite in a single transaction.
 
-                    # Update usage statistics
-                    cursor.execute(
+        Returns:
+            Number of cache entries updated
+        """
+        with self._flush_lock:
+            rows = self.usage_buffer.drain()
+            if not rows:
+                return 0
+
+            try:
+                with sqlite3.connect(self.db_path) as conn:
+                    conn.executemany(
                         """
                         UPDATE extraction_cache
-                        SET last_used_at = CURRENT_TIMESTAMP,
-                            use_count = use_count + 1
+                        SET use_count = use_count + ?,
+                            last_used_at = MAX(last_used_at, ?)
                         WHERE url_clean = ? AND structural_hash = ?
                               AND fields_hash = ?
                     """,
-                        (url_clean, structural_hash, fields_hash),
+                        rows,
                     )
-
                     conn.commit()
 
-                    self.logger.info(
-                        f"Cache HIT for {url_clean} "
-                        f"(used {use_count + 1} times)"
-                    )
-                    return extraction_code
-                else:
-                    self.logger.info(f"Cache MISS for {url_clean}")
-                    return None
+                self.logger.debug(
+                    f"Flushed usage statistics for {len(rows)} entries"
+                )
+                return len(rows)
+
+            except Exception as e:
+                self.usage_buffer.restore(rows)
+                self.logger.error(f"Error flushing usage stats: {str(e)}")
+                return 0
+
+    @staticmethod
+    def _make_atexit_hook(cache_ref):
+        def flush_at_exit():
+            cache = cache_ref()
+            if cache is not None:
+                cache.flush_usage_stats()
+
+        return flush_at_exit
+
+    def close(self) -> None:
+        """Flush pending usage statistics; call before discarding the cache"""
+        self.stop_maintenance()
+        self.flush_usage_stats()
+        if self.backend:
+            self.backend.close()
+        atexit.unregister(self._atexit_hook)
+
+    def _find_entry(self, url: str, key: tuple):
+        """
+        Look up code for a key, widening from the exact URL to its
+        template and then its domain.
 
-        except Exception as e:
-            self.logger.error(f"Error retrieving cached code: {str(e)}")
-            return None
+        Returns:
+            Tuple of ((code, source_key) or None, level name)
+        """
+        url_clean, structural_hash, fields_hash = key
+        lookups = [
+            ("exact", "url_clean", url_clean),
+            ("template", "url_template", self.get_url_template(url)),
+            ("domain", "domain", self._domain(url)),
+        ]
+
+        versions, version_params = self._version_filter()
+        with sqlite3.connect(self.db_path) as conn:
+            for level, column, value in lookups:
+                row = conn.execute(
+                    f"""
+                    SELECT extraction_code, url_clean
+                    FROM extraction_cache
+                    WHERE {column} = ? AND structural_hash = ?
+                          AND fields_hash = ?{versions}
+                    ORDER BY use_count DESC
+                    LIMIT 1
+                """,
+                    (value, structural_hash, fields_hash) + version_params,
+                ).fetchone()
+                if row:
+                    code, row_url = row
+                    return (code, (row_url, structural_hash, fields_hash)), level
 
-    def store_code(
-        self, url: str, html_content: str, fields: list, extraction_code: str
-    ) -> bool:
+        return None, "exact"
+
+    def _upsert_entry(self, conn, entry: Dict[str, Any]) -> None:
         """
-        Store extraction code in cache.
+        Insert or replace a row from an entry keyed by BUNDLE_COLUMNS that
+        comes from another node (shared backend or bundle).
+
+        Generation spend and hits belong to the node that made them, so the
+        row starts unmetered and with a single use here.
+        """
+        entry = dict(
+            entry,
+            use_count=1,
+            prompt_tokens=None,
+            completion_tokens=None,
+            llm_cost=None,
+        )
+        code_file_path = self._save_code_to_file(
+            entry["extraction_code"],
+            entry["url_clean"],
+            entry["structural_hash"],
+        )
+        placeholders = ", ".join("?" for _ in BUNDLE_COLUMNS)
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO extraction_cache
+            ({', '.join(BUNDLE_COLUMNS)}, code_file_path)
+            VALUES ({placeholders}, ?)
+        """,
+            [
+                entry.get(column, LEGACY_VERSIONS.get(column))
+                for column in BUNDLE_COLUMNS
+            ]
+            + [code_file_path],
+        )
+
+    def _fetch_remote(self, key: tuple, template_key: tuple):
+        """
+        Read a local miss through to the shared backend, trying the exact
+        key and then the URL template, and keep the entry locally.
+
+        Returns:
+            (code, source_key) or None
+        """
+        lookups = [key] if template_key == key else [key, template_key]
+        for lookup_key in lookups:
+            entry = self.backend.get(lookup_key)
+            if not entry or not self._versions_match(entry):
+                continue
+
+            source_key = (
+                entry["url_clean"],
+                entry["structural_hash"],
+                entry["fields_hash"],
+            )
+            with sqlite3.connect(self.db_path) as conn:
+                self._upsert_entry(conn, entry)
+                conn.commit()
+            return entry["extraction_code"], source_key
+
+        return None
+
+    def _publish(self, key: tuple, url_template: str) -> bool:
+        """
+        Write a stored row through to the shared backend under its exact
+        key and, for path families, its URL template key.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                f"""
+                SELECT {', '.join(BUNDLE_COLUMNS)} FROM extraction_cache
+                WHERE url_clean = ? AND structural_hash = ?
+                      AND fields_hash = ?
+            """,
+                key,
+            ).fetchone()
+
+        if row is None:
+            return False
+
+        entry = dict(row)
+        published = self.backend.put(key, entry)
+        if published and url_template != key[0]:
+            published = self.backend.put((url_template,) + key[1:], entry)
+        return published
+
+    def get_cached_entry(
+        self, url: str, html_content: str, fields: list
+    ) -> Optional[CachedCode]:
+        """
+        Retrieve cached extraction code together with its compiled form.
+
+        The in-memory LRU tier is consulted first; SQLite is only queried
+        on a memory miss, falling back from the exact path to the URL
+        template to the domain (always for the same structural hash and
+        fields), then to the shared backend if one is configured, and the
+        result is promoted into memory.
 
         Args:
             url: Original URL
             html_content: HTML content for structural hash computation
             fields: List of field names
-            extraction_code: Generated extraction code
 
         Returns:
-            True if stored successfully, False otherwise
+            CachedCode entry or None if not found
         """
         try:
             url_clean = self._clean_url(url)
             structural_hash = self._compute_structural_hash(html_content)
             fields_hash = self._compute_fields_hash(fields)
+            key = (url_clean, structural_hash, fields_hash)
 
-            # Save code to file
-            code_file_path = self._save_code_to_file(
-                extraction_code, url_clean, structural_hash
+            self._observe_url(url)
+            # Path-family hits are held in memory under the template key so
+            # a large crawl does not fill the tier with one entry per page
+            template_key = (
+                self.get_url_template(url), structural_hash, fields_hash
+            )
+            entry = self.memory_cache.get(
+                key if key in self.memory_cache else template_key
             )
 
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            if entry is None:
+                result, level = self._find_entry(url, key)
+                if not result and self._migrate_domain(url):
+                    result, level = self._find_entry(url, key)
+                if not result and self.backend:
+                    result = self._fetch_remote(key, template_key)
+                    level = "remote"
 
-                # Insert or replace the cached code
-                cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO extraction_cache
-                    (url_clean, structural_hash, fields_hash,
-                     extraction_code, code_file_path)
-                    VALUES (?, ?, ?, ?, ?)
-                """,
-                    (
-                        url_clean,
-                        structural_hash,
-                        fields_hash,
-                        extraction_code,
-                        code_file_path,
-                    ),
+                if not result:
+                    self.logger.info(f"Cache MISS for {url_clean}")
+                    return None
+
+                code, source_key = result
+                entry = self._remember(
+                    key if level in ("exact", "remote") else template_key,
+                    code,
+                    source_key,
                 )
+                self.lookup_levels[level] += 1
+                source = f"disk, {level}"
+            else:
+                source = "memory"
 
-                conn.commit()
+            # Usage statistics are written behind, never on the hit path
+            self._record_usage(entry.key or key)
 
-                self.logger.info(
-                    f"Code cached for {url_clean} "
-                    f"(hash: {structural_hash[:16]}...)"
-                )
-                return True
+            self.logger.info(f"Cache HIT ({source}) for {url_clean}")
+            return entry
 
         except Exception as e:
-            self.logger.error(f"Error storing code in cache: {str(e)}")
-            return False
+            self.logger.error(f"Error retrieving cached code: {str(e)}")
+            return None
 
-    def clear_cache(self) -> bool:
+    def get_cached_code(
+        self, url: str, html_content: str, fields: list
+    ) -> Optional[str]:
         """
-        Clear all cached codes.
+        Retrieve cached extraction code if available.
+
+        Args:
+            url: Original URL
+            html_content: HTML content for structural hash computation
+            fields: List of field names
 
         Returns:
-            True if cleared successfully, False otherwise
+            Cached extraction code or None if not found
         """
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+        entry = self.get_cached_entry(url, html_content, fields)
+        return entry.code if entry else None
+
+    def find_similar_entry(
+        self,
+        url: str,
+        html_content: str,
+        fields: list,
+        max_distance: Optional[int] = None,
+    ) -> Optional[NearMatch]:
+        """
+        Find the structurally closest cached entry on the same domain for
+        the same fields, for use when the exact structural hash misses.
+
+        The match is only a candidate: callers should validate the code
+        against the new page before relying on it.
+
+        Args:
+            url: Original URL
+            html_content: HTML content for fingerprint computation
+            fields: List of field names
+            max_distance: Maximum SimHash Hamming distance; defaults to
+                          near_match_max_distance
+
+        Returns:
+            Closest NearMatch within the distance, or None
+        """
+        if max_distance is None:
+            max_distance = self.near_match_max_distance
+
+        try:
+            structural_hash, simhash = self._compute_fingerprints(
+                html_content
+            )
+            if simhash is None:
+                return None
+
+            versions, version_params = self._version_filter()
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT extraction_code, url_clean, structural_hash,
+                           simhash, model_name
+                    FROM extraction_cache
+                    WHERE domain = ? AND fields_hash = ?
+                          AND simhash IS NOT NULL{versions}
+                """,
+                    (self._domain(url), self._compute_fields_hash(fields))
+                    + version_params,
+                ).fetchall()
+
+            best = None
+            for row in rows:
+                code, url_clean, candidate_hash, candidate_simhash, model = row
+                distance = hamming_distance(simhash, candidate_simhash)
+                if distance > max_distance:
+                    continue
+                if best is None or distance < best.distance:
+                    best = NearMatch(
+                        code, url_clean, candidate_hash, distance, model
+                    )
+
+            if best:
+                self.near_match_hits += 1
+                self.logger.info(
+                    f"Near-duplicate structure found for {url} "
+                    f"(distance {best.distance}, from {best.url_clean})"
+                )
+            else:
+                self.near_match_misses += 1
+            return best
+
+        except Exception as e:
+            self.logger.error(f"Error finding similar entry: {str(e)}")
+            return None
+
+    def find_superset_entry(
+        self, url: str, html_content: str, fields: list
+    ) -> Optional[SupersetMatch]:
+        """
+        Find cached code for the same structure whose field set is a
+        strict superset of the requested fields, so a narrower request can
+        reuse it by projecting records down.
+
+        Lookups widen from the exact URL to its template and domain; within
+        a level the entry with the fewest extra fields wins.
+
+        Args:
+            url: Original URL
+            html_content: HTML content for structural hash computation
+            fields: Requested field names
+
+        Returns:
+            SupersetMatch or None
+        """
+        requested = set(fields)
+        try:
+            structural_hash = self._compute_structural_hash(html_content)
+            lookups = [
+                ("url_clean", self._clean_url(url)),
+                ("url_template", self.get_url_template(url)),
+                ("domain", self._domain(url)),
+            ]
+
+            versions, version_params = self._version_filter()
+            with sqlite3.connect(self.db_path) as conn:
+                for column, value in lookups:
+                    rows = conn.execute(
+                        f"""
+                        SELECT extraction_code, url_clean, fields_json,
+                               model_name
+                        FROM extraction_cache
+                        WHERE {column} = ? AND structural_hash = ?
+                              AND fields_json IS NOT NULL{versions}
+                        ORDER BY use_count DESC
+                    """,
+                        (value, structural_hash) + version_params,
+                    ).fetchall()
+
+                    best = None
+                    for code, row_url, fields_json, model in rows:
+                        cached_fields = json.loads(fields_json)
+                        if not requested < set(cached_fields):
+                            continue
+                        if best is None or len(cached_fields) < len(
+                            best.fields
+                        ):
+                            best = SupersetMatch(
+                                code, row_url, cached_fields, model
+                            )
+                    if best:
+                        self.logger.info(
+                            f"Found superset extractor for {url} "
+                            f"(fields {best.fields})"
+                        )
+                        return best
+
+        except Exception as e:
+            self.logger.error(f"Error finding superset entry: {str(e)}")
+
+        return None
+
+    def get_trial_candidates(
+        self, url: str, html_content: str, fields: list, limit: int = 3
+    ) -> list:
+        """
+        Collect previously cached code that may still work on a page whose
+        structural hash missed: the most recent code for the same URL,
+        then for the same URL template, then the closest near-duplicate
+        structure on the domain.
+
+        Args:
+            url: Original URL
+            html_content: HTML content of the new page
+            fields: List of field names
+            limit: Maximum number of candidates
+
+        Returns:
+            List of TrialCandidate, most promising first
+        """
+        candidates = []
+        seen_codes = set()
+
+        def add(candidate):
+            if candidate.code not in seen_codes and len(candidates) < limit:
+                seen_codes.add(candidate.code)
+                candidates.append(candidate)
+
+        try:
+            fields_hash = self._compute_fields_hash(fields)
+            lookups = [
+                ("url", "url_clean", self._clean_url(url)),
+                ("template", "url_template", self.get_url_template(url)),
+            ]
+
+            versions, version_params = self._version_filter()
+            with sqlite3.connect(self.db_path) as conn:
+                for source, column, value in lookups:
+                    row = conn.execute(
+                        f"""
+                        SELECT extraction_code, url_clean, structural_hash,
+                               record_count, model_name
+                        FROM extraction_cache
+                        WHERE {column} = ? AND fields_hash = ?{versions}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT 1
+                    """,
+                        (value, fields_hash) + version_params,
+                    ).fetchone()
+                    if row:
+                        code, row_url, row_hash, record_count, model = row
+                        add(
+                            TrialCandidate(
+                                code,
+                                row_url,
+                                row_hash,
+                                source,
+                                record_count,
+                                model,
+                            )
+                        )
+
+        except Exception as e:
+            self.logger.error(f"Error collecting trial candidates: {str(e)}")
+
+        near_match = self.find_similar_entry(url, html_content, fields)
+        if near_match:
+            add(
+                TrialCandidate(
+                    near_match.code,
+                    near_match.url_clean,
+                    near_match.structural_hash,
+                    "near_match",
+                    model_name=near_match.model_name,
+                )
+            )
+
+        return candidates
+
+    def store_code(
+        self,
+        url: str,
+        html_content: str,
+        fields: list,
+        extraction_code: str,
+        record_count: Optional[int] = None,
+        fill_rate: Optional[float] = None,
+        usage: Optional[TokenUsage] = None,
+        model_name: Optional[str] = None,
+    ) -> bool:
+        """
+        Store extraction code in cache.
+
+        Args:
+            url: Original URL
+            html_content: HTML content for structural hash computation
+            fields: List of field names
+            extraction_code: Generated extraction code
+            record_count: Records the code returned when it was validated
+            fill_rate: Field fill rate observed when it was validated
+            usage: LLM tokens and cost spent generating the code; every
+                   later hit on the entry avoids spending them again. None
+                   (trial or projected code) leaves the entry unmetered
+            model_name: Model that generated the code (e.g. the tier or
+                        fallback that answered, or the source entry's model
+                        for reused code); defaults to the model set with
+                        set_versions()
+
+        Returns:
+            True if stored successfully, False otherwise
+        """
+        try:
+            url_clean = self._clean_url(url)
+            structural_hash, simhash = self._compute_fingerprints(
+                html_content
+            )
+            fields_hash = self._compute_fields_hash(fields)
+            self._observe_url(url)
+
+            # Save code to file, and the HTML it was generated from so the
+            # entry can be re-fingerprinted if the hash scheme changes
+            code_file_path = self._save_code_to_file(
+                extraction_code, url_clean, structural_hash
+            )
+            html_path = self._archive_html(
+                html_content, url_clean, structural_hash
+            )
+
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+
+                # Insert or replace the cached code
+                cursor.execute(
+                    """
+                    INSERT OR REPLACE INTO extraction_cache
+                    (url_clean, structural_hash, fields_hash,
+                     extraction_code, code_file_path, domain, simhash,
+                     url_template, record_count, fill_rate, fields_json,
+                     model_name, prompt_version, cleaner_version,
+                     hash_version, html_path, prompt_tokens,
+                     completion_tokens, llm_cost)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                            ?, ?, ?)
+                """,
+                    (
+                        url_clean,
+                        structural_hash,
+                        fields_hash,
+                        extraction_code,
+                        code_file_path,
+                        self._domain(url),
+                        simhash,
+                        self.get_url_template(url),
+                        record_count,
+                        fill_rate,
+                        self._fields_json(fields),
+                        model_name or self.versions["model_name"],
+                        self.versions["prompt_version"],
+                        self.versions["cleaner_version"],
+                        self.STRUCTURAL_HASH_VERSION,
+                        html_path,
+                        usage.prompt_tokens if usage else None,
+                        usage.completion_tokens if usage else None,
+                        usage.cost if usage else None,
+                    ),
+                )
+
+                conn.commit()
+
+            # Replace whatever the memory tier held for this row
+            key = (url_clean, structural_hash, fields_hash)
+            self.memory_cache.invalidate_where(
+                lambda _, entry: entry.key == key
+            )
+            self._remember(key, extraction_code)
+
+            # Write through so other nodes can serve this entry immediately
+            if self.backend:
+                self._publish(key, self.get_url_template(url))
+
+            self.logger.info(
+                f"Code cached for {url_clean} "
+                f"(hash: {structural_hash[:16]}...)"
+            )
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error storing code in cache: {str(e)}")
+            return False
+
+    def _load_pending_migrations(self):
+        """Find domains with entries fingerprinted by an older hash scheme"""
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                """
+                SELECT DISTINCT domain FROM extraction_cache
+                WHERE hash_version < ? AND html_path IS NOT NULL
+            """,
+                (self.STRUCTURAL_HASH_VERSION,),
+            ).fetchall()
+        self._pending_migrations = {row[0] for row in rows}
+
+    def _migrate_domain(self, url: str) -> bool:
+        """
+        Lazily migrate a domain's outdated fingerprints the first time a
+        lookup for it misses.
+
+        Returns:
+            True if any entry was migrated
+        """
+        domain = self._domain(url)
+        if domain not in self._pending_migrations:
+            return False
+        self._pending_migrations.discard(domain)
+        return self.migrate_hash_scheme(domain) > 0
+
+    def migrate_hash_scheme(
+        self, domain: Optional[str] = None, limit: Optional[int] = None
+    ) -> int:
+        """
+        Recompute the fingerprints of entries created with an older
+        structural hash scheme from their archived HTML, keeping their
+        code instead of discarding it.
+
+        Args:
+            domain: Only migrate entries of this domain
+            limit: Maximum number of entries to migrate
+
+        Returns:
+            Number of entries migrated
+        """
+        migrated = 0
+        try:
+            where = "hash_version < ? AND html_path IS NOT NULL"
+            params = [self.STRUCTURAL_HASH_VERSION]
+            if domain:
+                where += " AND domain = ?"
+                params.append(domain)
+            if limit:
+                where += " LIMIT ?"
+                params.append(limit)
+
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT id, html_path, url_clean, structural_hash,
+                           fields_hash
+                    FROM extraction_cache
+                    WHERE {where}
+                """,
+                    params,
+                ).fetchall()
+
+                old_keys = set()
+                for row_id, html_path, *key in rows:
+                    try:
+                        with gzip.open(html_path, "rt", encoding="utf-8") as f:
+                            html_content = f.read()
+                    except OSError:
+                        # Archive lost: the entry ages out through eviction
+                        conn.execute(
+                            "UPDATE extraction_cache SET html_path = NULL "
+                            "WHERE id = ?",
+                            (row_id,),
+                        )
+                        continue
+
+                    structural_hash, simhash = self._compute_fingerprints(
+                        html_content
+                    )
+                    conn.execute(
+                        """
+                        UPDATE OR REPLACE extraction_cache
+                        SET structural_hash = ?, simhash = ?,
+                            hash_version = ?
+                        WHERE id = ?
+                    """,
+                        (
+                            structural_hash,
+                            simhash,
+                            self.STRUCTURAL_HASH_VERSION,
+                            row_id,
+                        ),
+                    )
+                    old_keys.add(tuple(key))
+                    migrated += 1
+                conn.commit()
+
+            self.memory_cache.invalidate_where(
+                lambda _, entry: entry.key in old_keys
+            )
+            if migrated:
+                self.logger.info(
+                    f"Migrated fingerprints of {migrated} cache entries to "
+                    f"hash scheme v{self.STRUCTURAL_HASH_VERSION}"
+                )
+            return migrated
+
+        except Exception as e:
+            self.logger.error(f"Error migrating hash scheme: {str(e)}")
+            return migrated
+
+    def invalidate_versions(
+        self,
+        model_name: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        cleaner_version: Optional[str] = None,
+        domain: Optional[str] = None,
+    ) -> int:
+        """
+        Remove the entries produced by a given model, prompt version and/or
+        cleaner version, leaving the rest of the cache intact.
+
+        Args:
+            model_name: Remove entries generated by this model
+            prompt_version: Remove entries generated with this prompt
+            cleaner_version: Remove entries fingerprinted after cleaning
+                             with this cleaner version
+            domain: Limit the invalidation to one domain
+
+        Returns:
+            Number of entries removed
+
+        Raises:
+            ValueError: If no criterion is given (use clear_cache())
+        """
+        criteria = {
+            "model_name": model_name,
+            "prompt_version": prompt_version,
+            "cleaner_version": cleaner_version,
+            "domain": domain.lower() if domain else None,
+        }
+        criteria = {k: v for k, v in criteria.items() if v is not None}
+        if not criteria.keys() - {"domain"}:
+            raise ValueError(
+                "Specify a model, prompt or cleaner version to invalidate"
+            )
+
+        try:
+            where = " AND ".join(f"{column} = ?" for column in criteria)
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT id, url_clean, structural_hash, fields_hash
+                    FROM extraction_cache
+                    WHERE {where}
+                """,
+                    tuple(criteria.values()),
+                ).fetchall()
+
+            if rows:
+                self._delete_rows(rows)
+            self.logger.info(
+                f"Invalidated {len(rows)} cache entries matching {criteria}"
+            )
+            return len(rows)
+
+        except Exception as e:
+            self.logger.error(f"Error invalidating cache entries: {str(e)}")
+            return 0
+
+    def generation_key(
+        self, url: str, html_content: str, fields: list
+    ) -> tuple:
+        """
+        Key under which code generations for a page are coordinated: pages
+        of one path family with the same structure and fields share it.
+
+        Returns:
+            Tuple of (url template or clean URL, structural hash,
+            fields hash)
+        """
+        return (
+            self.get_url_template(url),
+            self._compute_structural_hash(html_content),
+            self._compute_fields_hash(fields),
+        )
+
+    def acquire_generation_lease(
+        self, key: tuple, owner: str, ttl: float = 120.0
+    ) -> bool:
+        """
+        Take the lease for generating code for key, so other processes
+        sharing this database wait instead of generating the same code.
+
+        The lease is granted if nobody holds it, its holder's lease has
+        expired, or owner already holds it.
+
+        Args:
+            key: Key from generation_key()
+            owner: Identifier of the caller (process and thread)
+            ttl: Seconds after which an unreleased lease expires
+
+        Returns:
+            True if owner now holds the lease
+        """
+        try:
+            now = time.time()
+            with sqlite3.connect(self.db_path, timeout=ttl) as conn:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO generation_leases
+                    (lease_key, owner, expires_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(lease_key) DO UPDATE
+                    SET owner = excluded.owner,
+                        expires_at = excluded.expires_at
+                    WHERE generation_leases.expires_at < ?
+                          OR generation_leases.owner = excluded.owner
+                """,
+                    (entry_id(key), owner, now + ttl, now),
+                )
+                conn.commit()
+                return cursor.rowcount == 1
+
+        except Exception as e:
+            # Without the lease table coordination, generate anyway
+            self.logger.error(f"Error acquiring generation lease: {str(e)}")
+            return True
+
+    def release_generation_lease(self, key: tuple, owner: str) -> None:
+        """Release a lease taken with acquire_generation_lease()"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    """
+                    DELETE FROM generation_leases
+                    WHERE lease_key = ? AND owner = ?
+                """,
+                    (entry_id(key), owner),
+                )
+                conn.commit()
+
+        except Exception as e:
+            self.logger.error(f"Error releasing generation lease: {str(e)}")
+
+    def record_failure(self, key: tuple, reason: str) -> FailureRecord:
+        """
+        Record a failed generation for key and schedule its next attempt
+        with exponential backoff.
+
+        Args:
+            key: Key from generation_key()
+            reason: Short description of the failure
+
+        Returns:
+            The updated FailureRecord
+        """
+        reason = reason[:500]
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    "SELECT attempts FROM generation_failures "
+                    "WHERE failure_key = ?",
+                    (entry_id(key),),
+                ).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                now = time.time()
+                retry_at = now + self.backoff_policy.delay(attempts)
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO generation_failures
+                    (failure_key, url_key, reason, attempts, last_failed_at,
+                     retry_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                    (entry_id(key), key[0], reason, attempts, now, retry_at),
+                )
+                conn.commit()
+
+            self.logger.warning(
+                f"Generation failed for {key[0]} (attempt {attempts}): "
+                f"{reason}"
+            )
+            return FailureRecord(reason, attempts, retry_at)
+
+        except Exception as e:
+            self.logger.error(f"Error recording generation failure: {str(e)}")
+            return FailureRecord(reason, 1, time.time())
+
+    def get_recent_failure(self, key: tuple) -> Optional[FailureRecord]:
+        """
+        Return the failure recorded for key if it is still backing off.
+
+        Args:
+            key: Key from generation_key()
+
+        Returns:
+            FailureRecord, or None if generation may be attempted
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    """
+                    SELECT reason, attempts, retry_at
+                    FROM generation_failures
+                    WHERE failure_key = ? AND retry_at > ?
+                """,
+                    (entry_id(key), time.time()),
+                ).fetchone()
+            return FailureRecord(*row) if row else None
+
+        except Exception as e:
+            self.logger.error(f"Error reading generation failures: {str(e)}")
+            return None
+
+    def clear_failure(self, key: tuple) -> None:
+        """Forget failures of key after a successful generation"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "DELETE FROM generation_failures WHERE failure_key = ?",
+                    (entry_id(key),),
+                )
+                conn.commit()
+
+        except Exception as e:
+            self.logger.error(f"Error clearing generation failure: {str(e)}")
+
+    def get_model_tier(self, url: str, tiers: list) -> Optional[int]:
+        """
+        Return the tier that last produced valid code for url's domain.
+
+        Args:
+            url: Page URL
+            tiers: Model names of the tier list, cheapest first
+
+        Returns:
+            Index into tiers, or None if nothing was recorded
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    "SELECT tier FROM model_tiers "
+                    "WHERE domain = ? AND tiers = ?",
+                    (self._domain(url), json.dumps(list(tiers))),
+                ).fetchone()
+            return row[0] if row else None
+
+        except Exception as e:
+            self.logger.error(f"Error reading model tier: {str(e)}")
+            return None
+
+    def record_model_tier(self, url: str, tiers: list, tier: int) -> None:
+        """Remember the tier that produced valid code for url's domain"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO model_tiers
+                    (domain, tiers, tier, updated_at)
+                    VALUES (?, ?, ?, ?)
+                """,
+                    (
+                        self._domain(url),
+                        json.dumps(list(tiers)),
+                        tier,
+                        time.time(),
+                    ),
+                )
+                conn.commit()
+
+        except Exception as e:
+            self.logger.error(f"Error recording model tier: {str(e)}")
+
+    def remove_code(self, url: str, html_content: str, fields: list) -> bool:
+        """
+        Remove the entry stored for a page, e.g. code that turned out not
+        to work.
+
+        Returns:
+            True if an entry was removed
+        """
+        try:
+            key = (
+                self._clean_url(url),
+                self._compute_structural_hash(html_content),
+                self._compute_fields_hash(fields),
+            )
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    """
+                    DELETE FROM extraction_cache
+                    WHERE url_clean = ? AND structural_hash = ?
+                          AND fields_hash = ?
+                """,
+                    key,
+                )
+                conn.commit()
+
+            self.memory_cache.invalidate_where(
+                lambda _, entry: entry.key == key
+            )
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            self.logger.error(f"Error removing cached code: {str(e)}")
+            return False
+
+    def clear_cache(self) -> bool:
+        """
+        Clear all cached codes.
+
+        Returns:
+            True if cleared successfully, False otherwise
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
                 cursor.execute("DELETE FROM extraction_cache")
+                cursor.execute("DELETE FROM compiled_code")
+                cursor.execute("DELETE FROM url_templates")
+                cursor.execute("DELETE FROM generation_failures")
+                cursor.execute("DELETE FROM model_tiers")
                 conn.commit()
 
-            # Remove cache files
+            self.memory_cache.clear()
+            self.usage_buffer.discard()
+            self.url_templates = UrlTemplateLearner()
+
+            # Remove cache files and archived HTML
             if os.path.exists(self.cache_dir):
                 for filename in os.listdir(self.cache_dir):
                     if filename.endswith(".py"):
                         os.remove(os.path.join(self.cache_dir, filename))
+            if os.path.isdir(self.html_archive_dir):
+                for filename in os.listdir(self.html_archive_dir):
+                    os.remove(os.path.join(self.html_archive_dir, filename))
 
             self.logger.info("Cache cleared successfully")
             return True
@@ -386,6 +1797,9 @@ class CodeCache:
             Dictionary with cache statistics
         """
         try:
+            # Include hits that are still sitting in the write-behind buffer
+            self.flush_usage_stats()
+
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
 
@@ -415,7 +1829,96 @@ class CodeCache:
                 )
                 top_urls = cursor.fetchall()
 
+                cursor.execute(
+                    "SELECT COUNT(*), SUM(retry_at > ?) "
+                    "FROM generation_failures",
+                    (time.time(),),
+                )
+                failed_keys, backing_off = cursor.fetchone()
+
+                cursor.execute(
+                    """
+                    SELECT model_name, prompt_version, cleaner_version,
+                           COUNT(*)
+                    FROM extraction_cache
+                    GROUP BY model_name, prompt_version, cleaner_version
+                    ORDER BY COUNT(*) DESC
+                """
+                )
+                version_counts = cursor.fetchall()
+
+                cursor.execute(
+                    "SELECT COUNT(*) FROM extraction_cache "
+                    "WHERE hash_version < ?",
+                    (self.STRUCTURAL_HASH_VERSION,),
+                )
+                outdated_hashes = cursor.fetchone()[0]
+
+                # Each use after the first is a generation the cache saved
+                cursor.execute(
+                    """
+                    SELECT COUNT(prompt_tokens),
+                           SUM(prompt_tokens + completion_tokens),
+                           SUM(llm_cost),
+                           SUM((use_count - 1)
+                               * (prompt_tokens + completion_tokens)),
+                           SUM((use_count - 1) * llm_cost)
+                    FROM extraction_cache
+                    WHERE prompt_tokens IS NOT NULL
+                """
+                )
+                (
+                    metered_entries,
+                    generation_tokens,
+                    generation_cost,
+                    tokens_avoided,
+                    cost_avoided,
+                ) = cursor.fetchone()
+
                 return {
+                    "memory_cache": self.memory_cache.get_stats(),
+                    "lookup_levels": dict(self.lookup_levels),
+                    "evictions": dict(self.eviction_stats),
+                    "eviction_policy": self.eviction_policy.to_dict(),
+                    "near_matches": {
+                        "found": self.near_match_hits,
+                        "not_found": self.near_match_misses,
+                        "max_distance": self.near_match_max_distance,
+                    },
+                    "backend": (
+                        self.backend.get_stats() if self.backend else None
+                    ),
+                    "failures": {
+                        "keys": failed_keys,
+                        "backing_off": backing_off or 0,
+                        "backoff_policy": self.backoff_policy.to_dict(),
+                    },
+                    "versions": {
+                        "current": dict(
+                            self.versions,
+                            hash_version=self.STRUCTURAL_HASH_VERSION,
+                        ),
+                        "match": list(self.match_versions),
+                        "entries": [
+                            {
+                                "model_name": model,
+                                "prompt_version": prompt,
+                                "cleaner_version": cleaner,
+                                "count": count,
+                            }
+                            for model, prompt, cleaner, count in (
+                                version_counts
+                            )
+                        ],
+                        "outdated_hash_scheme": outdated_hashes,
+                    },
+                    "llm_usage": {
+                        "metered_entries": metered_entries,
+                        "generation_tokens": generation_tokens or 0,
+                        "generation_cost": round(generation_cost or 0.0, 6),
+                        "tokens_avoided_by_hits": tokens_avoided or 0,
+                        "cost_avoided_by_hits": round(cost_avoided or 0.0, 6),
+                    },
                     "total_entries": total_entries,
                     "total_uses": total_uses,
                     "average_uses": round(avg_uses, 2) if avg_uses else 0,
@@ -431,38 +1934,395 @@ class CodeCache:
             self.logger.error(f"Error getting cache stats: {str(e)}")
             return {}
 
-    def cleanup_old_entries(self, days_old: int = 30) -> int:
+    def _delete_rows(self, rows: list) -> None:
         """
-        Clean up cache entries older than specified days.
+        Delete cache rows by id in one short transaction and drop them
+        from the memory tier.
 
         Args:
-            days_old: Remove entries older than this many days
-
-        Returns:
-            Number of entries removed
+            rows: List of (id, url_clean, structural_hash, fields_hash)
         """
-        try:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "DELETE FROM extraction_cache WHERE id = ?",
+                [(row[0],) for row in rows],
+            )
+            conn.commit()
+
+        removed = {tuple(row[1:]) for row in rows}
+        self.memory_cache.invalidate_where(
+            lambda _, entry: entry.key in removed
+        )
+
+    def _evict_idle(self, days: float, batch_size: int) -> int:
+        """Remove entries not used for the given number of days"""
+        removed = 0
+        while True:
             with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+                rows = conn.execute(
+                    """
+                    SELECT id, url_clean, structural_hash, fields_hash
+                    FROM extraction_cache
+                    WHERE last_used_at < datetime('now', '-' || ? || ' days')
+                    LIMIT ?
+                """,
+                    (days, batch_size),
+                ).fetchall()
+            if not rows:
+                return removed
+            self._delete_rows(rows)
+            removed += len(rows)
+
+    def _evict_lru(self, policy: EvictionPolicy) -> int:
+        """Remove least recently used entries until size limits hold"""
+        removed = 0
+        while True:
+            with sqlite3.connect(self.db_path) as conn:
+                entries, total_bytes = conn.execute(
+                    """
+                    SELECT COUNT(*),
+                           COALESCE(
+                               SUM(LENGTH(CAST(extraction_code AS BLOB))), 0
+                           )
+                    FROM extraction_cache
+                """
+                ).fetchone()
 
-                # Delete old entries
-                cursor.execute(
+                excess_entries = (
+                    entries - policy.max_entries
+                    if policy.max_entries is not None
+                    else 0
+                )
+                excess_bytes = (
+                    total_bytes - policy.max_bytes
+                    if policy.max_bytes is not None
+                    else 0
+                )
+                if excess_entries <= 0 and excess_bytes <= 0:
+                    return removed
+
+                candidates = conn.execute(
                     """
-                    DELETE FROM extraction_cache
-                    WHERE created_at < datetime('now', '-' || ? || ' days')
+                    SELECT id, url_clean, structural_hash, fields_hash,
+                           LENGTH(CAST(extraction_code AS BLOB))
+                    FROM extraction_cache
+                    ORDER BY last_used_at ASC, use_count ASC, id ASC
+                    LIMIT ?
                 """,
-                    (days_old,),
+                    (policy.batch_size,),
+                ).fetchall()
+
+            batch = []
+            for *row, size in candidates:
+                if excess_entries <= 0 and excess_bytes <= 0:
+                    break
+                batch.append(row)
+                excess_entries -= 1
+                excess_bytes -= size
+
+            if not batch:
+                return removed
+            self._delete_rows(batch)
+            removed += len(batch)
+
+    def evict(self, policy: Optional[EvictionPolicy] = None) -> Dict[str, int]:
+        """
+        Enforce the eviction policy: drop idle entries, then least recently
+        used entries until the entry and byte limits hold. Deletes run in
+        small batches so concurrent lookups are never stalled.
+
+        Args:
+            policy: Limits to enforce; defaults to self.eviction_policy
+
+        Returns:
+            Number of entries removed per reason
+        """
+        policy = policy or self.eviction_policy
+        # Eviction order depends on last_used_at being current
+        self.flush_usage_stats()
+
+        result = {"idle": 0, "lru": 0}
+        try:
+            if policy.max_idle_days is not None:
+                result["idle"] = self._evict_idle(
+                    policy.max_idle_days, policy.batch_size
                 )
+            result["lru"] = self._evict_lru(policy)
+        except Exception as e:
+            self.logger.error(f"Error evicting cache entries: {str(e)}")
+
+        for reason, count in result.items():
+            self.eviction_stats[reason] += count
+        if any(result.values()):
+            self.logger.info(
+                f"Evicted {result['idle']} idle and {result['lru']} "
+                "least recently used cache entries"
+            )
+        return result
+
+    def collect_orphaned_files(self) -> int:
+        """
+        Garbage-collect code files and bytecode that no cache entry refers
+        to any more, and prune the code archive directory to its newest
+        files.
+
+        Returns:
+            Number of files removed
+        """
+        removed = 0
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    "SELECT code_file_path, extraction_code "
+                    "FROM extraction_cache"
+                ).fetchall()
+                referenced_html = {
+                    os.path.abspath(row[0])
+                    for row in conn.execute(
+                        "SELECT html_path FROM extraction_cache "
+                        "WHERE html_path IS NOT NULL"
+                    )
+                }
 
-                removed_count = cursor.rowcount
+                live_hashes = {compute_code_hash(code) for _, code in rows}
+                stored_hashes = {
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT DISTINCT code_hash FROM compiled_code"
+                    )
+                }
+                conn.executemany(
+                    "DELETE FROM compiled_code WHERE code_hash = ?",
+                    [(h,) for h in stored_hashes - live_hashes],
+                )
                 conn.commit()
 
-                if removed_count > 0:
-                    self.logger.info(
-                        f"Removed {removed_count} old cache entries"
+            referenced = {
+                os.path.abspath(path) for path, _ in rows if path
+            }
+            # store_code writes an entry's files before its row, so files
+            # that are still young may belong to an entry being stored
+            grace = self.eviction_policy.orphan_grace_seconds or 0
+            cutoff = time.time() - grace
+
+            if os.path.isdir(self.cache_dir):
+                for filename in os.listdir(self.cache_dir):
+                    path = os.path.abspath(
+                        os.path.join(self.cache_dir, filename)
+                    )
+                    if (
+                        filename.endswith(".py")
+                        and path not in referenced
+                        and os.path.getmtime(path) <= cutoff
+                    ):
+                        os.remove(path)
+                        removed += 1
+
+            if os.path.isdir(self.html_archive_dir):
+                for filename in os.listdir(self.html_archive_dir):
+                    path = os.path.abspath(
+                        os.path.join(self.html_archive_dir, filename)
                     )
+                    if (
+                        path not in referenced_html
+                        and os.path.getmtime(path) <= cutoff
+                    ):
+                        os.remove(path)
+                        removed += 1
+
+            keep = self.eviction_policy.max_archived_files
+            if (
+                self.code_archive_dir
+                and keep is not None
+                and os.path.isdir(self.code_archive_dir)
+            ):
+                archived = sorted(
+                    (
+                        os.path.join(self.code_archive_dir, filename)
+                        for filename in os.listdir(self.code_archive_dir)
+                        if filename.endswith(".py")
+                    ),
+                    key=os.path.getmtime,
+                    reverse=True,
+                )
+                for path in archived[keep:]:
+                    os.remove(path)
+                    removed += 1
+
+        except Exception as e:
+            self.logger.error(f"Error collecting orphaned files: {str(e)}")
+
+        self.eviction_stats["files"] += removed
+        if removed:
+            self.logger.info(f"Removed {removed} orphaned code files")
+        return removed
+
+    def run_maintenance(self) -> Dict[str, int]:
+        """
+        One maintenance pass: flush usage stats, evict, collect orphans.
+
+        Returns:
+            Counts of evicted entries and removed files
+        """
+        result = self.evict()
+        result["files"] = self.collect_orphaned_files()
+        result["migrated"] = self.migrate_hash_scheme(
+            limit=self.eviction_policy.batch_size
+        )
+        return result
+
+    def start_maintenance(self, interval: float = 300.0) -> None:
+        """
+        Run maintenance in a background thread every ``interval`` seconds.
+
+        Args:
+            interval: Seconds between maintenance passes
+        """
+        self.stop_maintenance()
+        self._maintenance = MaintenanceWorker(
+            weakref.ref(self), interval
+        ).start()
+
+    def stop_maintenance(self) -> None:
+        """Stop the background maintenance thread, if running"""
+        if self._maintenance:
+            self._maintenance.stop()
+            self._maintenance = None
+
+    def export_bundle(self, path: str, domain: Optional[str] = None) -> int:
+        """
+        Export cache entries (keys, code, field sets, fingerprints and
+        usage statistics) to a single compressed bundle file.
+
+        Args:
+            path: Destination bundle file (gzip-compressed JSON)
+            domain: Only export entries of this domain
+
+        Returns:
+            Number of entries exported
+        """
+        self.flush_usage_stats()
+
+        where, params = "", ()
+        if domain:
+            where, params = "WHERE domain = ?", (domain.lower(),)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            entries = [
+                dict(row)
+                for row in conn.execute(
+                    f"SELECT {', '.join(BUNDLE_COLUMNS)} "
+                    f"FROM extraction_cache {where}",
+                    params,
+                )
+            ]
+            templates = conn.execute(
+                f"SELECT domain, template FROM url_templates {where}", params
+            ).fetchall()
+
+        write_bundle(path, entries, templates)
+        self.logger.info(f"Exported {len(entries)} cache entries to {path}")
+        return len(entries)
+
+    def import_bundle(
+        self, path: str, strategy: str = "newest"
+    ) -> Dict[str, int]:
+        """
+        Merge a bundle written by export_bundle() into this cache.
+
+        When both sides hold an entry for the same key, the newest
+        ('newest') or most used ('most_used') one is kept.
+
+        Args:
+            path: Bundle file
+            strategy: Merge strategy, 'newest' or 'most_used'
+
+        Returns:
+            Counts of inserted, updated and skipped entries
+
+        Raises:
+            BundleError: If the file is not a readable bundle
+        """
+        bundle = read_bundle(path)
+        self.flush_usage_stats()
+
+        result = {"inserted": 0, "updated": 0, "skipped": 0}
+        replaced = set()
+
+        with sqlite3.connect(self.db_path) as conn:
+            for entry in bundle["entries"]:
+                key = (
+                    entry["url_clean"],
+                    entry["structural_hash"],
+                    entry["fields_hash"],
+                )
+                existing = conn.execute(
+                    """
+                    SELECT created_at, use_count FROM extraction_cache
+                    WHERE url_clean = ? AND structural_hash = ?
+                          AND fields_hash = ?
+                """,
+                    key,
+                ).fetchone()
+
+                if existing and not incoming_wins(
+                    {"created_at": existing[0], "use_count": existing[1]},
+                    entry,
+                    strategy,
+                ):
+                    result["skipped"] += 1
+                    continue
+
+                self._upsert_entry(conn, entry)
+                result["updated" if existing else "inserted"] += 1
+                replaced.add(key)
+
+            conn.executemany(
+                "INSERT OR IGNORE INTO url_templates (domain, template) "
+                "VALUES (?, ?)",
+                bundle.get("url_templates", []),
+            )
+            conn.commit()
+
+        for _, template in bundle.get("url_templates", []):
+            self.url_templates.add_template(template)
+        self.memory_cache.invalidate_where(
+            lambda _, entry: entry.key in replaced
+        )
+
+        self.logger.info(
+            f"Imported cache bundle {path}: {result['inserted']} inserted, "
+            f"{result['updated']} updated, {result['skipped']} skipped"
+        )
+        return result
+
+    def cleanup_old_entries(self, days_old: int = 30) -> int:
+        """
+        Clean up cache entries that have not been used for the specified
+        number of days, along with their code files.
+
+        Entries are aged by last use rather than creation, so old but
+        heavily used extractors are kept.
+
+        Args:
+            days_old: Remove entries idle for more than this many days
+
+        Returns:
+            Number of entries removed
+        """
+        try:
+            self.flush_usage_stats()
+            removed_count = self._evict_idle(
+                days_old, self.eviction_policy.batch_size
+            )
+            self.eviction_stats["idle"] += removed_count
+            self.collect_orphaned_files()
+
+            if removed_count > 0:
+                self.logger.info(f"Removed {removed_count} old cache entries")
 
-                return removed_count
+            return removed_count
 
         except Exception as e:
             self.logger.error(f"Error cleaning up old entries: {str(e)}")
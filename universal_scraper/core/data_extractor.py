@@ -2,11 +2,37 @@ import json
 import logging
 import os
 import csv
+import time
+import threading
+import traceback
+import functools
 from datetime import datetime
 from urllib.parse import urlparse
 import google.generativeai as genai
 from bs4 import BeautifulSoup
 from .code_cache import CodeCache
+from .caching import (
+    CompiledExtractorCache,
+    SingleFlight,
+    RecentlyFailedError,
+)
+from .extraction_validator import ExtractionValidator
+from .extraction_sandbox import ExtractionWorkerPool
+from .cleaning import HtmlCleaner, PromptBudgeter
+from .llm import (
+    AsyncLLMClient,
+    GeminiProvider,
+    HedgePolicy,
+    LiteLLMProvider,
+    Prompt,
+    RateLimiter,
+    CostModel,
+    TokenUsage,
+    UsageTracker,
+    code_block_end,
+    count_tokens,
+    detect_provider,
+)
 
 try:
     from litellm import completion
@@ -17,7 +43,99 @@ except ImportError:
     completion = None
 
 
+# Fixed part of the code generation prompt. Nothing page- or
+# field-specific may go in here: the prefix has to stay byte-identical
+# across requests for provider prompt caches to hit.
+GENERATION_INSTRUCTIONS = """
+You are an expert web scraper. Analyze the following HTML content and
+generate a Python function using BeautifulSoup that extracts structured data.
+
+IMPORTANT CONTEXT: The HTML provided has been intelligently cleaned and
+reduced:
+- Repeated structures have been sampled (only 2 samples shown from groups
+  of 3+ similar elements)
+- Empty divs, scripts, styles, ads, and navigation elements have been
+  removed
+- The final extraction will run on the FULL original HTML with ALL items
+- Your code must be designed to handle the complete dataset, not just the
+  samples shown
+
+Requirements:
+1. Create a function named 'extract_data(html_content)' that takes HTML
+   string as input
+2. Return structured data as a JSON-serializable dictionary/list
+3. Only extract the fields listed after these instructions
+4. Handle edge cases and missing elements gracefully using
+   try-except blocks
+5. Use descriptive field names in the output that match the requested fields
+6. Group related data logically
+7. Always return the same structure even if some fields are empty
+8. Include comprehensive error handling
+9. For each item/record, include all requested fields even if some
+   are null/empty
+10. **Design for scalability** - your selectors must work for
+    hundreds/thousands of similar items
+11. **Use robust selectors** that will work across all instances,
+    not just the 2 samples shown
+12. **Avoid hardcoded indices** - use class names, attributes, and
+    structural patterns instead
+
+Selector Best Practices:
+- Use CSS selectors or find_all() methods that capture ALL matching elements
+- Prefer class-based selectors over position-based ones
+- Test selectors that work for recurring patterns, not just individual samples
+- Use broad selectors like `soup.find_all('div', class_='item-class')`
+  to catch all items
+- Handle variations in HTML structure within the same element type
+
+Error Handling Requirements:
+- Wrap individual field extractions in try-except blocks
+- Provide meaningful default values for missing fields
+- Continue processing other items even if one fails
+- Log specific errors without stopping execution
+
+The function should follow this template:
+```python
+from bs4 import BeautifulSoup
+import re
+from datetime import datetime
+
+def extract_data(html_content):
+    soup = BeautifulSoup(html_content, 'html.parser')
+    extracted_data = []
+
+    try:
+        # Your extraction logic here
+        # Make sure to extract every requested field
+        # Return consistent structure with requested fields
+        return extracted_data
+    except Exception as e:
+        print(f"Error extracting data: {e}")
+        return []
+```
+
+Remember: The HTML shown contains only SAMPLES of repeated elements.
+Your selectors must work for ALL instances in the full HTML. Focus on patterns
+and classes that will scale to the complete dataset.
+Only return the Python code, no explanations.
+"""
+
+# Fixed part of the repair prompt, sent ahead of the failing code
+REPAIR_INSTRUCTIONS = """
+The extract_data(html_content) function below was generated to extract the
+fields listed after these instructions. It cannot be used, for the reason
+given below.
+Fix the function so it runs without errors and extracts every item from
+the HTML. Keep the same signature and only use BeautifulSoup, re, json and
+datetime. Only return the complete corrected Python code, no explanations.
+"""
+
+
 class DataExtractor:
+    # Recorded with cached code; bump when the generation prompt changes in
+    # a way that makes previously generated code incompatible
+    PROMPT_VERSION = "1"
+
     def __init__(
         self,
         api_key=None,
@@ -25,6 +143,24 @@ class DataExtractor:
         output_dir="output",
         model_name=None,
         enable_cache=True,
+        cache_backend=None,
+        llm_max_concurrency=4,
+        llm_timeout=120.0,
+        llm_rate_limits=None,
+        llm_fallback_models=None,
+        llm_hedge_delay=30.0,
+        llm_hedge_percentile=0.9,
+        llm_tiers=None,
+        llm_prices=None,
+        llm_prompt_caching=True,
+        llm_streaming=True,
+        llm_provider=None,
+        llm_max_prompt_tokens=60000,
+        max_repair_attempts=2,
+        execution_engine="inline",
+        execution_workers=2,
+        execution_timeout=30.0,
+        execution_memory_mb=512,
     ):
         self.logger = logging.getLogger(__name__)
         self.temp_dir = temp_dir
@@ -33,6 +169,82 @@ class DataExtractor:
         self.enable_cache = enable_cache
         self.api_key = api_key
 
+        # "sandbox" runs generated code in pre-forked worker processes with
+        # a wall-clock and memory limit per call instead of in this process;
+        # the pool forks its spawner here, before the cache and the model
+        # client start their threads
+        if execution_engine not in ("inline", "sandbox"):
+            raise ValueError(f"Unknown execution engine: {execution_engine}")
+        self.execution_engine = execution_engine
+        self.execution_pool = None
+        if execution_engine == "sandbox":
+            self.execution_pool = ExtractionWorkerPool(
+                self._build_execution_namespace,
+                workers=execution_workers,
+                timeout=execution_timeout,
+                max_memory_mb=execution_memory_mb,
+            )
+
+        # Model calls go through a shared async client so concurrent
+        # generations overlap up to the concurrency cap
+        self.llm_max_concurrency = llm_max_concurrency
+        self.llm_timeout = llm_timeout
+        self.llm_client = None
+
+        # Prompts are sent as fixed instructions plus a per-page tail;
+        # providers that only cache marked prefixes get the marker
+        self.llm_prompt_caching = llm_prompt_caching
+
+        # Streamed responses are cut off once the fenced code block closes,
+        # so trailing explanations are neither waited for nor paid for
+        self.llm_streaming = llm_streaming
+
+        # A ready LLMProvider (e.g. the offline fake of the benchmark
+        # harness) replaces the provider chosen from the model name
+        self.llm_provider = llm_provider
+
+        # Pages still too large after cleaning are cut down to their
+        # repeated-item container (or densest part) so every prompt fits
+        self.max_prompt_tokens = llm_max_prompt_tokens
+        self.prompt_budgeter = PromptBudgeter(temp_dir)
+        self.prompt_budget_stats = {
+            "subtree": 0,
+            "chunk": 0,
+            "truncated": 0,
+        }
+
+        # Budgets are keyed by provider/model, so one limiter outlives
+        # model switches and keeps every model's quota separate
+        if isinstance(llm_rate_limits, RateLimiter):
+            self.rate_limiter = llm_rate_limits
+        else:
+            self.rate_limiter = RateLimiter(llm_rate_limits)
+
+        # Requests still running on a model after its hedge delay (or
+        # failing) are raced against the next fallback model
+        self.llm_fallback_models = list(llm_fallback_models or [])
+        self.hedge_policy = HedgePolicy(
+            percentile=llm_hedge_percentile, initial_delay=llm_hedge_delay
+        )
+
+        # Models tried cheapest first on a miss; code is only accepted
+        # from a tier once it validates, and the tier that succeeded for
+        # a domain is where its next miss starts
+        self.llm_tiers = list(llm_tiers or [])
+        self.tier_providers = []
+        self._domain_tiers = {}
+        self.tier_stats = {"successes": {}, "escalations": 0}
+
+        # Generated code that fails to compile, raises or extracts nothing
+        # is sent back to the model with the error this many times before
+        # the generation fails; only code that passes is cached
+        self.max_repair_attempts = max_repair_attempts
+        self.repair_stats = {"attempts": 0, "repaired": 0, "exhausted": 0}
+
+        # Tokens and cost of every model call, per model and domain for
+        # this run; each generation's share is also stored with its entry
+        self.usage_tracker = UsageTracker(CostModel(llm_prices))
+
         # Create directories
         os.makedirs(self.extraction_codes_dir, exist_ok=True)
         os.makedirs(self.output_dir, exist_ok=True)
@@ -42,16 +254,59 @@ class DataExtractor:
             cache_db_path = os.path.join(temp_dir, "extraction_cache.db")
             cache_dir = os.path.join(temp_dir, "cache")
             self.code_cache = CodeCache(
-                db_path=cache_db_path, cache_dir=cache_dir
+                db_path=cache_db_path,
+                cache_dir=cache_dir,
+                maintenance_interval=300,
+                code_archive_dir=self.extraction_codes_dir,
+                backend=cache_backend,
             )
             self.logger.info("Code caching enabled")
         else:
             self.code_cache = None
             self.logger.info("Code caching disabled")
 
-        # Set model name with default fallback
+        # Keep compiled extract_data functions warm across pages; with the
+        # cache enabled their bytecode is also persisted for warm starts
+        self.compiled_extractors = CompiledExtractorCache(
+            self._build_execution_namespace,
+            compiler=self.code_cache.compile_code if self.code_cache else None,
+        )
+
+        # Before regenerating on a structural-hash miss, previously cached
+        # code is tried on the new page and kept if its output validates
+        self.enable_trial_execution = True
+        self.validator = ExtractionValidator()
+
+        # Concurrent cache misses for one (template, structure, fields) key
+        # share a single generation: threads through an in-process flight,
+        # processes on this host through a lease row in the cache database
+        self.generation_flights = SingleFlight()
+        self.generation_lease_ttl = 120.0
+        self.generation_wait_timeout = 120.0
+        self.generation_poll_interval = 0.5
+
+        # Keys whose generation failed back off (see CodeCache
+        # record_failure); tracks the key this thread last generated so
+        # code that yields nothing can be blamed on the generation
+        self._generation_state = threading.local()
+
+        # Set model name with default fallback (the strongest tier when
+        # generating with model tiers)
+        if not model_name and self.llm_tiers:
+            model_name = self.llm_tiers[-1]
+        if not model_name and self.llm_provider is not None:
+            model_name = self.llm_provider.model_name
         self.model_name = model_name or "gemini-2.5-flash"
 
+        # Entries record what produced them; only entries from the current
+        # prompt and cleaner versions are served
+        if self.code_cache:
+            self.code_cache.set_versions(
+                model_name=self.model_name,
+                prompt_version=self.PROMPT_VERSION,
+                cleaner_version=HtmlCleaner.VERSION,
+            )
+
         # Initialize AI provider based on model name
         self._initialize_ai_provider(api_key)
 
@@ -64,8 +319,15 @@ class DataExtractor:
         """Initialize AI provider based on model name"""
         self.use_litellm = False
 
+        if self.llm_provider is not None:
+            # No SDK setup or API key is needed for a given provider
+            self.model = None
+            self.logger.info(
+                f"Using {self.llm_provider.provider_name} provider with "
+                f"model: {self.llm_provider.model_name}"
+            )
         # Check if it's a Gemini model
-        if self.model_name.startswith("gemini"):
+        elif self.model_name.startswith("gemini"):
             # Use Google Gemini API directly
             if api_key:
                 genai.configure(api_key=api_key)
@@ -101,48 +363,107 @@ class DataExtractor:
             self.model = None  # LiteLLM doesn't use model objects
             self.logger.info(f"Using LiteLLM with model: {self.model_name}")
 
+        if self.llm_provider is not None:
+            provider = self.llm_provider
+        elif self.use_litellm:
+            provider = LiteLLMProvider(
+                self.model_name, self.api_key, self.llm_prompt_caching
+            )
+        else:
+            provider = GeminiProvider(self.model_name, self.model)
+
+        fallbacks = [
+            self._create_model_provider(name)
+            for name in self.llm_fallback_models
+            if name != self.model_name
+        ]
+        self.tier_providers = [
+            self._create_model_provider(name) for name in self.llm_tiers
+        ]
+
+        if self.llm_client:
+            self.llm_client.close()
+        self.llm_client = AsyncLLMClient(
+            provider,
+            max_concurrency=self.llm_max_concurrency,
+            timeout=self.llm_timeout,
+            rate_limiter=self.rate_limiter,
+            fallbacks=fallbacks,
+            hedge_policy=self.hedge_policy,
+            streaming=self.llm_streaming,
+            stream_stop=code_block_end,
+            response_check=self._is_usable_response,
+        )
+
+    def _create_model_provider(self, model_name):
+        """Create the provider for a fallback or tier model"""
+        # The configured key only belongs to the primary model's provider;
+        # other providers read their keys from the environment
+        api_key = None
+        if detect_provider(model_name) == detect_provider(self.model_name):
+            api_key = self.api_key
+
+        if model_name.startswith("gemini"):
+            if not self.model_name.startswith("gemini"):
+                gemini_key = os.getenv("GEMINI_API_KEY")
+                if not gemini_key:
+                    raise ValueError(
+                        f"Gemini API key not provided for model "
+                        f"{model_name}. Set GEMINI_API_KEY environment "
+                        f"variable."
+                    )
+                genai.configure(api_key=gemini_key)
+            model = genai.GenerativeModel(model_name)
+            return GeminiProvider(model_name, model)
+
+        if not LITELLM_AVAILABLE:
+            raise ImportError(
+                "LiteLLM is required for non-Gemini models. "
+                "Install with: pip install litellm"
+            )
+        return LiteLLMProvider(model_name, api_key, self.llm_prompt_caching)
+
     def _detect_provider_from_model(self, model_name):
         """Detect AI provider from model name"""
-        model_name_lower = model_name.lower()
+        return detect_provider(model_name)
 
-        if model_name_lower.startswith("gemini"):
-            return "gemini"
-        elif (
-            model_name_lower.startswith("gpt") or "openai" in model_name_lower
-        ):
-            return "openai"
-        elif model_name_lower.startswith("claude"):
-            return "anthropic"
-        elif model_name_lower.startswith("llama"):
-            return "ollama"
-        else:
-            return "unknown"
+    def _record_llm_usage(self, response):
+        """
+        Account a model response to the run and to the generation running
+        in this thread
+        """
+        usage = self.usage_tracker.usage_for(response)
+        url = getattr(self._generation_state, "url", None)
+        domain = urlparse(url).netloc.lower() if url else None
+        self.usage_tracker.record(usage, response.model, domain)
+        self._generation_state.usage = (
+            getattr(self._generation_state, "usage", TokenUsage()) + usage
+        )
+        # The latest response (after tiers, fallbacks and repairs) is the
+        # one whose code gets cached
+        self._generation_state.model = response.model
 
     def _generate_content_with_ai(self, prompt):
         """Generate content using appropriate AI provider"""
-        if self.use_litellm:
-            # Use LiteLLM for non-Gemini models
-            try:
-                response = completion(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    api_key=self.api_key,
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                self.logger.error(f"LiteLLM API error: {str(e)}")
-                raise
-        else:
-            # Use Google Gemini API
-            try:
-                response = self.model.generate_content(prompt)
-                if response and response.text:
-                    return response.text
-                else:
-                    raise Exception("No response from Gemini API")
-            except Exception as e:
-                self.logger.error(f"Gemini API error: {str(e)}")
-                raise
+        try:
+            response = self.llm_client.generate_sync(prompt)
+            self._record_llm_usage(response)
+            return response.text
+        except Exception as e:
+            provider = "LiteLLM" if self.use_litellm else "Gemini"
+            self.logger.error(f"{provider} API error: {str(e)}")
+            raise
+
+    async def _agenerate_content_with_ai(self, prompt):
+        """Generate content from async code without blocking the loop"""
+        try:
+            response = await self.llm_client.generate(prompt)
+            self._record_llm_usage(response)
+            return response.text
+        except Exception as e:
+            provider = "LiteLLM" if self.use_litellm else "Gemini"
+            self.logger.error(f"{provider} API error: {str(e)}")
+            raise
 
     def analyze_html_structure(self, html_content):
         """Analyze HTML to understand the data structure"""
@@ -214,11 +535,143 @@ class DataExtractor:
         """Get the current extraction fields. Override in subclasses."""
         return ["company_name", "job_title", "apply_link", "salary_range"]
 
-    def generate_beautifulsoup_code(self, html_content, url=None, fields=None):
+    def _build_projection_code(self, code, fields):
+        """
+        Wrap extraction code for a superset of fields so that its
+        extract_data only returns the requested fields.
+        """
+        return f"""{code}
+
+
+# Projection onto {fields!r}, reusing the extractor generated for a
+# superset of these fields
+_superset_extract_data = extract_data
+_PROJECTED_FIELDS = {list(fields)!r}
+
+
+def _project_record(record):
+    if isinstance(record, dict):
+        return {{field: record.get(field) for field in _PROJECTED_FIELDS}}
+    return record
+
+
+def extract_data(html_content):
+    data = _superset_extract_data(html_content)
+    if isinstance(data, list):
+        return [_project_record(record) for record in data]
+    return _project_record(data)
+"""
+
+    def _reuse_superset_code(self, html_content, url, fields):
+        """
+        Serve a narrower field request from code cached for a superset of
+        the fields on the same structure, and cache the projection under
+        the requested fields once it validates on the page.
+
+        Returns:
+            Projected extraction code, or None
+        """
+        match = self.code_cache.find_superset_entry(url, html_content, fields)
+        if not match:
+            return None
+
+        code = self._build_projection_code(match.code, fields)
+        result = self._run_trial(code, html_content, fields)
+        if result is None or not result.valid:
+            reason = result.reason if result else "code raised"
+            self.logger.info(
+                f"Projected extractor for fields {match.fields} "
+                f"rejected: {reason}"
+            )
+            return None
+
+        self.code_cache.store_code(
+            url,
+            html_content,
+            fields,
+            code,
+            record_count=result.record_count,
+            fill_rate=result.fill_rate,
+            model_name=match.model_name,
+        )
+        self.logger.info(
+            f"Reusing extractor for fields {match.fields} "
+            f"projected onto {fields}"
+        )
+        return code
+
+    def _run_trial(self, code, html_content, fields, expected_records=None):
+        """
+        Execute code against a page without logging failures as errors.
+
+        Returns:
+            ValidationResult, or None if the code raised
+        """
+        try:
+            data = self._get_extractor(code)(html_content)
+            json.dumps(data)
+        except Exception as e:
+            self.logger.debug(f"Trial execution raised: {str(e)}")
+            return None
+        return self.validator.validate(data, fields, expected_records)
+
+    def _try_cached_candidates(self, html_content, url, fields):
+        """
+        On a structural-hash miss, try the most recent code for this URL,
+        its template and the nearest structure, and register the first
+        one that validates under the new hash.
+
+        Returns:
+            Reusable extraction code, or None if every candidate failed
+        """
+        if not self.enable_trial_execution:
+            return None
+
+        for candidate in self.code_cache.get_trial_candidates(
+            url, html_content, fields
+        ):
+            result = self._run_trial(
+                candidate.code, html_content, fields, candidate.record_count
+            )
+            if result is None or not result.valid:
+                reason = result.reason if result else "code raised"
+                self.logger.info(
+                    f"Cached code from {candidate.source} "
+                    f"({candidate.url_clean}) rejected: {reason}"
+                )
+                continue
+
+            self.logger.info(
+                f"Reusing cached code from {candidate.source} "
+                f"({candidate.url_clean}): {result.record_count} records, "
+                f"{result.fill_rate:.0%} fields filled"
+            )
+            self.code_cache.store_code(
+                url,
+                html_content,
+                fields,
+                candidate.code,
+                record_count=result.record_count,
+                fill_rate=result.fill_rate,
+                model_name=candidate.model_name,
+            )
+            return candidate.code
+
+        return None
+
+    def generate_beautifulsoup_code(
+        self, html_content, url=None, fields=None, validation_html=None
+    ):
         """Use Gemini to generate BeautifulSoup extraction code with
-        caching support"""
+        caching support. validation_html is the full page the code will
+        run on, used to validate code from tiered generation."""
         # Get fields for caching (use provided fields or default)
         extraction_fields = fields or self.get_extraction_fields()
+        self._generation_state.generated = None
+        self._generation_state.validation_html = validation_html
+        self._generation_state.url = url
+        self._generation_state.usage = TokenUsage()
+        self._generation_state.model = None
 
         # Check cache first if enabled
         if self.enable_cache and self.code_cache and url:
@@ -228,149 +681,542 @@ class DataExtractor:
             if cached_code:
                 return cached_code
 
-        # Generate new code if not cached
-        self.analyze_html_structure(html_content)
+            projected_code = self._reuse_superset_code(
+                html_content, url, extraction_fields
+            )
+            if projected_code:
+                return projected_code
 
-        # Create field descriptions for the prompt
-        field_descriptions = ", ".join(extraction_fields)
+            trial_code = self._try_cached_candidates(
+                html_content, url, extraction_fields
+            )
+            if trial_code:
+                return trial_code
 
-        # Prepare the prompt for the AI model
-        prompt = f"""
-You are an expert web scraper. Analyze the following HTML content and
-generate a Python function using BeautifulSoup that extracts structured data.
+            return self._generate_single_flight(
+                html_content, url, extraction_fields
+            )
 
-IMPORTANT CONTEXT: The HTML provided has been intelligently cleaned and
-reduced:
-- Repeated structures have been sampled (only 2 samples shown from groups
-  of 3+ similar elements)
-- Empty divs, scripts, styles, ads, and navigation elements have been
-  removed
-- The final extraction will run on the FULL original HTML with ALL items
-- Your code must be designed to handle the complete dataset, not just the
-  samples shown
+        return self._generate_new_code(html_content, url, extraction_fields)
 
-Requirements:
-1. Create a function named 'extract_data(html_content)' that takes HTML
-   string as input
-2. Return structured data as a JSON-serializable dictionary/list
-3. Only extract the following fields: {field_descriptions}
-4. Handle edge cases and missing elements gracefully using
-   try-except blocks
-5. Use descriptive field names in the output that match the requested fields
-6. Group related data logically
-7. Always return the same structure even if some fields are empty
-8. Include comprehensive error handling
-9. For each item/record, include all requested fields even if some
-   are null/empty
-10. **Design for scalability** - your selectors must work for
-    hundreds/thousands of similar items
-11. **Use robust selectors** that will work across all instances,
-    not just the 2 samples shown
-12. **Avoid hardcoded indices** - use class names, attributes, and
-    structural patterns instead
+    def _generate_single_flight(self, html_content, url, fields):
+        """
+        Generate code for a cache miss unless the same key is already being
+        generated, in which case wait for that generation and reuse it.
+        """
+        key = self.code_cache.generation_key(url, html_content, fields)
+        self._check_recent_failure(key, url)
+        is_leader, done = self.generation_flights.begin(key)
 
-Selector Best Practices:
-- Use CSS selectors or find_all() methods that capture ALL matching elements
-- Prefer class-based selectors over position-based ones
-- Test selectors that work for recurring patterns, not just individual samples
-- Use broad selectors like `soup.find_all('div', class_='item-class')`
-  to catch all items
-- Handle variations in HTML structure within the same element type
+        if not is_leader:
+            self.logger.info(f"Waiting for in-flight code generation: {url}")
+            done.wait(self.generation_wait_timeout)
+            cached_code = self.code_cache.get_cached_code(
+                url, html_content, fields
+            )
+            if cached_code:
+                return cached_code
+            # The leader failed; try on our own unless it started a backoff
+            self._check_recent_failure(key, url)
+            return self._generate_recorded(key, html_content, url, fields)
 
-Error Handling Requirements:
-- Wrap individual field extractions in try-except blocks
-- Provide meaningful default values for missing fields
-- Continue processing other items even if one fails
-- Log specific errors without stopping execution
+        try:
+            return self._generate_with_lease(key, html_content, url, fields)
+        finally:
+            self.generation_flights.end(key)
 
-The function should follow this template:
-```python
-from bs4 import BeautifulSoup
-import re
-from datetime import datetime
+    def _generate_with_lease(self, key, html_content, url, fields):
+        """Generate code while holding the cross-process lease for key"""
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        deadline = time.monotonic() + self.generation_wait_timeout
 
-def extract_data(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    extracted_data = []
+        while not self.code_cache.acquire_generation_lease(
+            key, owner, self.generation_lease_ttl
+        ):
+            if time.monotonic() >= deadline:
+                self.logger.warning(
+                    f"Timed out waiting for generation lease: {url}"
+                )
+                return self._generate_recorded(
+                    key, html_content, url, fields
+                )
+            time.sleep(self.generation_poll_interval)
 
-    try:
-        # Your extraction logic here
-        # Make sure to extract: {field_descriptions}
-        # Return consistent structure with requested fields
-        return extracted_data
-    except Exception as e:
-        print(f"Error extracting data: {{e}}")
-        return []
-```
+        try:
+            # Another process may have stored the code while we waited
+            cached_code = self.code_cache.get_cached_code(
+                url, html_content, fields
+            )
+            if cached_code:
+                return cached_code
+            self._check_recent_failure(key, url)
+            return self._generate_recorded(key, html_content, url, fields)
+        finally:
+            self.code_cache.release_generation_lease(key, owner)
+
+    def _check_recent_failure(self, key, url):
+        """Raise RecentlyFailedError while key is backing off"""
+        failure = self.code_cache.get_recent_failure(key)
+        if failure:
+            self.logger.info(
+                f"Skipping generation for {url}: backing off for "
+                f"{failure.retry_in:.0f}s after {failure.attempts} failure(s)"
+            )
+            raise RecentlyFailedError(url, failure)
 
-Remember: The HTML shown contains only SAMPLES of repeated elements.
-Your selectors must work for ALL instances in the full HTML. Focus on patterns
-and classes that will scale to the complete dataset.
-Only return the Python code, no explanations.
+    def _generate_recorded(self, key, html_content, url, fields):
+        """Generate new code, recording failures for backoff"""
+        try:
+            code = self._generate_new_code(html_content, url, fields)
+        except Exception as e:
+            self.code_cache.record_failure(key, f"{type(e).__name__}: {e}")
+            raise
+
+        self.code_cache.clear_failure(key)
+        self._generation_state.generated = (key, url, html_content, fields)
+        return code
+
+    def _record_generated_code_failure(self, reason):
+        """
+        Blame a failed or empty extraction on the code this thread just
+        generated: drop it from the cache and back off its key.
+        """
+        generated = getattr(self._generation_state, "generated", None)
+        if not generated:
+            return
+
+        key, url, html_content, fields = generated
+        self._generation_state.generated = None
+        self.code_cache.remove_code(url, html_content, fields)
+        self.code_cache.record_failure(key, reason)
+
+    def _check_extracted_data(self, extracted_data):
+        """Record freshly generated code that extracted no records"""
+        if not extracted_data:
+            self._record_generated_code_failure(
+                "no records: generated code returned no data"
+            )
+
+    def _build_generation_prompt(self, html_content, extraction_fields):
+        """
+        Build the code generation prompt for a page and its fields: the
+        fixed instructions form a prefix shared by every generation, so
+        providers can serve it from their prompt cache
+        """
+        fitted = self._fit_prompt_html(
+            html_content, count_tokens(GENERATION_INSTRUCTIONS)
+        )
+        return Prompt(
+            GENERATION_INSTRUCTIONS,
+            f"""
+Fields to extract: {", ".join(extraction_fields)}
+{self._reduction_note(fitted)}
 HTML Content:
-```{html_content}```
-"""
+```{fitted.html}```
+""",
+        )
+
+    def _fit_prompt_html(self, html_content, reserved_tokens):
+        """
+        The page HTML reduced to what fits in the prompt beside
+        reserved_tokens of instructions and code; repeated calls for the
+        same page in this thread reuse the reduction
+        """
+        # Leaves room for the field list and formatting around the HTML
+        budget = self.max_prompt_tokens - reserved_tokens - 200
+        memo = getattr(self._generation_state, "prompt_html", None)
+        if memo and memo[0] is html_content and memo[1] == budget:
+            return memo[2]
+
+        fitted = self.prompt_budgeter.fit(html_content, budget)
+        if fitted.strategy != "full":
+            self.prompt_budget_stats[fitted.strategy] += 1
+            self.logger.warning(
+                f"Page too large for the prompt ({fitted.original_tokens} "
+                f"tokens); showing {fitted.tokens} tokens of it "
+                f"({fitted.strategy})"
+            )
+        self._generation_state.prompt_html = (html_content, budget, fitted)
+        return fitted
+
+    @staticmethod
+    def _reduction_note(fitted):
+        """Tells the model when it only sees part of the page"""
+        if fitted.strategy == "full":
+            return ""
+        return (
+            "Note: the page exceeded the prompt size, so only a "
+            "representative part of it is shown. Write selectors for the "
+            "repeated items; they must work on the complete page.\n"
+        )
+
+    @staticmethod
+    def _strip_code_fences(response_text):
+        """Python code of a model response, without markdown fences"""
+        code = response_text.strip()
+
+        # Remove markdown code block markers if present
+        if code.startswith("```python"):
+            code = code[9:]
+        elif code.startswith("```"):
+            code = code[3:]
+
+        if code.endswith("```"):
+            code = code[:-3]
+
+        return code.strip()
 
+    @classmethod
+    def _is_usable_response(cls, response_text):
+        """
+        Whether a response holds code that compiles; a hedged request
+        only wins the race with such a response.
+        """
+        if not response_text:
+            return False
         try:
-            self.logger.info(
-                f"Generating BeautifulSoup code with {self.model_name} "
-                f"for fields: {extraction_fields}"
+            compile(cls._strip_code_fences(response_text), "<llm>", "exec")
+        except (SyntaxError, ValueError):
+            return False
+        return True
+
+    def _parse_generated_code(self, response_text):
+        """
+        Strip markdown fences from a model response and make sure the code
+        compiles and defines extract_data.
+        """
+        if not response_text:
+            raise Exception("No response from AI API")
+
+        code = self._strip_code_fences(response_text)
+
+        # Reject code that cannot run (syntax errors, no extract_data)
+        # before it is cached
+        if self.execution_pool:
+            self.execution_pool.load(code)
+        else:
+            self.compiled_extractors.get_function(code)
+        return code
+
+    def _check_generated_code(self, code, html_content, fields):
+        """
+        Run freshly generated code on the HTML it was generated from and,
+        when known, the full page it will run on.
+
+        Returns:
+            (ValidationResult, None), or (None, traceback) if the code
+            raised. The result is the first failing validation or, when
+            all pass, the one on html_content: the HTML later trial runs
+            compare the cached record count against.
+        """
+        validation_html = getattr(
+            self._generation_state, "validation_html", None
+        )
+        pages = [html_content]
+        if validation_html and validation_html != html_content:
+            pages.append(validation_html)
+
+        validations = []
+        for page in pages:
+            try:
+                data = self._get_extractor(code)(page)
+                json.dumps(data)
+            except Exception as e:
+                # The innermost frames point at the failing line of the
+                # generated code; the rest is our own call stack
+                remote = getattr(e, "remote_traceback", None)
+                return None, remote or traceback.format_exc(limit=-3)[-1500:]
+            validations.append(self.validator.validate(data, fields))
+
+        failed = [v for v in validations if not v.valid]
+        return (failed[0] if failed else validations[0]), None
+
+    def _describe_code_problem(self, validation, error, strict):
+        """
+        Why generated code cannot be used, or None if it can. Code must run
+        and return records; strict also requires the validator to pass.
+        """
+        if error:
+            return f"it raised an error:\n{error}"
+        if validation.record_count == 0:
+            return "it returned no records"
+        if strict and not validation.valid:
+            return f"its output was rejected: {validation.reason}"
+        return None
+
+    def _build_repair_prompt(
+        self, code, html_content, fields, problem, validation=None
+    ):
+        """Compact follow-up prompt asking the model to fix its code"""
+        details = ""
+        if validation is not None:
+            details = (
+                f"Records extracted: {validation.record_count}\n"
+                f"Field fill rate: {validation.fill_rate:.0%}\n"
+                f"Fields never filled: "
+                f"{', '.join(validation.empty_fields) or 'none'}\n"
             )
-            response_text = self._generate_content_with_ai(prompt)
+        fitted = self._fit_prompt_html(
+            html_content,
+            count_tokens(REPAIR_INSTRUCTIONS) + count_tokens(code or ""),
+        )
 
-            if response_text:
-                # Extract Python code from the response
-                code = response_text.strip()
+        return Prompt(
+            REPAIR_INSTRUCTIONS,
+            f"""
+Fields to extract: {", ".join(fields)}
+Problem: the code cannot be used because {problem}
+{details}
+Code:
+```python
+{code}
+```
+{self._reduction_note(fitted)}
+HTML Content:
+```{fitted.html}```
+""",
+        )
 
-                # Remove markdown code block markers if present
-                if code.startswith("```python"):
-                    code = code[9:]
-                elif code.startswith("```"):
-                    code = code[3:]
+    def _ask_model(self, prompt, tier=None):
+        """Send a prompt to the configured model or to one tier"""
+        if tier is None:
+            return self._generate_content_with_ai(prompt)
+        response = self.llm_client.generate_sync(
+            prompt, [self.tier_providers[tier]]
+        )
+        self._record_llm_usage(response)
+        return response.text
 
-                if code.endswith("```"):
-                    code = code[:-3]
+    def _generate_validated(self, prompt, html_content, fields, tier=None):
+        """
+        Generate code and, while it fails to compile, raises or extracts
+        nothing, feed the problem back to the model for a bounded number
+        of repair attempts.
 
-                code = code.strip()
+        Returns:
+            (code, ValidationResult)
+        """
+        strict = tier is not None
+        response_text = self._ask_model(prompt, tier)
+        attempts = 0
 
-                # Cache the generated code if caching is enabled
-                if self.enable_cache and self.code_cache and url:
-                    self.code_cache.store_code(
-                        url, html_content, extraction_fields, code
+        while True:
+            code = response_text
+            validation = None
+            try:
+                code = self._parse_generated_code(response_text)
+                validation, error = self._check_generated_code(
+                    code, html_content, fields
+                )
+            except Exception as e:
+                error = str(e)
+
+            problem = self._describe_code_problem(validation, error, strict)
+            if problem is None:
+                if attempts:
+                    self.repair_stats["repaired"] += 1
+                    self.logger.info(
+                        f"Generated code repaired after {attempts} "
+                        f"attempt(s)"
                     )
+                return code, validation
+
+            if attempts >= self.max_repair_attempts:
+                if self.max_repair_attempts:
+                    self.repair_stats["exhausted"] += 1
+                raise Exception(
+                    f"Generated code rejected after {attempts} repair "
+                    f"attempt(s): {problem}"
+                )
+
+            attempts += 1
+            self.repair_stats["attempts"] += 1
+            self.logger.warning(
+                f"Generated code unusable, asking for a repair "
+                f"({attempts}/{self.max_repair_attempts}): "
+                f"{problem.splitlines()[0]}"
+            )
+            response_text = self._ask_model(
+                self._build_repair_prompt(
+                    code, html_content, fields, problem, validation
+                ),
+                tier,
+            )
+
+    def _starting_tier(self, url):
+        """Tier the domain last succeeded at, or the cheapest one"""
+        if not url:
+            return 0
+        if self.code_cache:
+            tier = self.code_cache.get_model_tier(url, self.llm_tiers)
+        else:
+            tier = self._domain_tiers.get(urlparse(url).netloc.lower())
+        return min(tier or 0, len(self.llm_tiers) - 1)
+
+    def _record_tier(self, url, tier):
+        model = self.llm_tiers[tier]
+        successes = self.tier_stats["successes"]
+        successes[model] = successes.get(model, 0) + 1
+        if not url:
+            return
+        if self.code_cache:
+            self.code_cache.record_model_tier(url, self.llm_tiers, tier)
+        else:
+            self._domain_tiers[urlparse(url).netloc.lower()] = tier
+
+    def _generate_tiered(self, prompt, html_content, url, fields):
+        """
+        Generate with the cheapest promising tier and escalate to stronger
+        models while the code fails validation.
+
+        Returns:
+            (code, ValidationResult)
+        """
+        last_error = None
+        first_tier = self._starting_tier(url)
+
+        for tier in range(first_tier, len(self.llm_tiers)):
+            model = self.llm_tiers[tier]
+            if tier > first_tier:
+                self.tier_stats["escalations"] += 1
+                self.logger.info(
+                    f"Escalating code generation to {model}: {last_error}"
+                )
+
+            self.logger.info(
+                f"Generating BeautifulSoup code with {model} "
+                f"(tier {tier + 1}/{len(self.llm_tiers)}) for fields: {fields}"
+            )
+            try:
+                code, validation = self._generate_validated(
+                    prompt, html_content, fields, tier
+                )
+            except Exception as e:
+                last_error = f"{model} failed: {str(e)}"
+                continue
+
+            self._record_tier(url, tier)
+            return code, validation
+
+        raise Exception(f"No tier produced valid code ({last_error})")
+
+    def _generate_new_code(self, html_content, url, extraction_fields):
+        """
+        Ask the AI model for new extraction code and cache it once it has
+        been validated
+        """
+        self.analyze_html_structure(html_content)
+        prompt = self._build_generation_prompt(html_content, extraction_fields)
 
-                self.logger.info("Successfully generated BeautifulSoup code")
-                return code
+        try:
+            if self.llm_tiers:
+                code, validation = self._generate_tiered(
+                    prompt, html_content, url, extraction_fields
+                )
             else:
-                raise Exception("No response from AI API")
+                self.logger.info(
+                    f"Generating BeautifulSoup code with {self.model_name} "
+                    f"for fields: {extraction_fields}"
+                )
+                code, validation = self._generate_validated(
+                    prompt, html_content, extraction_fields
+                )
+
+            # Cache the generated code if caching is enabled
+            if self.enable_cache and self.code_cache and url:
+                self.code_cache.store_code(
+                    url,
+                    html_content,
+                    extraction_fields,
+                    code,
+                    record_count=validation.record_count,
+                    fill_rate=validation.fill_rate,
+                    usage=self._generation_state.usage,
+                    model_name=self._generation_state.model,
+                )
+
+            self.logger.info("Successfully generated BeautifulSoup code")
+            return code
 
         except Exception as e:
             self.logger.error(f"Error generating code with AI: {str(e)}")
             raise
 
-    def execute_extraction_code(self, code, html_content):
-        """Safely execute the generated BeautifulSoup code"""
+    def _get_extractor(self, code):
+        """
+        The extract_data function of code: compiled in this process, or a
+        call into the sandbox worker pool
+        """
+        if self.execution_pool:
+            return functools.partial(self.execution_pool.run, code)
+        return self.compiled_extractors.get_function(code)
+
+    def _build_execution_namespace(self):
+        """Create the globals generated extraction code is executed in"""
+        return {
+            "BeautifulSoup": BeautifulSoup,
+            "re": __import__("re"),
+            "datetime": __import__("datetime"),
+            "json": __import__("json"),
+            "print": print,
+        }
+
+    def warm_extractor(self, cleaned_html, original_html, url, fields=None):
+        """
+        Make sure validated extraction code for a page is cached, reusing
+        cached code or generating it, and check it on the full page.
+
+        Args:
+            cleaned_html: Cleaned HTML used for code generation
+            original_html: Original HTML the code is validated on
+            url: Page URL
+            fields: Fields to extract
+
+        Returns:
+            Dict with status ('cached', 'generated', 'invalid', 'backoff'
+            or 'failed'), records, fill_rate and error
+        """
+        extraction_fields = fields or self.get_extraction_fields()
         try:
-            # Create a temporary namespace for execution
-            namespace = {
-                "BeautifulSoup": BeautifulSoup,
-                "re": __import__("re"),
-                "datetime": __import__("datetime"),
-                "json": __import__("json"),
-                "print": print,
-            }
+            code = self.generate_beautifulsoup_code(
+                cleaned_html, url, extraction_fields, original_html
+            )
+            generated = self._generation_state.generated is not None
+            extracted_data = self.execute_extraction_code(code, original_html)
 
-            # Execute the code in the namespace
-            exec(code, namespace)
+        except RecentlyFailedError as e:
+            return {"status": "backoff", "records": 0, "error": str(e)}
 
-            # Call the extract_data function
-            if "extract_data" not in namespace:
-                raise Exception(
-                    "Generated code doesn't contain 'extract_data' function"
-                )
+        except Exception as e:
+            self._record_generated_code_failure(f"execution error: {str(e)}")
+            return {"status": "failed", "records": 0, "error": str(e)}
+
+        self._check_extracted_data(extracted_data)
+        validation = self.validator.validate(
+            extracted_data, extraction_fields
+        )
+        if validation.valid:
+            status = "generated" if generated else "cached"
+        else:
+            status = "invalid"
+
+        return {
+            "status": status,
+            "records": validation.record_count,
+            "fill_rate": validation.fill_rate,
+            "error": validation.reason,
+        }
+
+    def execute_extraction_code(self, code, html_content):
+        """Safely execute the generated BeautifulSoup code"""
+        try:
+            # Compile and exec the module only the first time this code is
+            # seen (in this process or a sandbox worker); later pages call
+            # the warm extract_data function
+            extract_data = self._get_extractor(code)
 
             self.logger.info("Executing generated extraction code...")
-            extracted_data = namespace["extract_data"](html_content)
+            extracted_data = extract_data(html_content)
 
             # Validate that the result is JSON serializable
             json.dumps(extracted_data)
@@ -571,13 +1417,53 @@ HTML Content:
     def get_cache_stats(self):
         """Get cache statistics if caching is enabled"""
         if self.enable_cache and self.code_cache:
-            return self.code_cache.get_cache_stats()
+            stats = self.code_cache.get_cache_stats()
+            stats["compiled_extractors"] = self.compiled_extractors.get_stats()
+            if self.execution_pool:
+                stats["execution_pool"] = self.execution_pool.get_stats()
+            stats["generation_flights"] = self.generation_flights.get_stats()
+            stats["llm_client"] = self.llm_client.get_stats()
+            stats["code_repairs"] = dict(self.repair_stats)
+            stats["prompt_budget"] = dict(
+                self.prompt_budget_stats,
+                max_prompt_tokens=self.max_prompt_tokens,
+            )
+            stats["llm_usage"] = dict(
+                stats.get("llm_usage", {}),
+                run=self.usage_tracker.get_stats(),
+            )
+            if self.llm_tiers:
+                stats["model_tiers"] = dict(
+                    self.tier_stats, tiers=list(self.llm_tiers)
+                )
+            return stats
         else:
             return {"message": "Caching is disabled"}
 
+    def get_last_usage(self):
+        """
+        LLM usage of the last extraction made by this thread (zero when
+        its code came from the cache)
+        """
+        usage = getattr(self._generation_state, "usage", None)
+        return (usage or TokenUsage()).to_dict()
+
+    def get_llm_usage(self):
+        """
+        LLM usage of this run, plus the tokens and cost cached entries
+        have avoided when caching is enabled
+        """
+        usage = self.usage_tracker.get_stats()
+        if self.enable_cache and self.code_cache:
+            cache_usage = self.code_cache.get_cache_stats().get("llm_usage")
+            if cache_usage:
+                usage["cache"] = cache_usage
+        return usage
+
     def clear_cache(self):
         """Clear the code cache if caching is enabled"""
         if self.enable_cache and self.code_cache:
+            self.compiled_extractors.clear()
             return self.code_cache.clear_cache()
         else:
             self.logger.info("Caching is disabled - nothing to clear")
@@ -591,6 +1477,38 @@ HTML Content:
             self.logger.info("Caching is disabled - nothing to cleanup")
             return 0
 
+    def invalidate_cache(
+        self,
+        model_name=None,
+        prompt_version=None,
+        cleaner_version=None,
+        domain=None,
+    ):
+        """Remove cache entries of the given versions if caching is enabled"""
+        if self.enable_cache and self.code_cache:
+            self.compiled_extractors.clear()
+            return self.code_cache.invalidate_versions(
+                model_name, prompt_version, cleaner_version, domain
+            )
+        else:
+            return 0
+
+    def export_cache(self, path, domain=None):
+        """Export cache entries to a bundle file if caching is enabled"""
+        if self.enable_cache and self.code_cache:
+            return self.code_cache.export_bundle(path, domain)
+        else:
+            self.logger.info("Caching is disabled - nothing to export")
+            return 0
+
+    def import_cache(self, path, strategy="newest"):
+        """Merge a cache bundle into the cache if caching is enabled"""
+        if self.enable_cache and self.code_cache:
+            return self.code_cache.import_bundle(path, strategy)
+        else:
+            self.logger.info("Caching is disabled - nothing to import")
+            return {"inserted": 0, "updated": 0, "skipped": 0}
+
     def extract_data(self, html_content, url=None, fields=None):
         """Extract data using generated code with caching support"""
         try:
@@ -600,9 +1518,16 @@ HTML Content:
             )
 
             # Execute the code
-            extracted_data = self.execute_extraction_code(
-                extraction_code, html_content
-            )
+            try:
+                extracted_data = self.execute_extraction_code(
+                    extraction_code, html_content
+                )
+            except Exception as e:
+                self._record_generated_code_failure(
+                    f"execution error: {str(e)}"
+                )
+                raise
+            self._check_extracted_data(extracted_data)
 
             return extracted_data
 
@@ -636,13 +1561,20 @@ HTML Content:
 
             # Generate code using cleaned HTML (smaller, focused for AI)
             extraction_code = self.generate_beautifulsoup_code(
-                cleaned_html, url, fields
+                cleaned_html, url, fields, original_html
             )
 
             # Execute the code on original HTML (complete data)
-            extracted_data = self.execute_extraction_code(
-                extraction_code, original_html
-            )
+            try:
+                extracted_data = self.execute_extraction_code(
+                    extraction_code, original_html
+                )
+            except Exception as e:
+                self._record_generated_code_failure(
+                    f"execution error: {str(e)}"
+                )
+                raise
+            self._check_extracted_data(extracted_data)
 
             return extracted_data
 
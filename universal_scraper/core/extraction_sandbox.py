@@ -0,0 +1,499 @@
+"""
+Run generated extraction code in a pool of sandboxed worker processes
+"""
+import os
+import mmap
+import socket
+import signal
+import hashlib
+import logging
+import threading
+import traceback
+import multiprocessing
+import weakref
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import send_handle, recv_handle
+
+from .caching import CompiledExtractorCache, compute_code_hash
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class SandboxError(Exception):
+    """Generated code could not be run to completion in a worker"""
+
+
+class ExtractionTimeoutError(SandboxError):
+    """A call ran past the wall-clock limit and its worker was killed"""
+
+
+class WorkerCrashedError(SandboxError):
+    """A worker died during a call (e.g. killed for its memory use)"""
+
+
+class ExtractionCodeError(SandboxError):
+    """
+    The generated code raised in the worker; ``remote_traceback`` holds
+    the innermost frames of the worker-side traceback.
+    """
+
+    def __init__(self, message, remote_traceback=""):
+        super().__init__(message)
+        self.remote_traceback = remote_traceback
+
+
+def _memory_usage():
+    """(address space, resident set) of this process in bytes, or None"""
+    try:
+        with open("/proc/self/statm") as f:
+            size, resident = f.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    page = os.sysconf("SC_PAGE_SIZE")
+    return int(size) * page, int(resident) * page
+
+
+def _worker_main(conn, buffer, namespace_factory, memory_limit, max_warm):
+    """
+    Worker loop: receive (op, code, html source, payload) requests and
+    answer each with (status, value, detail, recycle).
+    """
+
+    usage = _memory_usage()
+    if memory_limit and usage and resource is not None:
+        # Hard stop for runaway allocations: MemoryError inside the call
+        limit = usage[0] + memory_limit
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+    resident_limit = usage[1] + memory_limit if memory_limit and usage else 0
+
+    extractors = CompiledExtractorCache(
+        namespace_factory, max_entries=max_warm
+    )
+    html = None
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+
+        op, code, source, payload = request
+        out_of_memory = False
+        try:
+            function = extractors.get_function(code)
+            if source == "shared":
+                html = str(memoryview(buffer)[:payload], "utf-8")
+            elif source == "inline":
+                html = str(payload, "utf-8")
+            reply = ["ok", function(html) if op == "run" else None, ""]
+        except MemoryError:
+            reply = ["error", "MemoryError: memory limit exceeded", ""]
+            out_of_memory = True
+        except Exception as e:
+            reply = [
+                "error",
+                f"{type(e).__name__}: {str(e)}",
+                traceback.format_exc(limit=-3)[-1500:],
+            ]
+
+        # Out of memory or past the resident limit, the worker answers and
+        # then exits so the parent can start a fresh one
+        usage = _memory_usage()
+        recycle = out_of_memory or bool(
+            resident_limit and usage and usage[1] > resident_limit
+        )
+        try:
+            conn.send((*reply, recycle))
+        except Exception as e:
+            # The result could not be pickled; nothing was written yet
+            conn.send((
+                "error",
+                f"Extracted data cannot be returned: {str(e)}",
+                "",
+                recycle,
+            ))
+        if recycle:
+            return
+
+
+def _spawner_main(
+    conn, parent_conn, buffers, namespace_factory, memory_limit, max_warm
+):
+    """
+    Spawner loop: answer ("start", index) by forking a worker on that
+    index's buffer and handing the parent the worker's pid and its end of
+    the worker's socket, and ("stop", pid) by killing and reaping that
+    worker and returning its exit code. The spawner runs no threads, so its
+    forks cannot inherit a lock some other thread held.
+
+    Workers stay unreaped until stopped, so a pid the spawner signals is
+    always still its own child and never a reused one.
+    """
+    parent_conn.close()
+    # The parent handles Ctrl-C and shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+
+        op, arg = request
+        if op == "stop":
+            os.kill(arg, signal.SIGKILL)
+            _, status = os.waitpid(arg, 0)
+            conn.send(os.waitstatus_to_exitcode(status))
+            continue
+
+        parent_end, child_end = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            conn.close()
+            parent_end.close()
+            try:
+                _worker_main(
+                    Connection(child_end.detach()),
+                    buffers[arg],
+                    namespace_factory,
+                    memory_limit,
+                    max_warm,
+                )
+            finally:
+                os._exit(0)
+
+        child_end.close()
+        conn.send(pid)
+        send_handle(conn, parent_end.fileno(), None)
+        parent_end.close()
+
+
+class _Worker:
+    """Parent-side handle of one worker process"""
+
+    def __init__(self, index):
+        self.index = index
+        self.pid = None
+        self.conn = None
+        # blake2b digest of the page the worker holds decoded, and the code
+        # hashes it keeps warm, mirroring its LRU
+        self.html_key = None
+        self.warm = OrderedDict()
+
+    def is_alive(self):
+        # Idle workers never write, so a readable socket means it was
+        # closed by the worker exiting
+        try:
+            return not self.conn.poll(0)
+        except (OSError, ValueError):
+            return False
+
+
+def _shutdown(workers, spawner, spawner_conn):
+    for worker in workers:
+        if worker.conn is not None:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+    for worker in workers:
+        if worker.conn is not None:
+            # The worker closes its end on exit; the spawner kills it if it
+            # has not by then
+            try:
+                worker.conn.poll(1.0)
+            except (OSError, ValueError):
+                pass
+            worker.conn.close()
+    try:
+        for worker in workers:
+            if worker.pid is not None:
+                spawner_conn.send(("stop", worker.pid))
+                spawner_conn.recv()
+        spawner_conn.send(None)
+    except (EOFError, OSError, ValueError):
+        pass
+    spawner.join(1.0)
+    if spawner.is_alive():
+        spawner.kill()
+        spawner.join()
+    spawner_conn.close()
+
+
+class ExtractionWorkerPool:
+    """
+    Pre-forked worker processes that run generated ``extract_data`` code.
+
+    A call that runs past ``timeout`` seconds is preempted by killing its
+    worker; allocations beyond ``max_memory_mb`` over a worker's starting
+    size fail with MemoryError (an address-space rlimit), and a worker
+    whose resident memory stays above that is recycled after the call.
+    Dead workers are replaced before their next call. Each worker keeps
+    its compiled extractors warm, and pages reach it through a shared
+    memory buffer, sent once for consecutive calls on the same page.
+
+    Workers, replacements included, are forked from a spawner process
+    that is itself forked once, when the pool is created. Threads the
+    parent starts after that (model clients, cache maintenance) are never
+    copied into a worker holding one of their locks, so create the pool
+    before starting them; threads already running at creation are still
+    copied into the spawner's snapshot, as with any fork.
+
+    Needs the ``fork`` start method (Linux and macOS).
+    """
+
+    def __init__(
+        self,
+        namespace_factory,
+        workers=2,
+        timeout=30.0,
+        max_memory_mb=512,
+        max_html_bytes=16 * 1024 * 1024,
+        max_warm=128,
+    ):
+        """
+        Args:
+            namespace_factory: Callable returning a fresh globals dict for
+                               the generated code
+            workers: Number of worker processes
+            timeout: Wall-clock seconds allowed per call
+            max_memory_mb: Memory a worker may use beyond its size at start
+                           (None for no limit)
+            max_html_bytes: Size of each worker's shared page buffer; larger
+                            pages are sent through the worker's pipe
+            max_warm: Compiled extractors each worker keeps warm
+        """
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError(
+                "Sandboxed extraction needs the 'fork' start method"
+            )
+
+        self.logger = logging.getLogger(__name__)
+        self.namespace_factory = namespace_factory
+        self.timeout = timeout
+        self.memory_limit = (max_memory_mb or 0) * 1024 * 1024
+        self.max_html_bytes = max_html_bytes
+        self.max_warm = max_warm
+        self._idle = threading.Condition()
+        self._spawn_lock = threading.Lock()
+        self._closed = False
+        self.stats = {
+            "calls": 0,
+            "timeouts": 0,
+            "crashes": 0,
+            "recycled": 0,
+            "replaced": 0,
+            "pages_sent": 0,
+            "pages_reused": 0,
+        }
+
+        # Anonymous shared mappings survive the forks; pages are only
+        # backed by memory once written to
+        self._buffers = [
+            mmap.mmap(-1, max_html_bytes) for _ in range(workers)
+        ]
+        self._spawner_conn, spawner_conn = multiprocessing.Pipe()
+        self._spawner = multiprocessing.get_context("fork").Process(
+            target=_spawner_main,
+            args=(
+                spawner_conn,
+                self._spawner_conn,
+                self._buffers,
+                namespace_factory,
+                self.memory_limit,
+                max_warm,
+            ),
+            name="extraction-spawner",
+            daemon=True,
+        )
+        self._spawner.start()
+        spawner_conn.close()
+
+        self._workers = [_Worker(index) for index in range(workers)]
+        for worker in self._workers:
+            self._start(worker)
+        self._available = list(self._workers)
+        self._finalizer = weakref.finalize(
+            self, _shutdown, self._workers, self._spawner, self._spawner_conn
+        )
+
+    def _spawner_call(self, request, receive_handle=False):
+        with self._spawn_lock:
+            try:
+                self._spawner_conn.send(request)
+                reply = self._spawner_conn.recv()
+                if receive_handle:
+                    reply = reply, recv_handle(self._spawner_conn)
+            except (EOFError, OSError) as e:
+                raise SandboxError(
+                    f"Extraction worker spawner is gone: {str(e)}"
+                )
+        return reply
+
+    def _start(self, worker):
+        """Have the spawner fork a worker for this handle"""
+        pid, fd = self._spawner_call(("start", worker.index), True)
+        worker.pid = pid
+        worker.conn = Connection(fd)
+        worker.html_key = None
+        worker.warm.clear()
+
+    def _replace(self, worker):
+        """
+        Have the spawner kill (if still running) and reap a worker, and
+        start a fresh one.
+
+        Returns:
+            Exit code of the old worker (negative for a signal)
+        """
+        worker.conn.close()
+        exitcode = self._spawner_call(("stop", worker.pid))
+        worker.pid = None
+        self._start(worker)
+        self.stats["replaced"] += 1
+        return exitcode
+
+    def _acquire(self, code_hash, html_key):
+        """
+        Take an idle worker, preferring one that already holds the page,
+        then one with the code warm
+        """
+        with self._idle:
+            while not self._available and not self._closed:
+                self._idle.wait()
+            if self._closed:
+                raise SandboxError("Extraction worker pool is closed")
+            worker = next(
+                (w for w in self._available if w.html_key == html_key),
+                None,
+            ) or next(
+                (w for w in self._available if code_hash in w.warm),
+                self._available[-1],
+            )
+            self._available.remove(worker)
+            return worker
+
+    def _release(self, worker):
+        with self._idle:
+            self._available.append(worker)
+            self._idle.notify()
+
+    def _request(self, worker, op, code, data, html_key):
+        """The message sending code (and the page, unless already held)"""
+        if data is None:
+            return (op, code, None, None)
+
+        if worker.html_key == html_key:
+            self.stats["pages_reused"] += 1
+            return (op, code, None, None)
+
+        self.stats["pages_sent"] += 1
+        worker.html_key = html_key
+        if len(data) > self.max_html_bytes:
+            return (op, code, "inline", data)
+        self._buffers[worker.index][: len(data)] = data
+        return (op, code, "shared", len(data))
+
+    def _call(self, op, code, html_content=None):
+        if self._closed:
+            raise SandboxError("Extraction worker pool is closed")
+
+        code_hash = compute_code_hash(code)
+        data = html_key = None
+        if html_content is not None:
+            data = html_content.encode("utf-8")
+            html_key = hashlib.blake2b(data, digest_size=16).digest()
+        worker = self._acquire(code_hash, html_key)
+        try:
+            if not worker.is_alive():
+                self._replace(worker)
+            self.stats["calls"] += 1
+            try:
+                worker.conn.send(
+                    self._request(worker, op, code, data, html_key)
+                )
+                ready = worker.conn.poll(self.timeout)
+                reply = worker.conn.recv() if ready else None
+            except (EOFError, OSError):
+                self.stats["crashes"] += 1
+                exitcode = self._replace(worker)
+                raise WorkerCrashedError(
+                    f"Extraction worker died (exit code {exitcode})"
+                )
+
+            if reply is None:
+                self.stats["timeouts"] += 1
+                self._replace(worker)
+                raise ExtractionTimeoutError(
+                    f"Extraction code did not finish within {self.timeout}s"
+                )
+
+            status, value, detail, recycle = reply
+            worker.warm[code_hash] = True
+            worker.warm.move_to_end(code_hash)
+            while len(worker.warm) > self.max_warm:
+                worker.warm.popitem(last=False)
+            if recycle:
+                self.stats["recycled"] += 1
+                self._replace(worker)
+
+            if status != "ok":
+                raise ExtractionCodeError(value, detail)
+            return value
+        finally:
+            self._release(worker)
+
+    def load(self, code):
+        """
+        Compile code in a worker and check that it defines
+        ``extract_data``, without running it on a page.
+
+        Raises:
+            SandboxError: If the code does not load
+        """
+        self._call("load", code)
+
+    def run(self, code, html_content):
+        """
+        Run the ``extract_data`` function of code on html_content in a
+        worker.
+
+        Returns:
+            Whatever extract_data returned
+
+        Raises:
+            ExtractionCodeError: If the code raised
+            ExtractionTimeoutError: If it ran past the timeout
+            WorkerCrashedError: If the worker died during the call
+        """
+        return self._call("run", code, html_content)
+
+    def close(self):
+        """Stop every worker"""
+        with self._idle:
+            self._closed = True
+            self._idle.notify_all()
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_stats(self):
+        """Return call, timeout and worker replacement counters"""
+        with self._idle:
+            stats = dict(self.stats)
+            stats["workers"] = len(self._workers)
+            stats["idle"] = len(self._available)
+        return stats
@@ -0,0 +1,125 @@
+"""
+Validation of extraction results: record count and field fill rate
+"""
+import math
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class ValidationResult(NamedTuple):
+    """Outcome of validating the output of an extraction function"""
+
+    valid: bool
+    record_count: int
+    fill_rate: float
+    empty_fields: List[str]
+    reason: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class ExtractionValidator:
+    """
+    Decides whether extraction output looks usable.
+
+    A result is valid when it has enough records and the requested fields
+    are filled in for a sufficient share of them.
+    """
+
+    def __init__(
+        self,
+        min_records: int = 1,
+        min_fill_rate: float = 0.5,
+        min_record_ratio: float = 0.5,
+    ):
+        """
+        Args:
+            min_records: Minimum number of records
+            min_fill_rate: Minimum share of (record, field) cells that
+                           hold a non-empty value
+            min_record_ratio: When an expected record count is known,
+                              minimum share of it that must be returned
+        """
+        self.min_records = min_records
+        self.min_fill_rate = min_fill_rate
+        self.min_record_ratio = min_record_ratio
+
+    @staticmethod
+    def _records(data) -> List[Any]:
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict) and data:
+            return [data]
+        return []
+
+    @staticmethod
+    def _is_filled(value) -> bool:
+        if value is None:
+            return False
+        if isinstance(value, str):
+            return bool(value.strip())
+        if isinstance(value, (list, dict, tuple, set)):
+            return bool(value)
+        return True
+
+    def validate(
+        self,
+        data,
+        fields: List[str],
+        expected_records: Optional[int] = None,
+    ) -> ValidationResult:
+        """
+        Validate extraction output.
+
+        Args:
+            data: Value returned by extract_data
+            fields: Requested field names
+            expected_records: Record count seen previously for this kind
+                              of page, if known
+
+        Returns:
+            ValidationResult
+        """
+        records = self._records(data)
+        record_count = len(records)
+
+        filled = {field: 0 for field in fields}
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            for field in fields:
+                if self._is_filled(record.get(field)):
+                    filled[field] += 1
+
+        cells = record_count * len(fields)
+        fill_rate = (
+            round(sum(filled.values()) / cells, 4) if cells else 0.0
+        )
+        empty_fields = [field for field, count in filled.items() if not count]
+
+        required_records = self.min_records
+        if expected_records:
+            required_records = max(
+                required_records,
+                math.ceil(expected_records * self.min_record_ratio),
+            )
+
+        reason = None
+        if record_count < required_records:
+            reason = (
+                f"expected at least {required_records} records, "
+                f"got {record_count}"
+            )
+        elif fields and fill_rate < self.min_fill_rate:
+            reason = (
+                f"field fill rate {fill_rate:.0%} below "
+                f"{self.min_fill_rate:.0%}"
+            )
+
+        return ValidationResult(
+            valid=reason is None,
+            record_count=record_count,
+            fill_rate=fill_rate,
+            empty_fields=empty_fields,
+            reason=reason,
+        )
@@ -0,0 +1,66 @@
+"""
+LLM Client Components
+
+This package provides the model-facing layer used by DataExtractor:
+- prompts: Prompts split into stable instructions and variable content
+- providers: Async providers for Gemini, LiteLLM and a deterministic stub
+- streaming: Streamed chunks and detection of a completed code block
+- client: Bounded-concurrency client with per-request timeouts
+- rate_limiter: RPM/TPM token buckets keyed by provider and model
+- hedging: Percentile-based delay before racing a fallback model
+- usage: Token counting, pricing and per-run usage aggregation
+"""
+
+from .prompts import Prompt, prompt_text
+from .providers import (
+    LLMError,
+    LLMTimeoutError,
+    LLMResponse,
+    LLMProvider,
+    GeminiProvider,
+    LiteLLMProvider,
+    StubProvider,
+    detect_provider,
+)
+from .rate_limiter import (
+    RateLimit,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+    is_rate_limit_error,
+)
+from .hedging import HedgePolicy
+from .streaming import StreamChunk, code_block_end
+from .usage import (
+    TokenUsage,
+    CostModel,
+    UsageTracker,
+    count_tokens,
+)
+from .client import AsyncLLMClient
+
+__all__ = [
+    'Prompt',
+    'prompt_text',
+    'LLMError',
+    'LLMTimeoutError',
+    'LLMResponse',
+    'LLMProvider',
+    'GeminiProvider',
+    'LiteLLMProvider',
+    'StubProvider',
+    'detect_provider',
+    'RateLimit',
+    'RateLimiter',
+    'TokenBucket',
+    'estimate_tokens',
+    'is_rate_limit_error',
+    'HedgePolicy',
+    'StreamChunk',
+    'code_block_end',
+    'TokenUsage',
+    'CostModel',
+    'UsageTracker',
+    'count_tokens',
+    'AsyncLLMClient',
+]
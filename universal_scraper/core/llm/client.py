@@ -0,0 +1,356 @@
+"""
+Bounded-concurrency client running provider calls on a shared event loop
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, List, Union, Callable
+
+from .providers import LLMProvider, LLMResponse, LLMTimeoutError
+from .prompts import Prompt, prompt_text
+from .hedging import HedgePolicy
+from .rate_limiter import RateLimiter, estimate_tokens, is_rate_limit_error
+
+
+class AsyncLLMClient:
+    """
+    Runs provider calls on one background event loop, so synchronous
+    callers in several threads and async callers share a single
+    concurrency cap and their generations overlap.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        max_concurrency: int = 4,
+        timeout: float = 120.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        completion_tokens: int = 1000,
+        fallbacks: Optional[List[LLMProvider]] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        streaming: bool = False,
+        stream_stop: Optional[Callable[[str], Optional[int]]] = None,
+        response_check: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            provider: Provider the requests are sent to
+            max_concurrency: Maximum requests in flight at once
+            timeout: Seconds before a request fails with LLMTimeoutError
+            rate_limiter: Per-provider RPM/TPM budgets requests wait for;
+                          rate-limit errors are retried through it
+            completion_tokens: Expected response size, added to the
+                               prompt estimate when reserving tokens
+            fallbacks: Further providers in order of preference; a request
+                       moves on to the next one when the current one fails
+                       or is slower than the hedge delay, and the first
+                       response wins
+            hedge_policy: Decides the hedge delay from observed latencies
+            streaming: Stream responses, so time to first token is known
+                       and stream_stop can end them early
+            stream_stop: Called with the streamed text so far; returning
+                         an index cuts the response there and cancels the
+                         rest of the stream
+            response_check: Called with the text of each response in a
+                            race; a response it rejects does not win, and
+                            the race waits for the other requests (falling
+                            back to the first rejected response when none
+                            passes)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.completion_tokens = completion_tokens
+        self.fallbacks = list(fallbacks or [])
+        self.hedge_policy = hedge_policy or HedgePolicy()
+        self.streaming = streaming
+        self.stream_stop = stream_stop
+        self.response_check = response_check
+        # (time to first token, generation time) of recent responses
+        self._timings = deque(maxlen=1000)
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "rate_limit_retries": 0,
+            "hedges": 0,
+            "fallbacks": 0,
+            "rejected": 0,
+            "wins": {},
+            "streamed": 0,
+            "stopped_early": 0,
+        }
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop on first use"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, name="llm-client", daemon=True
+                )
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def submit(
+        self,
+        prompt: Union[str, Prompt],
+        providers: Optional[List[LLMProvider]] = None,
+    ) -> Future:
+        """
+        Schedule a request on the background loop.
+
+        Args:
+            prompt: Prompt to send, a string or a Prompt with a stable
+                    instruction prefix
+            providers: Providers to use for this request instead of the
+                       configured provider and fallbacks
+
+        Returns:
+            concurrent.futures.Future resolving to an LLMResponse;
+            cancelling it cancels the request
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._run(prompt, providers), self._ensure_loop()
+        )
+
+    def generate_sync(
+        self,
+        prompt: Union[str, Prompt],
+        providers: Optional[List[LLMProvider]] = None,
+    ) -> LLMResponse:
+        """Send a request and block until it completes"""
+        return self.submit(prompt, providers).result()
+
+    async def generate(
+        self,
+        prompt: Union[str, Prompt],
+        providers: Optional[List[LLMProvider]] = None,
+    ) -> LLMResponse:
+        """Send a request from any event loop"""
+        return await asyncio.wrap_future(self.submit(prompt, providers))
+
+    async def _run(
+        self,
+        prompt: Union[str, Prompt],
+        providers: Optional[List[LLMProvider]] = None,
+    ) -> LLMResponse:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        providers = providers or [self.provider] + self.fallbacks
+        if len(providers) > 1:
+            response = await self._race(prompt, providers)
+        else:
+            response = await self._run_provider(prompt, providers[0])
+        self.stats["wins"][response.model] = (
+            self.stats["wins"].get(response.model, 0) + 1
+        )
+        return response
+
+    async def _race(
+        self, prompt: Union[str, Prompt], providers: List[LLMProvider]
+    ) -> LLMResponse:
+        """
+        Send prompt to the providers in order, starting the next one when
+        the current ones fail or exceed the hedge delay; the first
+        response passing response_check wins and the requests still
+        running are cancelled.
+        """
+        started = 0
+        pending = set()
+        errors = []
+        rejected = []
+
+        def start_next():
+            nonlocal started
+            provider = providers[started]
+            started += 1
+            task = asyncio.ensure_future(
+                self._run_provider(prompt, provider)
+            )
+            pending.add(task)
+
+        start_next()
+        try:
+            while pending:
+                delay = None
+                if started < len(providers):
+                    delay = self.hedge_policy.delay(
+                        providers[started - 1].model_name
+                    )
+                done, _ = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.stats["hedges"] += 1
+                    self.logger.info(
+                        f"{providers[started - 1].model_name} slower than "
+                        f"{delay:.1f}s; hedging with "
+                        f"{providers[started].model_name}"
+                    )
+                    start_next()
+                    continue
+
+                reason = None
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        reason = errors[-1]
+                        continue
+                    response = task.result()
+                    if self.response_check is None or self.response_check(
+                        response.text
+                    ):
+                        return response
+                    self.stats["rejected"] += 1
+                    rejected.append(response)
+                    reason = f"unusable response from {response.model}"
+
+                if started < len(providers):
+                    self.stats["fallbacks"] += 1
+                    self.logger.warning(
+                        f"{providers[started - 1].model_name} failed "
+                        f"({reason}); falling back to "
+                        f"{providers[started].model_name}"
+                    )
+                    start_next()
+            if rejected:
+                return rejected[0]
+            raise errors[0]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _run_provider(
+        self, prompt: Union[str, Prompt], provider: LLMProvider
+    ) -> LLMResponse:
+        if self.rate_limiter is None:
+            return await self._call(prompt, provider)
+
+        provider_name = provider.provider_name
+        model = provider.model_name
+        tokens = estimate_tokens(prompt_text(prompt)) + self.completion_tokens
+        attempt = 0
+        while True:
+            # Waiting here rather than failing holds back the callers, so
+            # a batch slows to the quota instead of erroring on 429s
+            await self.rate_limiter.acquire(provider_name, model, tokens)
+            try:
+                return await self._call(prompt, provider)
+            except Exception as e:
+                if (
+                    attempt >= self.rate_limiter.max_retries
+                    or not is_rate_limit_error(e)
+                ):
+                    raise
+                delay = self.rate_limiter.retry_delay_for(e, attempt)
+                self.rate_limiter.penalize(provider_name, model, delay)
+                self.stats["rate_limit_retries"] += 1
+                self.logger.warning(
+                    f"{provider_name}/{model} rate limited; retrying in "
+                    f"{delay:.0f}s"
+                )
+                attempt += 1
+
+    async def _call(
+        self, prompt: Union[str, Prompt], provider: LLMProvider
+    ) -> LLMResponse:
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(
+                self.stats["max_in_flight"], self.stats["in_flight"]
+            )
+            try:
+                if self.streaming:
+                    request = provider.agenerate_stream(
+                        prompt, self.stream_stop
+                    )
+                else:
+                    request = provider.agenerate(prompt)
+                response = await asyncio.wait_for(request, self.timeout)
+                self.hedge_policy.record(provider.model_name, response.latency)
+                self._record_timing(response)
+                return response
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise LLMTimeoutError(
+                    f"{provider.model_name} did not respond within "
+                    f"{self.timeout}s"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                self.stats["in_flight"] -= 1
+
+    def _record_timing(self, response: LLMResponse) -> None:
+        if self.streaming:
+            self.stats["streamed"] += 1
+        if response.stopped_early:
+            self.stats["stopped_early"] += 1
+        self._timings.append((response.time_to_first_token, response.latency))
+
+    def get_timings(self) -> Dict[str, Dict[str, float]]:
+        """
+        Average and 90th percentile time to first token and total
+        generation time, in seconds, over recent responses
+        """
+        timings = list(self._timings)
+        summary = {}
+        for i, name in enumerate(["time_to_first_token", "generation_time"]):
+            values = sorted(timing[i] for timing in timings)
+            if not values:
+                summary[name] = {"avg": 0.0, "p90": 0.0}
+                continue
+            summary[name] = {
+                "avg": round(sum(values) / len(values), 3),
+                "p90": round(values[int(0.9 * (len(values) - 1))], 3),
+            }
+        return summary
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["wins"] = dict(self.stats["wins"])
+        stats.update(self.get_timings())
+        stats.update(
+            {
+                "model": self.provider.model_name,
+                "fallback_models": [p.model_name for p in self.fallbacks],
+                "hedge_policy": self.hedge_policy.to_dict(),
+                "max_concurrency": self.max_concurrency,
+                "timeout": self.timeout,
+                "streaming": self.streaming,
+            }
+        )
+        if self.rate_limiter:
+            stats["rate_limiter"] = self.rate_limiter.get_stats()
+        return stats
+
+    def close(self) -> None:
+        """Stop the background event loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+            self._semaphore = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
@@ -0,0 +1,70 @@
+"""
+Latency tracking that decides when to hedge a slow LLM request
+"""
+import threading
+from collections import deque
+from typing import Dict, Any
+
+
+class HedgePolicy:
+    """
+    Delay after which a request still waiting on one model is also sent
+    to the next, taken as a percentile of that model's recent latencies.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.9,
+        initial_delay: float = 30.0,
+        min_delay: float = 1.0,
+        window: int = 100,
+        min_samples: int = 5,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            percentile: Latency percentile (0-1) of the model being waited
+                        on after which the hedge request is sent
+            initial_delay: Delay used until min_samples latencies are known
+            min_delay: Lower bound on the delay
+            window: Recent latencies kept per model
+            min_samples: Latencies needed before the percentile is used
+        """
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float) -> None:
+        """Record the latency of a successful request to model"""
+        with self._lock:
+            if model not in self._latencies:
+                self._latencies[model] = deque(maxlen=self.window)
+            self._latencies[model].append(latency)
+
+    def delay(self, model: str) -> float:
+        """Seconds to wait on model before hedging"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+
+        index = min(
+            len(latencies) - 1, int(self.percentile * len(latencies))
+        )
+        return max(self.min_delay, latencies[index])
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            models = list(self._latencies)
+        return {
+            "percentile": self.percentile,
+            "initial_delay": self.initial_delay,
+            "delays": {
+                model: round(self.delay(model), 2) for model in models
+            },
+        }
@@ -0,0 +1,28 @@
+"""
+Prompts split into a stable prefix and a per-request tail
+"""
+from typing import NamedTuple, Union
+
+
+class Prompt(NamedTuple):
+    """
+    A prompt whose instructions are identical across requests and whose
+    content varies. Providers send the instructions first (as the system
+    message where they have one) so provider-side prefix caching can reuse
+    them between calls.
+    """
+
+    instructions: str
+    content: str = ""
+
+    @property
+    def text(self) -> str:
+        """The whole prompt as a single string"""
+        return self.instructions + self.content
+
+
+def prompt_text(prompt: Union[str, Prompt]) -> str:
+    """The text of a plain string or Prompt"""
+    if isinstance(prompt, Prompt):
+        return prompt.text
+    return prompt
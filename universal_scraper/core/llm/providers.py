@@ -0,0 +1,423 @@
+"""
+Async LLM providers used for extraction code generation
+"""
+import time
+import asyncio
+import logging
+from typing import Optional, NamedTuple, Callable, List, Union, AsyncIterator
+
+from .prompts import Prompt, prompt_text
+from .streaming import StreamChunk
+from .usage import count_tokens
+
+try:
+    from litellm import acompletion
+
+    LITELLM_AVAILABLE = True
+except ImportError:
+    LITELLM_AVAILABLE = False
+    acompletion = None
+
+
+class LLMError(Exception):
+    """Raised when a provider fails to produce a response"""
+    pass
+
+
+class LLMTimeoutError(LLMError, TimeoutError):
+    """Raised when a provider does not respond within the timeout"""
+    pass
+
+
+class LLMResponse(NamedTuple):
+    """Text produced by a provider call, with its token usage"""
+
+    text: str
+    model: str
+    provider: str
+    latency: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # True when the provider reported no usage and it was counted locally
+    usage_estimated: bool = False
+    # Prompt tokens served from the provider's prompt cache
+    cached_tokens: int = 0
+    # Seconds until the first streamed chunk (the latency when the
+    # response was not streamed)
+    time_to_first_token: float = 0.0
+    # True when a streamed response was cut off by its stop condition
+    stopped_early: bool = False
+
+
+def detect_provider(model_name: str) -> str:
+    """Detect the AI provider from a model name"""
+    model_name_lower = model_name.lower()
+
+    if model_name_lower.startswith("gemini"):
+        return "gemini"
+    elif model_name_lower.startswith("gpt") or "openai" in model_name_lower:
+        return "openai"
+    elif model_name_lower.startswith("claude"):
+        return "anthropic"
+    elif model_name_lower.startswith("llama"):
+        return "ollama"
+    else:
+        return "unknown"
+
+
+class LLMProvider:
+    """Interface of an async text-generation provider for one model"""
+
+    provider_name = "unknown"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.logger = logging.getLogger(__name__)
+
+    async def agenerate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        """Generate a completion for prompt"""
+        raise NotImplementedError
+
+    def astream(
+        self, prompt: Union[str, Prompt]
+    ) -> AsyncIterator[StreamChunk]:
+        """Yield the completion for prompt in chunks as it is generated"""
+        raise NotImplementedError
+
+    async def agenerate_stream(
+        self,
+        prompt: Union[str, Prompt],
+        stop: Optional[Callable[[str], Optional[int]]] = None,
+    ) -> LLMResponse:
+        """
+        Generate a completion for prompt by streaming it.
+
+        Args:
+            prompt: Prompt to send
+            stop: Called with the text received so far; returning an index
+                  ends the stream there and cancels the rest of it
+        """
+        started = time.monotonic()
+        first_token = None
+        text = ""
+        stopped = False
+        # Latest usage reported by the stream, per count
+        usage = [None, None, None]
+
+        stream = self.astream(prompt)
+        try:
+            async for chunk in stream:
+                for i, count in enumerate(chunk[1:]):
+                    if count is not None:
+                        usage[i] = count
+                if not chunk.text:
+                    continue
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                text += chunk.text
+
+                end = stop(text) if stop else None
+                if end is not None:
+                    text = text[:end]
+                    stopped = True
+                    break
+        finally:
+            await stream.aclose()
+
+        return self._response(
+            text,
+            started,
+            prompt,
+            *usage,
+            time_to_first_token=first_token,
+            stopped_early=stopped,
+        )
+
+    def _response(
+        self,
+        text: str,
+        started: float,
+        prompt: Union[str, Prompt],
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        cached_tokens: Optional[int] = None,
+        time_to_first_token: Optional[float] = None,
+        stopped_early: bool = False,
+    ) -> LLMResponse:
+        if not text:
+            raise LLMError(f"No response from {self.provider_name} API")
+
+        estimated = prompt_tokens is None or completion_tokens is None
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(prompt_text(prompt))
+        if completion_tokens is None:
+            completion_tokens = count_tokens(text)
+
+        latency = time.monotonic() - started
+        return LLMResponse(
+            text=text,
+            model=self.model_name,
+            provider=self.provider_name,
+            latency=latency,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            usage_estimated=estimated,
+            cached_tokens=cached_tokens or 0,
+            time_to_first_token=(
+                latency if time_to_first_token is None else time_to_first_token
+            ),
+            stopped_early=stopped_early,
+        )
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through a configured genai.GenerativeModel"""
+
+    provider_name = "gemini"
+
+    def __init__(self, model_name: str, model):
+        """
+        Args:
+            model_name: Gemini model name
+            model: genai.GenerativeModel for model_name
+        """
+        super().__init__(model_name)
+        self.model = model
+
+    @staticmethod
+    def _contents(prompt: Union[str, Prompt]):
+        if isinstance(prompt, Prompt):
+            # Instructions as the first part keep the request prefix stable,
+            # which Gemini's implicit caching reuses between calls
+            return [prompt.instructions, prompt.content]
+        return prompt
+
+    async def agenerate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        started = time.monotonic()
+        response = await self.model.generate_content_async(
+            self._contents(prompt)
+        )
+        usage = getattr(response, "usage_metadata", None)
+        return self._response(
+            response.text if response else None,
+            started,
+            prompt,
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None),
+            getattr(usage, "cached_content_token_count", None),
+        )
+
+    async def astream(
+        self, prompt: Union[str, Prompt]
+    ) -> AsyncIterator[StreamChunk]:
+        response = await self.model.generate_content_async(
+            self._contents(prompt), stream=True
+        )
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the final finish reason)
+                text = ""
+            # Every chunk carries the usage so far; the last one is final
+            usage = getattr(chunk, "usage_metadata", None)
+            yield StreamChunk(
+                text,
+                getattr(usage, "prompt_token_count", None),
+                getattr(usage, "candidates_token_count", None),
+                getattr(usage, "cached_content_token_count", None),
+            )
+
+
+def _cached_tokens(usage) -> Optional[int]:
+    """Cached prompt tokens from a LiteLLM usage object, if reported"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None)
+    if cached is None:
+        # Anthropic's own field, kept by LiteLLM alongside the details
+        cached = getattr(usage, "cache_read_input_tokens", None)
+    return cached
+
+
+class LiteLLMProvider(LLMProvider):
+    """Any LiteLLM-supported model through litellm.acompletion"""
+
+    # Providers that only cache prompt prefixes marked with cache_control;
+    # OpenAI and Gemini cache long prefixes automatically
+    CACHE_CONTROL_PROVIDERS = ("anthropic",)
+
+    def __init__(
+        self,
+        model_name: str,
+        api_key: Optional[str] = None,
+        prompt_caching: bool = True,
+    ):
+        """
+        Args:
+            model_name: LiteLLM model name
+            api_key: API key for the model's provider
+            prompt_caching: Mark the instructions of a Prompt as cacheable
+                            for providers that need explicit cache_control
+        """
+        super().__init__(model_name)
+        self.api_key = api_key
+        self.prompt_caching = prompt_caching
+        self.provider_name = detect_provider(model_name)
+
+    def _messages(self, prompt: Union[str, Prompt]) -> List[dict]:
+        """Chat messages for prompt, instructions first as the system turn"""
+        if not isinstance(prompt, Prompt):
+            return [{"role": "user", "content": prompt}]
+
+        system = prompt.instructions
+        if (
+            self.prompt_caching
+            and self.provider_name in self.CACHE_CONTROL_PROVIDERS
+        ):
+            system = [
+                {
+                    "type": "text",
+                    "text": prompt.instructions,
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ]
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt.content},
+        ]
+
+    @staticmethod
+    def _require_litellm():
+        if not LITELLM_AVAILABLE:
+            raise ImportError(
+                "LiteLLM is required for non-Gemini models. "
+                "Install with: pip install litellm"
+            )
+
+    async def agenerate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        self._require_litellm()
+        started = time.monotonic()
+        response = await acompletion(
+            model=self.model_name,
+            messages=self._messages(prompt),
+            api_key=self.api_key,
+        )
+        usage = getattr(response, "usage", None)
+        return self._response(
+            response.choices[0].message.content,
+            started,
+            prompt,
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None),
+            _cached_tokens(usage),
+        )
+
+    async def astream(
+        self, prompt: Union[str, Prompt]
+    ) -> AsyncIterator[StreamChunk]:
+        self._require_litellm()
+        response = await acompletion(
+            model=self.model_name,
+            messages=self._messages(prompt),
+            api_key=self.api_key,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            async for chunk in response:
+                text = ""
+                if chunk.choices:
+                    text = chunk.choices[0].delta.content or ""
+                # Only the final chunk carries usage (include_usage)
+                usage = getattr(chunk, "usage", None)
+                yield StreamChunk(
+                    text,
+                    getattr(usage, "prompt_tokens", None),
+                    getattr(usage, "completion_tokens", None),
+                    _cached_tokens(usage) if usage else None,
+                )
+        finally:
+            # Closing the stream drops the connection, so the provider
+            # stops generating the part we no longer need
+            close = getattr(response, "aclose", None)
+            if close is not None:
+                await close()
+
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic provider for tests and offline runs: returns fixed
+    responses (cycling through them) or the result of a handler. Repeated
+    Prompt instructions are reported as cached tokens, like a provider
+    with prefix caching would.
+    """
+
+    provider_name = "stub"
+
+    def __init__(
+        self,
+        responses: Optional[List[str]] = None,
+        handler: Optional[Callable[[str], str]] = None,
+        latency: float = 0.0,
+        model_name: str = "stub",
+        chunk_size: int = 16,
+        chunk_delay: float = 0.0,
+    ):
+        """
+        Args:
+            responses: Texts returned in turn
+            handler: Function mapping a prompt to a response (overrides
+                     responses); may raise to simulate provider errors
+            latency: Seconds to wait before responding (before the first
+                     chunk when streaming)
+            model_name: Model name reported in responses
+            chunk_size: Characters per chunk when streaming
+            chunk_delay: Seconds between streamed chunks
+        """
+        super().__init__(model_name)
+        self.responses = list(responses or [""])
+        self.handler = handler
+        self.latency = latency
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_delay = chunk_delay
+        self.prompts = []
+        self.chunks_sent = 0
+        self._cached_prefixes = set()
+
+    async def _reply(self, prompt: Union[str, Prompt]):
+        """(text, cached_tokens) of the response to prompt"""
+        self.prompts.append(prompt_text(prompt))
+        cached_tokens = 0
+        if isinstance(prompt, Prompt):
+            if prompt.instructions in self._cached_prefixes:
+                cached_tokens = count_tokens(prompt.instructions)
+            self._cached_prefixes.add(prompt.instructions)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.handler:
+            text = self.handler(self.prompts[-1])
+        else:
+            index = (len(self.prompts) - 1) % len(self.responses)
+            text = self.responses[index]
+        return text, cached_tokens
+
+    async def agenerate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        started = time.monotonic()
+        text, cached_tokens = await self._reply(prompt)
+        return self._response(
+            text, started, prompt, cached_tokens=cached_tokens
+        )
+
+    async def astream(
+        self, prompt: Union[str, Prompt]
+    ) -> AsyncIterator[StreamChunk]:
+        text, cached_tokens = await self._reply(prompt)
+        for start in range(0, len(text), self.chunk_size):
+            if start and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            self.chunks_sent += 1
+            yield StreamChunk(
+                text[start:start + self.chunk_size],
+                cached_tokens=cached_tokens if not start else None,
+            )
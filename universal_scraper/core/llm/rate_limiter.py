@@ -0,0 +1,197 @@
+"""
+Provider-aware request and token rate limiting for LLM calls
+"""
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional, NamedTuple, Dict, Any, Union
+
+
+class RateLimit(NamedTuple):
+    """Per-minute budgets for one provider or model; None means unlimited"""
+
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for text (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Whether a provider exception reports an exhausted quota (HTTP 429
+    from LiteLLM, ResourceExhausted from Gemini)
+    """
+    if getattr(error, "status_code", None) == 429:
+        return True
+    if getattr(error, "code", None) == 429:
+        return True
+    name = type(error).__name__
+    if "RateLimit" in name or name == "ResourceExhausted":
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message
+
+
+class TokenBucket:
+    """
+    Bucket refilling continuously at a per-minute rate.
+
+    Reservations may take the bucket below zero; the caller then waits
+    until the refill has paid off the debt, so waiting callers are served
+    in the order they reserved.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket.
+
+        Args:
+            per_minute: Units added per minute
+            capacity: Maximum burst size (defaults to one minute's worth)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def reserve(self, amount: float, now: Optional[float] = None) -> float:
+        """
+        Take amount units from the bucket.
+
+        Returns:
+            Seconds the caller must wait before using them
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        # A single request larger than the burst size still gets through
+        # once the bucket is full instead of waiting forever
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets keyed by provider
+    and model. Callers wait for budget instead of being rejected, which
+    holds back whoever is submitting work while the quota is spent.
+    """
+
+    WILDCARD = "*"
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Union[RateLimit, Dict[str, float]]]] = None,
+        max_retries: int = 3,
+        retry_delay: float = 10.0,
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            limits: Budgets keyed by "provider/model", model name, provider
+                    name or "*" (most specific key wins), given as
+                    RateLimit or {"rpm": ..., "tpm": ...}
+            max_retries: Times a request rejected with a rate-limit error
+                         is retried after waiting
+            retry_delay: Initial wait after a rate-limit error when the
+                         provider gives no Retry-After; doubles per retry
+        """
+        self.logger = logging.getLogger(__name__)
+        self.limits = {
+            key: limit if isinstance(limit, RateLimit) else RateLimit(**limit)
+            for key, limit in (limits or {}).items()
+        }
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._buckets = {}
+        self._paused_until = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "acquired": 0,
+            "throttled": 0,
+            "wait_seconds": 0.0,
+            "rate_limit_errors": 0,
+        }
+
+    def limit_for(self, provider: str, model: str) -> RateLimit:
+        """Budget that applies to a provider/model pair"""
+        for key in (f"{provider}/{model}", model, provider, self.WILDCARD):
+            if key in self.limits:
+                return self.limits[key]
+        return RateLimit()
+
+    def _buckets_for(self, provider: str, model: str):
+        key = (provider, model)
+        if key not in self._buckets:
+            limit = self.limit_for(provider, model)
+            self._buckets[key] = (
+                TokenBucket(limit.rpm) if limit.rpm else None,
+                TokenBucket(limit.tpm) if limit.tpm else None,
+            )
+        return self._buckets[key]
+
+    def reserve(self, provider: str, model: str, tokens: int) -> float:
+        """
+        Reserve one request and an estimated number of tokens.
+
+        Returns:
+            Seconds to wait before sending the request
+        """
+        with self._lock:
+            requests, token_bucket = self._buckets_for(provider, model)
+            paused_until = self._paused_until.get((provider, model), 0.0)
+            wait = max(0.0, paused_until - time.monotonic())
+            if requests:
+                wait = max(wait, requests.reserve(1))
+            if token_bucket:
+                wait = max(wait, token_bucket.reserve(tokens))
+
+            self.stats["acquired"] += 1
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["wait_seconds"] += wait
+            return wait
+
+    async def acquire(self, provider: str, model: str, tokens: int) -> None:
+        """Wait until the budget allows sending the request"""
+        wait = self.reserve(provider, model, tokens)
+        if wait > 0:
+            self.logger.debug(
+                f"Rate limit for {provider}/{model}: waiting {wait:.1f}s"
+            )
+            await asyncio.sleep(wait)
+
+    def penalize(self, provider: str, model: str, seconds: float) -> None:
+        """Hold back all requests to provider/model after a 429"""
+        with self._lock:
+            self.stats["rate_limit_errors"] += 1
+            key = (provider, model)
+            self._paused_until[key] = max(
+                self._paused_until.get(key, 0.0), time.monotonic() + seconds
+            )
+
+    def retry_delay_for(self, error: Exception, attempt: int) -> float:
+        """Seconds to back off after the given rate-limited attempt"""
+        retry_after = getattr(error, "retry_after", None)
+        if isinstance(retry_after, (int, float)) and retry_after > 0:
+            return float(retry_after)
+        return self.retry_delay * 2 ** attempt
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 2)
+        stats["limits"] = {
+            key: limit._asdict() for key, limit in self.limits.items()
+        }
+        return stats
@@ -0,0 +1,50 @@
+"""
+Incremental parsing of streamed completions
+"""
+from typing import NamedTuple, Optional
+
+FENCE = "```"
+
+
+class StreamChunk(NamedTuple):
+    """
+    Piece of a streamed completion; usage counts are set on the chunks
+    that carry the provider's usage report
+    """
+
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+
+
+def _find_fence(text: str, start: int) -> Optional[int]:
+    """Index of the first fence at the start of a line from start on"""
+    index = text.find(FENCE, start)
+    while index != -1:
+        line_start = text.rfind("\n", 0, index) + 1
+        if not text[line_start:index].strip():
+            return index
+        index = text.find(FENCE, index + 1)
+    return None
+
+
+def code_block_end(text: str) -> Optional[int]:
+    """
+    Index just past the closing fence of the first fenced code block in
+    text, or None while no block has been closed yet. Used to stop a
+    stream once the code is complete, before any trailing explanation.
+    """
+    opening = _find_fence(text, 0)
+    if opening is None:
+        return None
+
+    # The opening fence line may carry a language tag (```python)
+    body = text.find("\n", opening)
+    if body == -1:
+        return None
+
+    closing = _find_fence(text, body + 1)
+    if closing is None:
+        return None
+    return closing + len(FENCE)
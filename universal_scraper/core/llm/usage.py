@@ -0,0 +1,245 @@
+"""
+Token and cost accounting for LLM calls
+"""
+import os
+import hashlib
+import tempfile
+import threading
+from typing import Optional, NamedTuple, Dict, Any, Tuple
+
+try:
+    import tiktoken
+
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    tiktoken = None
+
+try:
+    from litellm import model_cost as LITELLM_MODEL_COST
+except ImportError:
+    LITELLM_MODEL_COST = {}
+
+# Where tiktoken downloads cl100k_base from on first use
+_ENCODING_URL = (
+    "https://openaipublic.blob.core.windows.net/encodings/"
+    "cl100k_base.tiktoken"
+)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _encoding_is_cached() -> bool:
+    """Whether tiktoken can load cl100k_base without downloading it"""
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+    elif "DATA_GYM_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["DATA_GYM_CACHE_DIR"]
+    else:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return False
+    cache_key = hashlib.sha1(_ENCODING_URL.encode()).hexdigest()
+    return os.path.exists(os.path.join(cache_dir, cache_key))
+
+
+def _load_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            _encoding = False
+            # Loading an encoding that is not cached yet downloads it, which
+            # can hang on hosts without network access
+            if TIKTOKEN_AVAILABLE and _encoding_is_cached():
+                try:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    pass
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of text locally, with tiktoken when it is installed
+    and its encoding is cached, and about four characters per token
+    otherwise
+    """
+    if not text:
+        return 0
+    encoding = _encoding if _encoding is not None else _load_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+class TokenUsage(NamedTuple):
+    """Tokens consumed by one or more LLM calls"""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    calls: int = 0
+    # True when any of the counts came from a local estimate rather
+    # than the provider
+    estimated: bool = False
+    # Part of prompt_tokens served from provider prompt caches
+    cached_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cached_share(self) -> float:
+        """Fraction of prompt tokens served from provider prompt caches"""
+        if not self.prompt_tokens:
+            return 0.0
+        return self.cached_tokens / self.prompt_tokens
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            self.prompt_tokens + other.prompt_tokens,
+            self.completion_tokens + other.completion_tokens,
+            self.cost + other.cost,
+            self.calls + other.calls,
+            self.estimated or other.estimated,
+            self.cached_tokens + other.cached_tokens,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_share": round(self.cached_share, 3),
+            "cost": round(self.cost, 6),
+            "calls": self.calls,
+            "estimated": self.estimated,
+        }
+
+
+class CostModel:
+    """
+    Prices per token by model, taken from the configured prices and
+    otherwise from LiteLLM's model price list when LiteLLM is installed.
+    """
+
+    def __init__(
+        self, prices: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        """
+        Args:
+            prices: {model: {"input": usd_per_1m, "output": usd_per_1m}},
+                    optionally with "cached_input" for prompt tokens read
+                    from the provider's cache (defaults to "input")
+        """
+        self.prices = dict(prices or {})
+
+    def price(self, model: str) -> Optional[Tuple[float, float]]:
+        """(input, output) USD per token for model, or None if unknown"""
+        if model in self.prices:
+            price = self.prices[model]
+            return price["input"] / 1e6, price["output"] / 1e6
+
+        info = LITELLM_MODEL_COST.get(model) or LITELLM_MODEL_COST.get(
+            model.split("/", 1)[-1]
+        )
+        if info and "input_cost_per_token" in info:
+            return (
+                info["input_cost_per_token"],
+                info.get("output_cost_per_token", 0.0),
+            )
+        return None
+
+    def cached_price(self, model: str) -> Optional[float]:
+        """USD per cached prompt token for model, or None if unknown"""
+        if model in self.prices:
+            cached = self.prices[model].get("cached_input")
+            return cached / 1e6 if cached is not None else None
+
+        info = LITELLM_MODEL_COST.get(model) or LITELLM_MODEL_COST.get(
+            model.split("/", 1)[-1]
+        )
+        if info:
+            return info.get("cache_read_input_token_cost")
+        return None
+
+    def cost(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+    ) -> float:
+        """USD cost of a call (0.0 when the model's price is unknown)"""
+        price = self.price(model)
+        if price is None:
+            return 0.0
+        cached_price = self.cached_price(model)
+        if cached_price is None:
+            cached_price = price[0]
+        return (
+            (prompt_tokens - cached_tokens) * price[0]
+            + cached_tokens * cached_price
+            + completion_tokens * price[1]
+        )
+
+
+class UsageTracker:
+    """
+    Aggregates LLM usage of a run in total, per model and per domain.
+    Thread-safe.
+    """
+
+    def __init__(self, cost_model: Optional[CostModel] = None):
+        self.cost_model = cost_model or CostModel()
+        self._lock = threading.Lock()
+        self.total = TokenUsage()
+        self.by_model = {}
+        self.by_domain = {}
+
+    def usage_for(self, response) -> TokenUsage:
+        """TokenUsage of one LLMResponse, priced with the cost model"""
+        return TokenUsage(
+            prompt_tokens=response.prompt_tokens,
+            completion_tokens=response.completion_tokens,
+            cost=self.cost_model.cost(
+                response.model,
+                response.prompt_tokens,
+                response.completion_tokens,
+                response.cached_tokens,
+            ),
+            calls=1,
+            estimated=response.usage_estimated,
+            cached_tokens=response.cached_tokens,
+        )
+
+    def record(
+        self, usage: TokenUsage, model: str, domain: Optional[str] = None
+    ) -> None:
+        """Add the usage of a call to model made for domain"""
+        with self._lock:
+            self.total += usage
+            self.by_model[model] = (
+                self.by_model.get(model, TokenUsage()) + usage
+            )
+            if domain:
+                self.by_domain[domain] = (
+                    self.by_domain.get(domain, TokenUsage()) + usage
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total": self.total.to_dict(),
+                "by_model": {
+                    model: usage.to_dict()
+                    for model, usage in self.by_model.items()
+                },
+                "by_domain": {
+                    domain: usage.to_dict()
+                    for domain, usage in self.by_domain.items()
+                },
+            }
@@ -375,7 +375,8 @@ class GetScraperInfoTool(BaseTool):
             info = {
                 "model_name": scraper.get_model_name(),
                 "fields": scraper.get_fields(),
-                "cache_stats": scraper.get_cache_stats() if hasattr(scraper, 'get_cache_stats') else None
+                "cache_stats": scraper.get_cache_stats() if hasattr(scraper, 'get_cache_stats') else None,
+                "llm_usage": scraper.get_llm_usage() if hasattr(scraper, 'get_llm_usage') else None
             }
 
             return [types.TextContent(
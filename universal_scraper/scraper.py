@@ -15,13 +15,17 @@ Usage:
 import logging
 import os
 import json
-from typing import List, Dict, Any, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Union
 from datetime import datetime
 from urllib.parse import urlparse
 
 from .core.html_fetcher import HtmlFetcher
 from .core.html_cleaner import HtmlCleaner
 from .core.data_extractor import DataExtractor
+from .core.caching import CacheBackend, HTTPBackend
+from .core.llm import LLMProvider, RateLimiter
 
 try:
     from litellm import completion
@@ -45,6 +49,26 @@ class UniversalScraper:
         output_dir: str = "output",
         log_level: int = logging.INFO,
         model_name: Optional[str] = None,
+        cache_backend: Optional[Union[str, CacheBackend]] = None,
+        llm_max_concurrency: int = 4,
+        llm_timeout: float = 120.0,
+        llm_rate_limits: Optional[
+            Union[Dict[str, Dict[str, float]], RateLimiter]
+        ] = None,
+        llm_fallback_models: Optional[List[str]] = None,
+        llm_hedge_delay: float = 30.0,
+        llm_hedge_percentile: float = 0.9,
+        llm_tiers: Optional[List[str]] = None,
+        llm_prices: Optional[Dict[str, Dict[str, float]]] = None,
+        llm_prompt_caching: bool = True,
+        llm_streaming: bool = True,
+        llm_provider: Optional[LLMProvider] = None,
+        llm_max_prompt_tokens: int = 60000,
+        max_repair_attempts: int = 2,
+        execution_engine: str = "inline",
+        execution_workers: int = 2,
+        execution_timeout: float = 30.0,
+        execution_memory_mb: Optional[int] = 512,
     ):
         """
         Initialize the Universal Scraper.
@@ -61,6 +85,58 @@ class UniversalScraper:
                        'gemini-2.5-flash' for Gemini.
                        Examples: 'gemini-2.5-flash', 'gpt-4',
                        'claude-3-sonnet', etc.
+            cache_backend: Shared code cache, either a CacheBackend or the
+                           URL of a cache service (see
+                           universal_scraper.core.caching.server), so
+                           code generated by one node is reused by all;
+                           a URL takes the service's shared secret from
+                           UNIVERSAL_SCRAPER_CACHE_TOKEN
+            llm_max_concurrency: Maximum AI model requests in flight at once
+            llm_timeout: Seconds before an AI model request is abandoned
+            llm_rate_limits: Requests/tokens-per-minute budgets, e.g.
+                             {"openai/gpt-4o": {"rpm": 500, "tpm": 30000}},
+                             keyed by "provider/model", model, provider or
+                             "*"; requests wait for budget rather than fail
+            llm_fallback_models: Models tried after model_name, in order;
+                                 a generation still running after the hedge
+                                 delay, or failing, is raced against the
+                                 next one and the first response wins
+            llm_hedge_delay: Seconds before hedging until enough latencies
+                             have been observed
+            llm_hedge_percentile: Latency percentile of the slower model
+                                  used as the hedge delay afterwards
+            llm_tiers: Models to generate with, cheapest first; code from a
+                       tier is used only if it runs and fills the fields on
+                       the page, otherwise the next tier is asked. Each
+                       domain starts at the tier that last succeeded.
+            llm_prices: USD per million tokens by model, e.g.
+                        {"gpt-4o": {"input": 2.5, "output": 10}}, for
+                        models missing from LiteLLM's price list
+            llm_prompt_caching: Mark the fixed generation instructions as
+                                cacheable for providers that need it
+                                (Anthropic); OpenAI and Gemini cache the
+                                stable prefix on their own
+            llm_streaming: Stream model responses and stop as soon as the
+                           generated code block is complete
+            llm_provider: Provider to generate code with instead of the
+                          one chosen from model_name, e.g. the offline
+                          FakeLLMProvider of universal_scraper.benchmark
+            llm_max_prompt_tokens: Prompt size limit; pages still larger
+                                   after cleaning are reduced to their
+                                   repeated-item container, or their
+                                   densest part, to fit
+            max_repair_attempts: Times generated code that fails to run
+                                 or extracts nothing is sent back to the
+                                 model with its error before the
+                                 generation fails (0 to never repair)
+            execution_engine: "inline" runs generated code in this process;
+                              "sandbox" runs it in pre-forked worker
+                              processes that are killed and replaced when
+                              a call runs too long or uses too much memory
+            execution_workers: Sandbox worker processes
+            execution_timeout: Seconds a sandboxed extraction may run
+            execution_memory_mb: Memory a sandbox worker may use beyond its
+                                 starting size (None for no limit)
         """
         self.setup_logging(log_level)
         self.logger = logging.getLogger(__name__)
@@ -68,7 +144,9 @@ class UniversalScraper:
         self.output_dir = output_dir
         self.api_key = api_key
         # Set default model based on API key detection if not provided
-        if model_name is None:
+        if model_name is None and llm_provider is not None:
+            self.model_name = llm_provider.model_name
+        elif model_name is None:
             self.model_name = self._detect_default_model(api_key)
         else:
             self.model_name = model_name
@@ -87,6 +165,9 @@ class UniversalScraper:
         self.fetcher = HtmlFetcher(temp_dir=temp_dir)
         self.cleaner = HtmlCleaner(temp_dir=temp_dir)
 
+        if isinstance(cache_backend, str):
+            cache_backend = HTTPBackend(cache_backend)
+
         # Initialize extractor with custom fields support and caching
         self.extractor = CustomDataExtractor(
             api_key=api_key,
@@ -95,6 +176,24 @@ class UniversalScraper:
             fields=self.extraction_fields,
             model_name=model_name,
             enable_cache=True,
+            cache_backend=cache_backend,
+            llm_max_concurrency=llm_max_concurrency,
+            llm_timeout=llm_timeout,
+            llm_rate_limits=llm_rate_limits,
+            llm_fallback_models=llm_fallback_models,
+            llm_hedge_delay=llm_hedge_delay,
+            llm_hedge_percentile=llm_hedge_percentile,
+            llm_tiers=llm_tiers,
+            llm_prices=llm_prices,
+            llm_prompt_caching=llm_prompt_caching,
+            llm_streaming=llm_streaming,
+            llm_provider=llm_provider,
+            llm_max_prompt_tokens=llm_max_prompt_tokens,
+            max_repair_attempts=max_repair_attempts,
+            execution_engine=execution_engine,
+            execution_workers=execution_workers,
+            execution_timeout=execution_timeout,
+            execution_memory_mb=execution_memory_mb,
         )
 
     def setup_logging(self, level: int):
@@ -149,6 +248,9 @@ class UniversalScraper:
         """
         self.model_name = model_name
         self.extractor.model_name = model_name
+        # New cache entries record the new model
+        if self.extractor.code_cache:
+            self.extractor.code_cache.set_versions(model_name=model_name)
         # Re-initialize the AI provider with new model
         self.extractor._initialize_ai_provider(self.api_key)
         self.logger.info(f"Model changed to: {model_name}")
@@ -203,6 +305,7 @@ class UniversalScraper:
                         if isinstance(extracted_data, list)
                         else 1
                     ),
+                    "llm_usage": self.extractor.get_last_usage(),
                 },
             }
 
@@ -222,7 +325,11 @@ class UniversalScraper:
             raise
 
     def scrape_multiple_urls(
-        self, urls: List[str], save_to_files: bool = True, format: str = "json"
+        self,
+        urls: List[str],
+        save_to_files: bool = True,
+        format: str = "json",
+        max_workers: int = 1,
     ) -> List[Dict[str, Any]]:
         """
         Scrape multiple URLs.
@@ -231,31 +338,144 @@ class UniversalScraper:
             urls: List of URLs to scrape
             save_to_files: Whether to save results to individual files
             format: Output format - 'json' (default) or 'csv'
+            max_workers: URLs processed concurrently; fetching one page
+                         then overlaps with code generation for another,
+                         while AI requests stay within llm_max_concurrency
 
         Returns:
-            List of results for each URL
+            List of results for each URL, in input order
         """
-        results = []
 
-        for i, url in enumerate(urls, 1):
+        def scrape_one(item):
+            i, url = item
             self.logger.info(f"Processing URL {i}/{len(urls)}: {url}")
 
             try:
-                result = self.scrape_url(
+                return self.scrape_url(
                     url, save_to_file=save_to_files, format=format
                 )
-                results.append(result)
             except Exception as e:
                 self.logger.error(f"Failed to scrape {url}: {str(e)}")
-                results.append(
-                    {
-                        "url": url,
-                        "error": str(e),
-                        "timestamp": datetime.now().isoformat(),
-                    }
+                return {
+                    "url": url,
+                    "error": str(e),
+                    "timestamp": datetime.now().isoformat(),
+                }
+
+        items = list(enumerate(urls, 1))
+        if max_workers <= 1:
+            return [scrape_one(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(scrape_one, items))
+
+    def warm_cache(
+        self,
+        urls: List[str],
+        fields: Optional[List[str]] = None,
+        sample_per_template: int = 1,
+        max_workers: int = 4,
+    ) -> Dict[str, Any]:
+        """
+        Pre-generate extraction code for a URL list so a later run only
+        fetches and executes.
+
+        URLs are grouped by URL template; up to sample_per_template pages
+        of each group are fetched and their code is reused from the cache
+        or generated and validated, max_workers pages at a time. Later
+        scrape_url calls with the same fields then hit the cache.
+
+        Args:
+            urls: URLs the run will scrape
+            fields: Fields the run will extract (default: current fields)
+            sample_per_template: Pages sampled per template; more than one
+                                 covers templates whose pages differ in
+                                 structure
+            max_workers: Pages processed concurrently
+
+        Returns:
+            Coverage report with per-sample results
+        """
+        if not (self.extractor.enable_cache and self.extractor.code_cache):
+            raise ValueError("warm_cache requires the code cache")
+
+        started = time.monotonic()
+        fields = fields or self.extraction_fields
+        valid_urls = [url for url in urls if self._validate_url(url)]
+        groups = self.extractor.code_cache.group_by_template(valid_urls)
+        samples = [
+            (template, url)
+            for template, group in groups.items()
+            for url in group[:max(1, sample_per_template)]
+        ]
+        self.logger.info(
+            f"Warming cache: {len(samples)} samples from {len(groups)} "
+            f"templates ({len(valid_urls)} URLs)"
+        )
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            results = list(
+                pool.map(
+                    lambda sample: self._warm_sample(*sample, fields),
+                    samples,
                 )
+            )
+
+        ready = ("cached", "generated")
+        covered = {r["template"] for r in results if r["status"] in ready}
+        covered_urls = sum(
+            len(group) for template, group in groups.items()
+            if template in covered
+        )
+        statuses = [r["status"] for r in results]
+
+        report = {
+            "urls": len(urls),
+            "invalid_urls": len(urls) - len(valid_urls),
+            "templates": len(groups),
+            "samples": len(samples),
+            "generated": statuses.count("generated"),
+            "cached": statuses.count("cached"),
+            "invalid": statuses.count("invalid"),
+            "failed": statuses.count("failed") + statuses.count("backoff"),
+            "covered_templates": len(covered),
+            "covered_urls": covered_urls,
+            "coverage": (
+                round(covered_urls / len(valid_urls), 4) if valid_urls else 0
+            ),
+            "uncovered_templates": [t for t in groups if t not in covered],
+            "elapsed_seconds": round(time.monotonic() - started, 2),
+            "results": results,
+        }
+        self.logger.info(
+            f"Cache warm-up covered {covered_urls}/{len(valid_urls)} URLs "
+            f"({len(covered)}/{len(groups)} templates)"
+        )
+        return report
+
+    def _warm_sample(
+        self, template: str, url: str, fields: List[str]
+    ) -> Dict[str, Any]:
+        """Fetch and clean one sample page and warm its extractor"""
+        started = time.monotonic()
+        try:
+            raw_html = self.fetcher.fetch_html(url)
+            cleaned_html = self.cleaner.clean_html(raw_html, url=url)
+            result = self.extractor.warm_extractor(
+                cleaned_html, raw_html, url, fields
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to warm cache for {url}: {str(e)}")
+            result = {"status": "failed", "records": 0, "error": str(e)}
 
-        return results
+        result.update(
+            {
+                "url": url,
+                "template": template,
+                "seconds": round(time.monotonic() - started, 2),
+            }
+        )
+        return result
 
     def get_cache_stats(self) -> Dict[str, Any]:
         """
@@ -266,6 +486,16 @@ class UniversalScraper:
         """
         return self.extractor.get_cache_stats()
 
+    def get_llm_usage(self) -> Dict[str, Any]:
+        """
+        Get LLM token and cost usage.
+
+        Returns:
+            Usage of this run in total, per model and per domain, and when
+            caching is enabled the tokens and cost avoided by cache hits
+        """
+        return self.extractor.get_llm_usage()
+
     def clear_cache(self) -> bool:
         """
         Clear the extraction code cache.
@@ -287,6 +517,60 @@ class UniversalScraper:
         """
         return self.extractor.cleanup_old_cache(days_old)
 
+    def invalidate_cache(
+        self,
+        model_name: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        cleaner_version: Optional[str] = None,
+        domain: Optional[str] = None,
+    ) -> int:
+        """
+        Remove cached extraction code produced by a given model, prompt
+        version or cleaner version instead of clearing the whole cache.
+
+        Args:
+            model_name: Remove code generated by this model
+            prompt_version: Remove code generated with this prompt version
+            cleaner_version: Remove code for HTML cleaned by this version
+            domain: Limit the invalidation to one domain
+
+        Returns:
+            Number of entries removed
+        """
+        return self.extractor.invalidate_cache(
+            model_name, prompt_version, cleaner_version, domain
+        )
+
+    def export_cache(self, path: str, domain: Optional[str] = None) -> int:
+        """
+        Export the extraction code cache to a portable bundle, e.g. to
+        pre-seed other workers.
+
+        Args:
+            path: Destination bundle file
+            domain: Only export entries for this domain (optional)
+
+        Returns:
+            Number of entries exported
+        """
+        return self.extractor.export_cache(path, domain)
+
+    def import_cache(
+        self, path: str, strategy: str = "newest"
+    ) -> Dict[str, int]:
+        """
+        Merge a cache bundle exported by another worker into this cache.
+
+        Args:
+            path: Bundle file
+            strategy: Keep the 'newest' or the 'most_used' entry when both
+                      sides have code for the same key
+
+        Returns:
+            Counts of inserted, updated and skipped entries
+        """
+        return self.extractor.import_cache(path, strategy)
+
     def _detect_default_model(self, api_key: Optional[str]) -> str:
         """
         Detect default model based on API key pattern or environment variables.
@@ -420,9 +704,49 @@ class CustomDataExtractor(DataExtractor):
         fields=None,
         model_name=None,
         enable_cache=True,
+        cache_backend=None,
+        llm_max_concurrency=4,
+        llm_timeout=120.0,
+        llm_rate_limits=None,
+        llm_fallback_models=None,
+        llm_hedge_delay=30.0,
+        llm_hedge_percentile=0.9,
+        llm_tiers=None,
+        llm_prices=None,
+        llm_prompt_caching=True,
+        llm_streaming=True,
+        llm_provider=None,
+        llm_max_prompt_tokens=60000,
+        max_repair_attempts=2,
+        execution_engine="inline",
+        execution_workers=2,
+        execution_timeout=30.0,
+        execution_memory_mb=512,
     ):
         super().__init__(
-            api_key, temp_dir, output_dir, model_name, enable_cache
+            api_key=api_key,
+            temp_dir=temp_dir,
+            output_dir=output_dir,
+            model_name=model_name,
+            enable_cache=enable_cache,
+            cache_backend=cache_backend,
+            llm_max_concurrency=llm_max_concurrency,
+            llm_timeout=llm_timeout,
+            llm_rate_limits=llm_rate_limits,
+            llm_fallback_models=llm_fallback_models,
+            llm_hedge_delay=llm_hedge_delay,
+            llm_hedge_percentile=llm_hedge_percentile,
+            llm_tiers=llm_tiers,
+            llm_prices=llm_prices,
+            llm_prompt_caching=llm_prompt_caching,
+            llm_streaming=llm_streaming,
+            llm_provider=llm_provider,
+            llm_max_prompt_tokens=llm_max_prompt_tokens,
+            max_repair_attempts=max_repair_attempts,
+            execution_engine=execution_engine,
+            execution_workers=execution_workers,
+            execution_timeout=execution_timeout,
+            execution_memory_mb=execution_memory_mb,
         )
         self.fields = fields or [
             "company_name",